@@ -0,0 +1,381 @@
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from collections import Counter
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Benchmark runner
+#
+# Times every metric group on its own, and all of them together, over the
+# synthetic corpus. Each measurement runs in a fresh interpreter, so peak
+# RSS belongs to that one analysis and nothing is shared between runs.
+# Results can be saved as a baseline and later runs compared against it:
+# throughput or peak RSS worse by more than --threshold, or a metric value
+# that changed, fails the run.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from corpus import GENERATOR_VERSION, KINDS, SIZES, default_corpus_dir, ensure  # noqa: E402
+from stats_archives import archive_results  # noqa: E402
+from stats_engine import ANALYZER_VERSION, METRIC_GROUPS, stream_stats  # noqa: E402
+from stats_store import ResultStore  # noqa: E402
+
+ALL_GROUPS = 'all'
+# Stats that describe the file on disk rather than its contents
+VOLATILE_FIELDS = {'filepath', 'filename', 'created', 'modified', 'accessed'}
+# Small inputs are analyzed again until this much time is spent on them,
+# so their best time is not just timer noise
+MIN_SECONDS = 0.5
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_child(path, group, repeat):
+    # Runs in the measuring subprocess: best wall time of at least `repeat`
+    # runs, and of as many more as fit in MIN_SECONDS
+    metrics = None if group == ALL_GROUPS else [group]
+    best = None
+    cpu = None
+    runs = 0
+    deadline = time.perf_counter() + MIN_SECONDS
+    while runs < repeat or time.perf_counter() < deadline:
+        runs += 1
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        stats = stream_stats(path, metrics=metrics)
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best:
+            best = seconds
+            cpu = time.process_time() - cpu_start
+    json.dump({'seconds': best, 'cpu_seconds': cpu, 'runs': runs, 'peak_rss_mb': peak_rss_mb(),
+               'stats': {k: v for k, v in stats.items() if k not in VOLATILE_FIELDS}},
+              sys.stdout)
+    return 0
+
+
+def measure(path, group, repeat):
+    command = [sys.executable, os.path.abspath(__file__), '--child', path, group,
+               '--repeat', str(repeat)]
+    result = subprocess.run(command, capture_output=True, text=True, cwd=ROOT)
+    if result.returncode != 0:
+        raise RuntimeError(f"{os.path.basename(path)} [{group}] failed:\n{result.stderr}")
+    measured = json.loads(result.stdout)
+    size = os.path.getsize(path)
+    measured['bytes'] = size
+    measured['mb_per_s'] = size / (1 << 20) / measured['seconds'] if measured['seconds'] else None
+    return measured
+
+
+# Correctness oracle
+#
+# Straightforward reference implementations of the metrics whose meaning is
+# simple enough to state in a line, run over the whole decoded file. The
+# engine computes them block by block, over raw bytes and with NumPy, so
+# agreement here checks all of that machinery.
+
+def percentiles(values):
+    # Nearest-rank p50, p90 and p99
+    values = sorted(values)
+    return {f'p{p}': values[max(math.ceil(p / 100 * len(values)), 1) - 1]
+            for p in (50, 90, 99)} if values else {}
+
+
+def reference_stats(path):
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    lines = text.split('\n')
+    words = text.split()
+    expected = {
+        'total_chars': len(text),
+        'total_lines': len(lines),
+        'non_empty_lines': sum(1 for line in lines if line.strip()),
+        'max_line_length': max(map(len, lines)),
+        'trailing_whitespace_lines': sum(1 for line in lines if line != line.rstrip()),
+        'total_words': len(words),
+        'unique_words': len({w.lower() for w in words}),
+        'max_word_length': max(map(len, words), default=0),
+        'spaces': text.count(' '),
+        'tabs': text.count('\t'),
+        'commas': text.count(','),
+        'periods': text.count('.'),
+        'semicolons': text.count(';'),
+        'parentheses_open': text.count('('),
+        'braces_open': text.count('{'),
+        'non_ascii': sum(1 for c in text if ord(c) > 127),
+    }
+    expected['line_length_percentiles'] = percentiles([len(line) for line in lines])
+    expected['word_length_percentiles'] = percentiles([len(w) for w in words])
+    # Ties at the cut make the words themselves ambiguous, but not the counts
+    frequent = Counter(w.lower() for w in words if len(w) > 3)
+    expected['top_words'] = sorted(n for _, n in frequent.most_common(10))
+    if path.endswith('.json'):
+        try:
+            json.loads(text)
+            expected['json_valid'] = True
+        except ValueError:
+            expected['json_valid'] = False
+        except RecursionError:
+            pass
+    return expected
+
+
+def check_oracle(path, stats):
+    # Names of the fields the engine got wrong; estimated fields are skipped
+    approximate = set(stats.get('approximate', ()))
+    wrong = []
+    for field, expected in reference_stats(path).items():
+        if field in approximate or field not in stats:
+            continue
+        actual = stats[field]
+        if field == 'top_words':
+            actual = sorted(n for _, n in actual)
+        if actual != expected:
+            wrong.append(f"{field}: {actual!r} != {expected!r}")
+    return wrong
+
+
+# Odd block sizes, so blocks are cut at every kind of place
+CHECK_BLOCK_SIZES = (61, 4093)
+
+
+def check_blocks(path, stats, block_size):
+    # Fields that change when the file is read in blocks of another size;
+    # estimated fields are skipped
+    skipped = VOLATILE_FIELDS | {'performance'} | set(stats.get('approximate', ()))
+    # Both sides as the child reports them, so tuples compare to lists
+    stats, other = (json.loads(json.dumps({k: v for k, v in s.items() if k not in skipped}))
+                    for s in (stats, stream_stats(path, chunk_size=block_size)))
+    return [f"{field}: {other.get(field)!r} != {stats.get(field)!r}"
+            for field in sorted(set(stats) | set(other))
+            if not same_value(other.get(field), stats.get(field))]
+
+
+# Regression inputs
+#
+# Small inputs that once broke an analyzer, and values their stats must have.
+
+REGRESSION_INPUTS = {
+    # html.parser gives up on the declaration with an AssertionError
+    'declaration.html': ('<p>if a<![ b then</p>\n<p>x <!x y> z</p>\n',
+                         {'html_well_formed': False, 'html_tags': 4}),
+    # Comments and template literals cut by a block's end were scanned
+    # in pieces
+    'multiline.js': ('/* a\n  var hidden = `x */\nfunction f(a) {\n'
+                     '  return `line\n${a} /* no */`;\n}\nconst c = \'`\';\n' * 300,
+                     {'js_functions': 300, 'js_template_literals': 300, 'js_comments_multi': 300,
+                      'js_var_declarations': 0}),
+    'multiline.css': ('/* r\n .fake{x:y} */\n.a,\n.b:hover,\n#c {\n  color: red;\n  margin:\n'
+                      '    0 1px;\n}\n' * 300,
+                      {'css_selectors': 300, 'css_properties': 600, 'css_comments': 300}),
+}
+
+
+def check_regressions():
+    wrong = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, (text, expected) in REGRESSION_INPUTS.items():
+            path = os.path.join(directory, name)
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(text)
+            try:
+                stats = stream_stats(path)
+            except Exception as e:
+                wrong.append(f"{name}: {type(e).__name__}: {e}")
+                continue
+            wrong.extend(f"{name}: {field}: {stats.get(field)!r} != {value!r}"
+                         for field, value in expected.items() if stats.get(field) != value)
+            for block_size in CHECK_BLOCK_SIZES:
+                wrong.extend(f"{name}: {block_size}-byte blocks: {problem}"
+                             for problem in check_blocks(path, stats, block_size))
+    return wrong
+
+
+# Fields of an archive's totals that describe the archive itself
+ARCHIVE_FIELDS = ('filename', 'filepath', 'archive_type', 'members', 'failed_members',
+                  'archive_size')
+
+
+def check_store(paths):
+    # Results of a compressed tar of the inputs, stored as the CLI stores
+    # them (archive totals row included), must total the archive's own
+    # totals, with every member counted once
+    with tempfile.TemporaryDirectory() as directory:
+        archive = os.path.join(directory, 'store-check.tar.gz')
+        with tarfile.open(archive, 'w:gz') as tar:
+            for path in paths:
+                tar.add(path, arcname=os.path.basename(path))
+        results = archive_results(archive)
+    store = ResultStore()
+    for stats in results:
+        store.add(stats)
+    expected = {field: value for field, value in results[-1].items()
+                if field not in ARCHIVE_FIELDS}
+    expected['files'] = results[-1]['members']
+    expected['failed'] = results[-1]['failed_members']
+    totals = store.totals()
+    totals.setdefault('failed', 0)
+    return [f"{field}: {totals.get(field)!r} != {expected.get(field)!r}"
+            for field in sorted(set(totals) | set(expected))
+            if not same_value(totals.get(field), expected.get(field))]
+
+
+def same_value(a, b):
+    if isinstance(a, float) and isinstance(b, float):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-12)
+    return a == b
+
+
+def compare(key, result, base, threshold):
+    # Regressions of one measurement against its baseline entry
+    problems = []
+    if result['mb_per_s'] and base.get('mb_per_s'):
+        if result['mb_per_s'] < base['mb_per_s'] * (1 - threshold):
+            problems.append(f"{key}: throughput {result['mb_per_s']:.2f} MB/s, "
+                            f"baseline {base['mb_per_s']:.2f} MB/s")
+    if result['peak_rss_mb'] and base.get('peak_rss_mb'):
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + threshold):
+            problems.append(f"{key}: peak RSS {result['peak_rss_mb']:.1f} MB, "
+                            f"baseline {base['peak_rss_mb']:.1f} MB")
+    return problems
+
+
+def compare_values(key, stats, base_stats):
+    changed = sorted(field for field in set(stats) | set(base_stats)
+                     if not same_value(stats.get(field), base_stats.get(field)))
+    return [f"{key}: {field} changed from {base_stats.get(field)!r} to {stats.get(field)!r}"
+            for field in changed]
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def split_option(parser, value, choices, name):
+    names = [v.strip() for v in value.split(',') if v.strip()]
+    unknown = [v for v in names if v not in choices]
+    if unknown:
+        parser.error(f"unknown {name}: {', '.join(unknown)} (choose from {', '.join(choices)})")
+    return names
+
+
+def build_parser():
+    groups = list(METRIC_GROUPS) + [ALL_GROUPS]
+    parser = argparse.ArgumentParser(
+        description="Benchmark the analysis engine on a synthetic corpus.")
+    parser.add_argument('--sizes', default='1k,1m',
+                        help=f"comma-separated input sizes ({', '.join(SIZES)}; default: %(default)s)")
+    parser.add_argument('--kinds', default=','.join(KINDS),
+                        help=f"comma-separated input kinds ({', '.join(KINDS)}; default: all)")
+    parser.add_argument('--groups', default=','.join(groups),
+                        help=f"comma-separated metric groups to time ({', '.join(groups)}; "
+                             "default: each one and all together)")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="least runs per measurement, the fastest counts (default: %(default)s)")
+    parser.add_argument('--corpus', default=None, metavar='DIR',
+                        help=f"corpus directory (default: {default_corpus_dir()})")
+    parser.add_argument('--baseline', default=None, metavar='FILE',
+                        help="compare against results saved earlier with --save")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="allowed slowdown or RSS growth against the baseline, as a "
+                             "fraction (default: %(default)s)")
+    parser.add_argument('--save', default=None, metavar='FILE',
+                        help="write the results as JSON, for use as a later --baseline")
+    parser.add_argument('--oracle-size', default='100m', choices=list(SIZES),
+                        help="largest size checked against the reference implementation "
+                             "(default: %(default)s)")
+    parser.add_argument('--child', nargs=2, metavar=('PATH', 'GROUP'), help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        args.repeat = 1
+    if args.child:
+        return run_child(args.child[0], args.child[1], args.repeat)
+    sizes = split_option(parser, args.sizes, list(SIZES), 'size')
+    kinds = split_option(parser, args.kinds, list(KINDS), 'kind')
+    groups = split_option(parser, args.groups, list(METRIC_GROUPS) + [ALL_GROUPS], 'metric group')
+
+    baseline = None
+    if args.baseline:
+        baseline = load_baseline(args.baseline)
+        if baseline.get('generator_version') != GENERATOR_VERSION:
+            print("baseline corpus differs from this one; only timings are compared",
+                  file=sys.stderr)
+    # Metric values are only comparable between runs of the same analyzer
+    compare_stats = (baseline is not None
+                     and baseline.get('analyzer_version') == ANALYZER_VERSION
+                     and baseline.get('generator_version') == GENERATOR_VERSION)
+
+    results = {}
+    failures = []
+    print(f"{'input':<24}{'group':<13}{'MB/s':>10}{'peak RSS':>12}{'vs baseline':>14}")
+    for size in sizes:
+        for kind in kinds:
+            path = ensure(kind, size, args.corpus)
+            for group in groups:
+                key = f"{kind}/{size}/{group}"
+                result = measure(path, group, args.repeat)
+                stats = result.pop('stats')
+                results[key] = dict(result, stats=stats)
+
+                if group == ALL_GROUPS and SIZES[size] <= SIZES[args.oracle_size]:
+                    failures.extend(f"{key}: oracle {problem}"
+                                    for problem in check_oracle(path, stats))
+                    block_size = max(SIZES[size] // 16, CHECK_BLOCK_SIZES[0]) | 1
+                    failures.extend(f"{key}: {block_size}-byte blocks {problem}"
+                                    for problem in check_blocks(path, stats, block_size))
+
+                delta = ''
+                base = baseline['results'].get(key) if baseline else None
+                if base:
+                    failures.extend(compare(key, result, base, args.threshold))
+                    if compare_stats:
+                        failures.extend(compare_values(key, stats, base['stats']))
+                    if result['mb_per_s'] and base.get('mb_per_s'):
+                        delta = f"{result['mb_per_s'] / base['mb_per_s'] - 1:+.1%}"
+                rate = f"{result['mb_per_s']:.2f}" if result['mb_per_s'] else '-'
+                rss = f"{result['peak_rss_mb']:.1f} MB" if result['peak_rss_mb'] else '-'
+                print(f"{kind + '/' + size:<24}{group:<13}{rate:>10}{rss:>12}{delta:>14}",
+                      flush=True)
+
+    # The smallest inputs are enough to check how results are stored
+    store_paths = [ensure(kind, sizes[0], args.corpus) for kind in kinds]
+    failures.extend(f"store: {problem}" for problem in check_store(store_paths))
+    failures.extend(f"regression {problem}" for problem in check_regressions())
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'analyzer_version': ANALYZER_VERSION,
+                       'generator_version': GENERATOR_VERSION,
+                       'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'results': results}, f, indent=1, ensure_ascii=False)
+    for problem in failures:
+        print(problem, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+# Synthetic benchmark corpus
+#
+# Every input is generated from a fixed seed, so the same kind and size give
+# the same bytes on every machine and the corpus never has to be stored.
+# Each kind builds its text from small randomized units until the target
+# size is reached; files are written in blocks, so a 1 GB input needs no
+# more memory than a 1 KB one.
+
+# Bump when the generated bytes change, so cached corpus files are rebuilt
+GENERATOR_VERSION = 2
+
+SIZES = {
+    '1k': 1 << 10,
+    '1m': 1 << 20,
+    '100m': 100 << 20,
+    '1g': 1 << 30,
+}
+
+WRITE_BLOCK = 1 << 20
+
+WORDS = ('the of and to in is that it was for on are as with his they at be this from have '
+         'or one had by word but not what all were when we there can an your which their said '
+         'if do will each about how up out them then she many some so these would other into '
+         'has more her two like him see time could no make than first been its who now people '
+         'my made over did down only way find use may water long little very after words called '
+         'just where most know get through back much before go good new write our used me man '
+         'too any day same right look think also around another came come work three word must '
+         'because does part even place well such here take why things help put years different '
+         'away again off went old number great tell men say small every found still between name '
+         'should home big give air line set own under read last never us left end along while '
+         'might next sound below saw something thought both few those always looked show large '
+         'often together asked house world going want school important until form food keep '
+         'children feet land side without boy once animals life enough took sometimes four head '
+         'above kind began almost live page got earth need far hand high year mother light parts '
+         'country father let night following picture being study second eyes soon times story '
+         'boys since white days ever paper hard near sentence better best across during today '
+         'others sure means knew itself within question readability extraordinarily '
+         'internationalization responsibility').split()
+# Roughly Zipfian, so a few words dominate like in real text
+WEIGHTS = [1 / (rank + 1) for rank in range(len(WORDS))]
+
+NON_ASCII_WORDS = ('naïve café résumé über straße smörgåsbord façade jalapeño '
+                   'привет мир данные файл строка 文件 统计 分析 数据 字符 行 '
+                   'ファイル 統計 データ 文字 파일 통계 데이터 αβγ λόγος ελληνικά '
+                   'مرحبا ملف שלום קובץ 🙂 🚀 ✓ ∑ ∞ → ½').split()
+NON_ASCII_WEIGHTS = [1 / (rank + 1) ** 0.5 for rank in range(len(NON_ASCII_WORDS))]
+
+
+def _words(rng, count):
+    return rng.choices(WORDS, WEIGHTS, k=count)
+
+
+def _sentence(rng):
+    words = _words(rng, rng.randint(4, 24))
+    words[0] = words[0].capitalize()
+    return ' '.join(words) + rng.choice('..........!?')
+
+
+def _name(rng):
+    return '_'.join(_words(rng, rng.randint(1, 3)))
+
+
+# Units: each returns the next piece of text for kind-specific position i
+
+def _prose(rng, i):
+    return ' '.join(_sentence(rng) for _ in range(rng.randint(2, 7))) + '\n' * rng.choice((1, 1, 2))
+
+
+def _python(rng, i):
+    name = _name(rng)
+    if i == 0:
+        return 'import os\nimport re\nfrom collections import Counter\n\n\n'
+    kind = i % 4
+    if kind == 0:
+        return (f'@property\ndef {name}(self, value: int = {rng.randint(0, 99)}) -> str:\n'
+                f'    """{_sentence(rng)}"""\n'
+                f'    # TODO: {_sentence(rng).lower()}\n'
+                f'    items = [x * 2 for x in range(value) if x % {rng.randint(2, 9)}]\n'
+                f'    return f"{{value}} {name} {{len(items)}}"\n\n\n')
+    if kind == 1:
+        return (f'class {name.title().replace("_", "")}:\n'
+                f'    limit: int = {rng.randint(1, 1000)}\n\n'
+                f'    def run(self, data):\n'
+                f'        try:\n'
+                f'            counts = {{k: v for k, v in Counter(data).items()}}\n'
+                f'        except (KeyError, ValueError) as e:\n'
+                f'            raise RuntimeError("{_sentence(rng)}") from e\n'
+                f'        return counts\n\n\n')
+    if kind == 2:
+        return f'# {_sentence(rng)}\n{name.upper()} = {{"{name}": {rng.random():.6f}}}\n\n'
+    return (f'def {name}(*args, **kwargs):\n'
+            f'    text = \'{_sentence(rng)}\'\n'
+            f'    return sum(len(a) for a in args) + len(text)\n\n\n')
+
+
+def _html(rng, i):
+    if i == 0:
+        return '<!DOCTYPE html>\n<html lang="en">\n<head>\n<title>Benchmark</title>\n</head>\n<body>\n'
+    kind = i % 4
+    if kind == 0:
+        return (f'<div class="{_name(rng)} item" id="n{i}">\n'
+                f'  <p>{_sentence(rng)} <a href="/{_name(rng)}/{i}">{_name(rng)}</a></p>\n'
+                f'  <img src="img/{i}.png" alt="{_name(rng)}"/>\n</div>\n')
+    if kind == 1:
+        return f'<!-- {_sentence(rng)} -->\n<section><h2>{_sentence(rng)}</h2></section>\n'
+    if kind == 2:
+        return f'<script>var n{i} = {rng.randint(0, 999)}; console.log("{_name(rng)}");</script>\n'
+    return f'<style>.c{i} {{ color: #{rng.randrange(1 << 24):06x}; }}</style>\n'
+
+
+def _css(rng, i):
+    kind = i % 3
+    if kind == 0:
+        return (f'.{_name(rng)}, #{_name(rng)} > a:hover {{\n'
+                f'  color: #{rng.randrange(1 << 24):06x};\n'
+                f'  margin: {rng.randint(0, 40)}px {rng.randint(0, 40)}px;\n'
+                f'  font-family: "Helvetica", sans-serif;\n}}\n\n')
+    if kind == 1:
+        return (f'@media (max-width: {rng.randint(300, 1400)}px) {{\n'
+                f'  .{_name(rng)} {{ display: none; }}\n}}\n\n')
+    return f'/* {_sentence(rng)} */\n#{_name(rng)} {{ padding: {rng.randint(0, 9)}em; }}\n\n'
+
+
+def _javascript(rng, i):
+    name = _name(rng)
+    kind = i % 4
+    if kind == 0:
+        return (f'function {name}(a, b) {{\n'
+                f'  // {_sentence(rng)}\n'
+                f'  const total = a + b * {rng.randint(1, 99)};\n'
+                f'  return `{name}: ${{total}}`;\n}}\n\n')
+    if kind == 1:
+        return f'let {name} = (x) => x.map(y => y * {rng.randint(2, 9)});\n'
+    if kind == 2:
+        return f'/* {_sentence(rng)} */\nvar {name} = {{ key: "{_name(rng)}", n: {rng.random():.4f} }};\n'
+    return (f'const {name} = async function () {{\n'
+            f'  if ({name}.ready) {{ return await fetch("/{_name(rng)}"); }}\n}};\n\n')
+
+
+def _record(rng, i):
+    return (f'{{"id": {i}, "name": "{_name(rng)}", "score": {rng.random() * 100:.3f}, '
+            f'"active": {rng.choice(("true", "false"))}, "tags": ["{_name(rng)}", "{_name(rng)}"], '
+            f'"meta": {{"note": "{_sentence(rng)}", "parent": null, "depth": [{rng.randint(0, 9)}, '
+            f'[{rng.randint(0, 9)}]]}}}}')
+
+
+def _json(rng, i):
+    return ('[\n' if i == 0 else ',\n') + _record(rng, i)
+
+
+def _xml(rng, i):
+    if i == 0:
+        return '<?xml version="1.0" encoding="UTF-8"?>\n<catalog>\n'
+    if i % 5 == 0:
+        return f'  <!-- {_sentence(rng)} -->\n'
+    return (f'  <item id="{i}" type="{_name(rng)}">\n'
+            f'    <title>{_sentence(rng)}</title>\n'
+            f'    <flag value="{rng.randint(0, 1)}"/>\n  </item>\n')
+
+
+def _long_line(rng, i):
+    # One line, no newline anywhere
+    return ' '.join(_words(rng, 64)) + ' '
+
+
+def _deep_nesting(rng, i):
+    # Arrays and objects nested thousands of levels deep, as one JSON document;
+    # the first unit is shallower, so it fits the smallest size
+    depth = rng.randint(200, 400) if i == 0 else rng.randint(500, 2000)
+    body = '[' * depth + f'{{"k": {{"v": [{i}]}}}}' + ']' * depth
+    return ('[\n' if i == 0 else ',\n') + body
+
+
+def _non_ascii(rng, i):
+    words = rng.choices(NON_ASCII_WORDS, NON_ASCII_WEIGHTS, k=rng.randint(6, 30))
+    mixed = [w if rng.random() < 0.7 else rng.choice(WORDS) for w in words]
+    return ' '.join(mixed) + rng.choice(('。', '.', '!', '?', '…')) + '\n'
+
+
+# kind: (extension, unit, closing text)
+KINDS = {
+    'prose': ('.txt', _prose, ''),
+    'python': ('.py', _python, ''),
+    'html': ('.html', _html, '</body>\n</html>\n'),
+    'css': ('.css', _css, ''),
+    'javascript': ('.js', _javascript, ''),
+    'json': ('.json', _json, '\n]\n'),
+    'xml': ('.xml', _xml, '</catalog>\n'),
+    'long-line': ('.txt', _long_line, ''),
+    'deep-nesting': ('.json', _deep_nesting, '\n]\n'),
+    'non-ascii': ('.txt', _non_ascii, ''),
+}
+
+
+def default_corpus_dir():
+    return os.path.join(tempfile.gettempdir(), 'file-stats-benchmark-corpus')
+
+
+def corpus_path(kind, size, directory=None):
+    ext = KINDS[kind][0]
+    return os.path.join(directory or default_corpus_dir(),
+                        f'{kind}-{size}-v{GENERATOR_VERSION}{ext}')
+
+
+def generate(kind, size, path, seed=0):
+    # Writes at most SIZES[size] bytes of UTF-8 text, always ending with the
+    # kind's closing text so documents stay well-formed (unless the first
+    # unit alone does not fit, and is cut)
+    ext, unit, closing = KINDS[kind]
+    limit = SIZES[size] - len(closing.encode('utf-8'))
+    rng = random.Random(f'{kind}:{seed}')
+    written = 0
+    pending = []
+    pending_bytes = 0
+    i = 0
+    with open(path + '.tmp', 'wb') as f:
+        while True:
+            piece = unit(rng, i).encode('utf-8')
+            if written + pending_bytes + len(piece) > limit:
+                if i:
+                    break
+                piece = piece[:limit].decode('utf-8', 'ignore').encode('utf-8')
+            pending.append(piece)
+            pending_bytes += len(piece)
+            i += 1
+            if pending_bytes >= WRITE_BLOCK:
+                f.write(b''.join(pending))
+                written += pending_bytes
+                pending = []
+                pending_bytes = 0
+        f.write(b''.join(pending) + closing.encode('utf-8'))
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def ensure(kind, size, directory=None, seed=0):
+    # The corpus file for (kind, size), generated on first use
+    path = corpus_path(kind, size, directory)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        generate(kind, size, path, seed)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the benchmark corpus.")
+    parser.add_argument('--kinds', default=','.join(KINDS),
+                        help="comma-separated kinds (default: all)")
+    parser.add_argument('--sizes', default='1k,1m', help=f"comma-separated sizes ({', '.join(SIZES)})")
+    parser.add_argument('--corpus', default=None, metavar='DIR',
+                        help=f"where to write the files (default: {default_corpus_dir()})")
+    args = parser.parse_args(argv)
+    for kind in args.kinds.split(','):
+        for size in args.sizes.split(','):
+            if kind not in KINDS or size not in SIZES:
+                parser.error(f"unknown kind or size: {kind} {size}")
+            print(ensure(kind, size, args.corpus))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,24 @@
 import tkinter as tk
-from tkinter import filedialog, scrolledtext, ttk
+from tkinter import filedialog, messagebox, scrolledtext, ttk
 import os
-import re
-from collections import Counter
-from datetime import datetime
-import string
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import nullcontext
+
+from stats_archives import archive_kind, archive_results, format_archive
+from stats_cache import StatsCache
+from stats_engine import (AnalysisCancelled, LineIndex, calculate_stats, format_performance,
+                          format_report, stream_stats)
+from stats_profile import StageTimings, add_stage, profile_from_env, profiled
+from stats_watch import DEFAULT_DEBOUNCE, WatchSession, debounced, make_watcher
+
+# How often the Tk loop drains messages from the analysis worker (ms)
+POLL_INTERVAL = 50
+# Longest part of a line shown when jumping to it, and in previews (bytes)
+LINE_VIEW_BYTES = 100_000
+PREVIEW_BYTES = 120
 
 class FileStatsAnalyzer:
     def __init__(self, root):
@@ -12,17 +26,69 @@ class FileStatsAnalyzer:
         self.root.title("File Statistics Analyzer - Comprehensive Edition")
         self.root.geometry("900x700")
         
-        # Browse button
-        self.browse_btn = tk.Button(root, text="Browse File", command=self.browse_file, 
+        # Background analysis state
+        self.messages = queue.Queue()
+        self.cancel_event = None
+        self.job_id = 0
+        self.polling = False
+        # Line index of the file on display, when its encoding allows one
+        self.line_index = None
+        # (profiler, output path) set through FILE_STATS_PROFILE; a value
+        # that cannot be used is reported and the app runs without it
+        try:
+            self.profile = profile_from_env()
+        except ValueError as e:
+            self.profile = None
+            messagebox.showwarning("Profiling", f"{e}. Analyzing without profiling.")
+        # Watching re-analyzes the file on display whenever it is saved
+        self.filepath = None
+        self.watch_stop = None
+        self.watch_session = WatchSession(timings=True)
+        self.watch_lock = threading.Lock()
+        
+        # Re-opening an unchanged file reuses the cached result
+        try:
+            self.cache = StatsCache()
+        except (OSError, sqlite3.Error):
+            self.cache = None
+        
+        # Browse and cancel buttons
+        button_frame = tk.Frame(root)
+        button_frame.pack(pady=20)
+        self.browse_btn = tk.Button(button_frame, text="Browse File", command=self.browse_file, 
                                     font=("Arial", 12), bg="#4CAF50", fg="white", 
                                     padx=20, pady=10)
-        self.browse_btn.pack(pady=20)
+        self.browse_btn.pack(side=tk.LEFT, padx=5)
+        self.cancel_btn = tk.Button(button_frame, text="Cancel", command=self.cancel_analysis, 
+                                    font=("Arial", 12), padx=20, pady=10, state=tk.DISABLED)
+        self.cancel_btn.pack(side=tk.LEFT, padx=5)
+        
+        # Line lookups, enabled once the line index is built
+        tk.Label(button_frame, text="Line:", font=("Arial", 10)).pack(side=tk.LEFT, padx=(20, 2))
+        self.line_entry = tk.Entry(button_frame, width=10, font=("Arial", 10))
+        self.line_entry.pack(side=tk.LEFT)
+        self.line_entry.bind('<Return>', lambda event: self.go_to_line())
+        self.goto_btn = tk.Button(button_frame, text="Go to Line", command=self.go_to_line, 
+                                  font=("Arial", 10), state=tk.DISABLED)
+        self.goto_btn.pack(side=tk.LEFT, padx=5)
+        self.longest_btn = tk.Button(button_frame, text="Longest Lines", 
+                                     command=self.show_longest_lines, font=("Arial", 10), 
+                                     state=tk.DISABLED)
+        self.longest_btn.pack(side=tk.LEFT, padx=5)
+        self.watch_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(button_frame, text="Watch", variable=self.watch_var, 
+                       command=self.toggle_watch, font=("Arial", 10)).pack(side=tk.LEFT, padx=5)
         
         # File path label
         self.file_label = tk.Label(root, text="No file selected", font=("Arial", 10), 
                                    fg="gray")
         self.file_label.pack()
         
+        # Progress bar, driven by bytes processed
+        self.progress = ttk.Progressbar(root, orient=tk.HORIZONTAL, mode='determinate', 
+                                        maximum=100)
+        self.progress.pack(fill=tk.X, padx=20, pady=(10, 0))
+        
         # Results text area with larger size
         self.results_text = scrolledtext.ScrolledText(root, width=100, height=35, 
                                                       font=("Courier", 9), 
@@ -37,9 +103,10 @@ class FileStatsAnalyzer:
                       ("HTML files", "*.html"),
                       ("CSS files", "*.css"),
                       ("JavaScript files", "*.js"),
-                      ("JSON files", "*.json"),
+                      ("JSON files", "*.json *.jsonl *.ndjson"),
                       ("XML files", "*.xml"),
-                      ("Text files", "*.txt")]
+                      ("Text files", "*.txt"),
+                      ("Archives", "*.zip *.tar *.tgz *.tbz2 *.txz *.gz *.bz2 *.xz")]
         )
         
         if filepath:
@@ -54,532 +121,256 @@ class FileStatsAnalyzer:
                       ("HTML files", "*.html"),
                       ("CSS files", "*.css"),
                       ("JavaScript files", "*.js"),
-                      ("JSON files", "*.json"),
+                      ("JSON files", "*.json *.jsonl *.ndjson"),
                       ("XML files", "*.xml"),
-                      ("Text files", "*.txt")]
+                      ("Text files", "*.txt"),
+                      ("Archives", "*.zip *.tar *.tgz *.tbz2 *.txz *.gz *.bz2 *.xz")]
         )
         
         if filepath:
             self.file_label.config(text=f"File: {os.path.basename(filepath)}")
             self.analyze_file(filepath)
     
-    def analyze_file(self, filepath):
+    def analyze_file(self, filepath, changed=False):
+        # Opening a new file supersedes whatever is still running. A watched
+        # file that `changed` keeps its report on display until the new one
+        # is ready, so the job it replaces is cancelled without a message.
+        if not changed:
+            self.cancel_analysis()
+        elif self.cancel_event is not None:
+            self.cancel_event.set()
+        self.job_id += 1
+        self.cancel_event = threading.Event()
+        self.progress['value'] = 0
+        self.cancel_btn.config(state=tk.NORMAL)
+        if not changed:
+            self.set_line_index(None)
+            self.results_text.delete(1.0, tk.END)
+            self.results_text.insert(tk.END, f"Analyzing {os.path.basename(filepath)}...")
+            self.filepath = filepath
+            if self.watch_var.get():
+                self.start_watch(filepath)
+        
+        worker = threading.Thread(target=self.run_analysis, 
+                                  args=(self.job_id, filepath, self.cancel_event, changed), 
+                                  daemon=True)
+        worker.start()
+        self.start_polling()
+    
+    def start_polling(self):
+        if not self.polling:
+            self.polling = True
+            self.root.after(POLL_INTERVAL, self.poll_messages)
+    
+    def run_analysis(self, job_id, filepath, cancel_event, changed=False):
+        # Runs on the worker thread; never touches Tk widgets directly
+        def report_progress(done, total):
+            self.messages.put(('progress', job_id, done, total))
+        
+        profile = profiled(*self.profile) if self.profile else nullcontext()
         try:
-            # Try different encodings
-            content = None
-            encoding_used = None
-            for encoding in ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252', 'ascii']:
+            with profile:
+                # Detect the encoding from the first block and stream the rest
+                changes = None
+                if archive_kind(filepath) is not None:
+                    # Every member, then the totals, without a line index
+                    results = archive_results(filepath, progress=report_progress,
+                                              cancel=cancel_event)
+                    self.messages.put(('archive', job_id, results))
+                    return
+                if changed:
+                    # Unchanged content is not scanned again, appended bytes
+                    # are scanned from where the last run stopped
+                    with self.watch_lock:
+                        stats, changes = self.watch_session.analyze(
+                            filepath, progress=report_progress, cancel=cancel_event)
+                    if changes == {}:
+                        self.messages.put(('done', job_id, stats, None, changes))
+                        return
+                elif self.cache is not None:
+                    stats = self.cache.analyze(filepath, progress=report_progress,
+                                               cancel=cancel_event, timings=True)
+                else:
+                    stats = stream_stats(filepath, progress=report_progress, cancel=cancel_event,
+                                         timings=True)
+                if not changed:
+                    with self.watch_lock:
+                        self.watch_session.add(stats)
+                # Files in other encodings (or without NumPy) just have no index
+                started = StageTimings().start()
                 try:
-                    with open(filepath, 'r', encoding=encoding) as f:
-                        content = f.read()
-                    encoding_used = encoding
-                    break
-                except:
-                    continue
-            
-            if content is None:
-                self.results_text.delete(1.0, tk.END)
-                self.results_text.insert(tk.END, "Error: Could not decode file with common encodings")
-                return
-            
-            # Get file metadata
-            file_stats = os.stat(filepath)
-            
-            stats = self.calculate_stats(content, filepath, encoding_used, file_stats)
-            self.display_stats(stats)
-            
+                    line_index = LineIndex(filepath, stats['encoding'], cancel=cancel_event)
+                except (RuntimeError, ValueError, OSError):
+                    line_index = None
+                add_stage(stats['performance'], 'line_index', started, stats['file_size'])
+            self.messages.put(('done', job_id, stats, line_index, changes))
+        except AnalysisCancelled:
+            self.messages.put(('cancelled', job_id))
         except Exception as e:
-            self.results_text.delete(1.0, tk.END)
-            self.results_text.insert(tk.END, f"Error reading file: {str(e)}")
+            self.messages.put(('error', job_id, str(e)))
     
-    def detect_line_ending(self, content):
-        crlf = content.count('\r\n')
-        lf = content.count('\n') - crlf
-        cr = content.count('\r') - crlf
-        
-        if crlf > lf and crlf > cr:
-            return "CRLF (Windows)"
-        elif lf > crlf and lf > cr:
-            return "LF (Unix/Mac)"
-        elif cr > 0:
-            return "CR (Old Mac)"
-        return "Mixed/Unknown"
+    def toggle_watch(self):
+        if self.watch_var.get() and self.filepath is not None:
+            self.start_watch(self.filepath)
+        else:
+            self.stop_watch()
     
-    def calculate_readability(self, content):
-        sentences = re.split(r'[.!?]+', content)
-        sentences = [s.strip() for s in sentences if s.strip()]
-        words = content.split()
-        
-        if not words or not sentences:
-            return None
-        
-        # Simple Flesch Reading Ease approximation
-        syllables = sum(self.count_syllables(word) for word in words)
-        avg_sentence_length = len(words) / len(sentences)
-        avg_syllables_per_word = syllables / len(words)
-        
-        flesch_score = 206.835 - 1.015 * avg_sentence_length - 84.6 * avg_syllables_per_word
-        
-        return {
-            'flesch_score': flesch_score,
-            'sentences': len(sentences),
-            'avg_sentence_length': avg_sentence_length,
-            'avg_syllables_per_word': avg_syllables_per_word
-        }
+    def start_watch(self, filepath):
+        self.stop_watch()
+        self.watch_stop = threading.Event()
+        watcher = threading.Thread(target=self.watch_file, args=(filepath, self.watch_stop), 
+                                   daemon=True)
+        watcher.start()
+        self.start_polling()
     
-    def count_syllables(self, word):
-        word = word.lower()
-        vowels = "aeiouy"
-        count = 0
-        prev_was_vowel = False
-        
-        for char in word:
-            is_vowel = char in vowels
-            if is_vowel and not prev_was_vowel:
-                count += 1
-            prev_was_vowel = is_vowel
-        
-        if word.endswith('e'):
-            count -= 1
-        if count == 0:
-            count = 1
-            
-        return count
+    def stop_watch(self):
+        if self.watch_stop is not None:
+            self.watch_stop.set()
+            self.watch_stop = None
     
-    def calculate_stats(self, content, filepath, encoding, file_stats):
-        lines = content.split('\n')
-        ext = os.path.splitext(filepath)[1].lower()
-        
-        stats = {
-            'filename': os.path.basename(filepath),
-            'filepath': filepath,
-            'file_size': len(content.encode('utf-8')),
-            'encoding': encoding,
-            'has_bom': content.startswith('\ufeff'),
-            'line_ending': self.detect_line_ending(content),
-            
-            # Time metadata
-            'created': datetime.fromtimestamp(file_stats.st_ctime).strftime('%Y-%m-%d %H:%M:%S'),
-            'modified': datetime.fromtimestamp(file_stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
-            'accessed': datetime.fromtimestamp(file_stats.st_atime).strftime('%Y-%m-%d %H:%M:%S'),
-            
-            # Basic counts
-            'total_chars': len(content),
-            'total_lines': len(lines),
-            'non_empty_lines': len([l for l in lines if l.strip()]),
-            'empty_lines': len([l for l in lines if not l.strip()]),
-            'total_words': len(content.split()),
-            'unique_words': len(set(content.lower().split())),
-            
-            # Character types
-            'spaces': content.count(' '),
-            'tabs': content.count('\t'),
-            'newlines': content.count('\n'),
-            'alphabetic': sum(c.isalpha() for c in content),
-            'numeric': sum(c.isdigit() for c in content),
-            'uppercase': sum(c.isupper() for c in content),
-            'lowercase': sum(c.islower() for c in content),
-            'special_chars': sum(not c.isalnum() and not c.isspace() for c in content),
-            'non_ascii': sum(ord(c) > 127 for c in content),
-            
-            # Punctuation
-            'commas': content.count(','),
-            'periods': content.count('.'),
-            'semicolons': content.count(';'),
-            'colons': content.count(':'),
-            'exclamations': content.count('!'),
-            'questions': content.count('?'),
-            
-            # Brackets and quotes
-            'parentheses_open': content.count('('),
-            'parentheses_close': content.count(')'),
-            'braces_open': content.count('{'),
-            'braces_close': content.count('}'),
-            'brackets_open': content.count('['),
-            'brackets_close': content.count(']'),
-            'angle_brackets_open': content.count('<'),
-            'angle_brackets_close': content.count('>'),
-            'single_quotes': content.count("'"),
-            'double_quotes': content.count('"'),
-            'backticks': content.count('`'),
-        }
-        
-        # Lexical diversity
-        if stats['total_words'] > 0:
-            stats['lexical_diversity'] = stats['unique_words'] / stats['total_words']
-        else:
-            stats['lexical_diversity'] = 0
-        
-        # Word statistics
-        words = content.split()
-        if words:
-            word_lengths = [len(w) for w in words]
-            stats['avg_word_length'] = sum(word_lengths) / len(word_lengths)
-            stats['max_word_length'] = max(word_lengths)
-            stats['min_word_length'] = min(word_lengths)
-            
-            # Most common words (excluding very short ones)
-            word_freq = Counter(w.lower() for w in words if len(w) > 3)
-            stats['top_words'] = word_freq.most_common(10)
-        else:
-            stats['avg_word_length'] = 0
-            stats['max_word_length'] = 0
-            stats['min_word_length'] = 0
-            stats['top_words'] = []
-        
-        # Indentation analysis
-        indents = []
-        stats['trailing_whitespace_lines'] = 0
-        for line in lines:
-            if line and line != line.rstrip():
-                stats['trailing_whitespace_lines'] += 1
-            if line and line[0] in [' ', '\t']:
-                leading_spaces = len(line) - len(line.lstrip(' '))
-                leading_tabs = len(line) - len(line.lstrip('\t'))
-                indents.append(max(leading_spaces, leading_tabs))
-        
-        stats['indented_lines'] = len(indents)
-        stats['avg_indentation'] = sum(indents) / len(indents) if indents else 0
-        stats['max_indentation'] = max(indents) if indents else 0
-        
-        # Line length analysis
-        line_lengths = [len(line) for line in lines]
-        stats['avg_line_length'] = sum(line_lengths) / len(line_lengths) if line_lengths else 0
-        stats['max_line_length'] = max(line_lengths) if line_lengths else 0
-        stats['min_line_length'] = min(line_lengths) if line_lengths else 0
-        stats['lines_over_79'] = len([l for l in lines if len(l) > 79])
-        stats['lines_over_99'] = len([l for l in lines if len(l) > 99])
-        
-        # Nesting depth
-        max_nesting = 0
-        current_nesting = 0
-        for char in content:
-            if char in '({[':
-                current_nesting += 1
-                max_nesting = max(max_nesting, current_nesting)
-            elif char in ')}]':
-                current_nesting = max(0, current_nesting - 1)
-        stats['max_nesting_depth'] = max_nesting
-        
-        # Character frequency (top 15)
-        char_freq = Counter(content)
-        stats['char_frequency'] = char_freq.most_common(15)
-        
-        # Readability metrics
-        readability = self.calculate_readability(content)
-        if readability:
-            stats.update(readability)
-        
-        # Python specific
-        if ext == '.py':
-            stats['python_comments'] = len([l for l in lines if l.strip().startswith('#')])
-            stats['python_imports'] = len([l for l in lines if 'import' in l])
-            stats['python_functions'] = len(re.findall(r'\bdef\s+\w+\s*\(', content))
-            stats['python_classes'] = len(re.findall(r'\bclass\s+\w+', content))
-            stats['python_decorators'] = len(re.findall(r'@\w+', content))
-            stats['python_f_strings'] = len(re.findall(r'f["\']', content))
-            stats['python_list_comp'] = len(re.findall(r'\[.*for.*in.*\]', content))
-            stats['python_try_except'] = len(re.findall(r'\btry:', content))
-            stats['python_docstrings'] = len(re.findall(r'"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'', content))
-            stats['python_type_hints'] = len(re.findall(r':\s*\w+\s*[,\)]', content))
-            stats['python_todos'] = len(re.findall(r'#\s*(TODO|FIXME|NOTE|HACK|XXX)', content, re.IGNORECASE))
+    def watch_file(self, filepath, stop):
+        # Runs on the watcher thread; editors that save by replacing the file
+        # are seen through its directory
+        try:
+            watcher = make_watcher([(os.path.dirname(filepath), False)], lambda: [filepath])
+        except OSError as e:
+            self.messages.put(('watch_error', filepath, str(e)))
+            return
+        try:
+            for changed in debounced(watcher, DEFAULT_DEBOUNCE, stop):
+                if filepath in changed and os.path.isfile(filepath):
+                    self.messages.put(('changed', filepath))
+        finally:
+            watcher.close()
+    
+    def cancel_analysis(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.cancel_event = None
+            self.cancel_btn.config(state=tk.DISABLED)
+            self.results_text.delete(1.0, tk.END)
+            self.results_text.insert(tk.END, "Analysis cancelled.")
+    
+    def poll_messages(self):
+        running = self.cancel_event is not None
+        while True:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            kind, job_id = message[0], message[1]
+            # Watcher messages name the file instead of a job
+            if kind in ('changed', 'watch_error'):
+                if job_id == self.filepath and self.watch_stop is not None:
+                    if kind == 'changed':
+                        self.analyze_file(job_id, changed=True)
+                        running = True
+                    else:
+                        messagebox.showerror("Watch", message[2])
+                        self.watch_var.set(False)
+                        self.stop_watch()
+                continue
+            if job_id != self.job_id:
+                continue
             
-            # String literals
-            single_strings = re.findall(r"'[^']*'", content)
-            double_strings = re.findall(r'"[^"]*"', content)
-            all_strings = single_strings + double_strings
-            stats['string_literals'] = len(all_strings)
-            if all_strings:
-                stats['avg_string_length'] = sum(len(s) - 2 for s in all_strings) / len(all_strings)
-            else:
-                stats['avg_string_length'] = 0
-        
-        # HTML specific
-        elif ext in ['.html', '.htm']:
-            stats['html_tags'] = len(re.findall(r'<[^>]+>', content))
-            stats['html_comments'] = len(re.findall(r'<!--.*?-->', content, re.DOTALL))
-            stats['html_div_tags'] = len(re.findall(r'<div\b', content, re.IGNORECASE))
-            stats['html_script_tags'] = len(re.findall(r'<script\b', content, re.IGNORECASE))
-            stats['html_style_tags'] = len(re.findall(r'<style\b', content, re.IGNORECASE))
-            stats['html_img_tags'] = len(re.findall(r'<img\b', content, re.IGNORECASE))
-            stats['html_a_tags'] = len(re.findall(r'<a\b', content, re.IGNORECASE))
+            if kind == 'progress':
+                done, total = message[2], message[3]
+                self.progress['value'] = 100 * done / total if total else 100
+                continue
             
-            # Attribute count
-            attributes = re.findall(r'\w+\s*=\s*["\'][^"\']*["\']', content)
-            stats['html_attributes'] = len(attributes)
-        
-        # CSS specific
-        elif ext == '.css':
-            stats['css_selectors'] = len(re.findall(r'[.#\w\s>+~\[\]:]+\s*{', content))
-            stats['css_properties'] = len(re.findall(r'[\w-]+\s*:', content))
-            stats['css_comments'] = len(re.findall(r'/\*.*?\*/', content, re.DOTALL))
-            stats['css_media_queries'] = len(re.findall(r'@media', content))
-            stats['css_classes'] = len(set(re.findall(r'\.[\w-]+', content)))
-            stats['css_ids'] = len(set(re.findall(r'#[\w-]+', content)))
-        
-        # JavaScript specific
-        elif ext == '.js':
-            stats['js_functions'] = len(re.findall(r'\bfunction\s+\w+\s*\(', content))
-            stats['js_arrow_functions'] = len(re.findall(r'=>', content))
-            stats['js_var_declarations'] = len(re.findall(r'\bvar\s+\w+', content))
-            stats['js_let_declarations'] = len(re.findall(r'\blet\s+\w+', content))
-            stats['js_const_declarations'] = len(re.findall(r'\bconst\s+\w+', content))
-            stats['js_comments_single'] = len(re.findall(r'//.*', content))
-            stats['js_comments_multi'] = len(re.findall(r'/\*.*?\*/', content, re.DOTALL))
-            stats['js_template_literals'] = len(re.findall(r'`[^`]*`', content))
-        
-        # JSON specific
-        elif ext == '.json':
-            try:
-                import json
-                json_data = json.loads(content)
-                stats['json_valid'] = True
-                stats['json_depth'] = self.get_json_depth(json_data)
-                stats['json_keys'] = self.count_json_keys(json_data)
-            except:
-                stats['json_valid'] = False
-        
-        # XML specific
-        elif ext == '.xml':
-            stats['xml_tags'] = len(re.findall(r'<[^/>][^>]*>', content))
-            stats['xml_self_closing'] = len(re.findall(r'<[^>]+/>', content))
-            stats['xml_comments'] = len(re.findall(r'<!--.*?-->', content, re.DOTALL))
+            running = False
+            self.cancel_event = None
+            self.cancel_btn.config(state=tk.DISABLED)
+            if kind == 'done':
+                self.progress['value'] = 100
+                changes = message[4]
+                if changes is not None:
+                    name = os.path.basename(self.filepath)
+                    checked = time.strftime('%H:%M:%S')
+                    self.file_label.config(
+                        text=f"File: {name} (checked {checked}, {len(changes)} fields changed)")
+                if changes != {}:
+                    self.display_stats(message[2], keep_position=changes is not None)
+                    self.set_line_index(message[3])
+            elif kind == 'archive':
+                self.progress['value'] = 100
+                self.results_text.delete(1.0, tk.END)
+                self.results_text.insert(tk.END, format_archive(message[2]))
+            elif kind == 'error':
+                self.results_text.delete(1.0, tk.END)
+                self.results_text.insert(tk.END, f"Error reading file: {message[2]}")
         
-        return stats
+        # A watched file keeps the loop going to hear about changes
+        running = running or self.watch_stop is not None
+        self.polling = running
+        if running:
+            self.root.after(POLL_INTERVAL, self.poll_messages)
+    
+    def set_line_index(self, line_index):
+        self.line_index = line_index
+        state = tk.NORMAL if line_index is not None else tk.DISABLED
+        self.goto_btn.config(state=state)
+        self.longest_btn.config(state=state)
     
-    def get_json_depth(self, obj, depth=0):
-        if isinstance(obj, dict):
-            if not obj:
-                return depth
-            return max(self.get_json_depth(v, depth + 1) for v in obj.values())
-        elif isinstance(obj, list):
-            if not obj:
-                return depth
-            return max(self.get_json_depth(item, depth + 1) for item in obj)
-        return depth
+    def go_to_line(self):
+        if self.line_index is None:
+            return
+        try:
+            number = int(self.line_entry.get().replace(',', ''))
+            text = self.line_index.line(number, limit=LINE_VIEW_BYTES)
+        except ValueError:
+            messagebox.showerror("Go to Line", "Enter a line number.")
+            return
+        except (IndexError, OSError) as e:
+            messagebox.showerror("Go to Line", str(e))
+            return
+        length = int(self.line_index.lengths[number - 1])
+        self.show_text_window(f"Line {number:,}", f"Line {number:,} ({length:,} chars)\n\n{text}")
+    
+    def show_longest_lines(self):
+        if self.line_index is None:
+            return
+        index = self.line_index
+        percentiles = ', '.join(f"p{q}: {v:,.0f}" for q, v in index.percentiles().items())
+        output = f"{len(index):,} lines; length {percentiles}\n\n"
+        try:
+            for number, length in index.longest(20):
+                preview = index.line(number, limit=PREVIEW_BYTES).strip()
+                output += f"Line {number:>10,} : {length:>8,} chars  {preview}\n"
+        except OSError as e:
+            output += f"Error reading file: {e}\n"
+        self.show_text_window("Longest Lines", output)
     
-    def count_json_keys(self, obj):
-        count = 0
-        if isinstance(obj, dict):
-            count += len(obj)
-            for v in obj.values():
-                count += self.count_json_keys(v)
-        elif isinstance(obj, list):
-            for item in obj:
-                count += self.count_json_keys(item)
-        return count
+    def show_text_window(self, title, text):
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        view = scrolledtext.ScrolledText(window, width=100, height=25, font=("Courier", 9), 
+                                         wrap=tk.NONE)
+        view.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        view.insert(tk.END, text)
+        view.config(state=tk.DISABLED)
+    
+    def calculate_stats(self, content, filepath, encoding, file_stats):
+        return calculate_stats(content, filepath, encoding, file_stats)
     
-    def display_stats(self, stats):
+    def display_stats(self, stats, keep_position=False):
+        # Rendering is timed too, so the performance section comes last.
+        # Reports of a watched file are replaced where they were scrolled to.
+        performance = stats.pop('performance', None)
+        position = self.results_text.yview()[0]
+        started = StageTimings().start()
+        report = format_report(stats)
         self.results_text.delete(1.0, tk.END)
-        
-        output = f"""
-╔═══════════════════════════════════════════════════════════════════════════╗
-║                    COMPREHENSIVE FILE STATISTICS REPORT                   ║
-╚═══════════════════════════════════════════════════════════════════════════╝
-
-📁 FILE INFORMATION
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-File Name:             {stats['filename']}
-File Size:             {stats['file_size']:,} bytes ({stats['file_size']/1024:.2f} KB)
-Encoding:              {stats['encoding']}
-BOM Present:           {'Yes' if stats['has_bom'] else 'No'}
-Line Endings:          {stats['line_ending']}
-
-📅 TIME METADATA
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Created:               {stats['created']}
-Modified:              {stats['modified']}
-Last Accessed:         {stats['accessed']}
-
-📊 CHARACTER STATISTICS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Total Characters:      {stats['total_chars']:,}
-Alphabetic:            {stats['alphabetic']:,}
-Numeric:               {stats['numeric']:,}
-Uppercase:             {stats['uppercase']:,}
-Lowercase:             {stats['lowercase']:,}
-Special Characters:    {stats['special_chars']:,}
-Non-ASCII Characters:  {stats['non_ascii']:,}
-Spaces:                {stats['spaces']:,}
-Tabs:                  {stats['tabs']:,}
-Newlines:              {stats['newlines']:,}
-
-📝 LINE STATISTICS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Total Lines:           {stats['total_lines']:,}
-Non-Empty Lines:       {stats['non_empty_lines']:,}
-Empty Lines:           {stats['empty_lines']:,}
-Average Line Length:   {stats['avg_line_length']:.2f} chars
-Maximum Line Length:   {stats['max_line_length']:,} chars
-Minimum Line Length:   {stats['min_line_length']:,} chars
-Lines Over 79 Chars:   {stats['lines_over_79']:,}
-Lines Over 99 Chars:   {stats['lines_over_99']:,}
-Trailing Whitespace:   {stats['trailing_whitespace_lines']:,} lines
-
-🔤 WORD STATISTICS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Total Words:           {stats['total_words']:,}
-Unique Words:          {stats['unique_words']:,}
-Lexical Diversity:     {stats['lexical_diversity']:.4f}
-Average Word Length:   {stats['avg_word_length']:.2f} chars
-Maximum Word Length:   {stats['max_word_length']:,} chars
-Minimum Word Length:   {stats['min_word_length']:,} chars
-
-⬆️ INDENTATION STATISTICS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Indented Lines:        {stats['indented_lines']:,}
-Average Indentation:   {stats['avg_indentation']:.2f} spaces
-Maximum Indentation:   {stats['max_indentation']:,} spaces
-
-🔣 PUNCTUATION STATISTICS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Commas (,):            {stats['commas']:,}
-Periods (.):           {stats['periods']:,}
-Semicolons (;):        {stats['semicolons']:,}
-Colons (:):            {stats['colons']:,}
-Exclamations (!):      {stats['exclamations']:,}
-Questions (?):         {stats['questions']:,}
-
-🔐 BRACKETS & QUOTES
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Parentheses ( ):       {stats['parentheses_open']:,} open, {stats['parentheses_close']:,} close
-Braces {{ }}:            {stats['braces_open']:,} open, {stats['braces_close']:,} close
-Brackets [ ]:          {stats['brackets_open']:,} open, {stats['brackets_close']:,} close
-Angle Brackets < >:    {stats['angle_brackets_open']:,} open, {stats['angle_brackets_close']:,} close
-Single Quotes ('):     {stats['single_quotes']:,}
-Double Quotes ("):     {stats['double_quotes']:,}
-Backticks (`):         {stats['backticks']:,}
-
-🏗️ CODE STRUCTURE
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Max Nesting Depth:     {stats['max_nesting_depth']}
-"""
-        
-        # Readability metrics
-        if 'flesch_score' in stats:
-            output += f"""
-📖 READABILITY METRICS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Flesch Reading Ease:   {stats['flesch_score']:.2f}
-Sentences:             {stats['sentences']:,}
-Avg Sentence Length:   {stats['avg_sentence_length']:.2f} words
-Avg Syllables/Word:    {stats['avg_syllables_per_word']:.2f}
-"""
-        
-        # Top words
-        if stats['top_words']:
-            output += f"""
-🔝 TOP 10 MOST FREQUENT WORDS (>3 chars)
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-"""
-            for word, count in stats['top_words']:
-                output += f"{word:>20} : {count:,} times\n"
-        
-        # Character frequency
-        output += f"""
-🔤 TOP 15 MOST FREQUENT CHARACTERS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-"""
-        for char, count in stats['char_frequency']:
-            char_display = repr(char) if char in [' ', '\n', '\t', '\r'] else char
-            output += f"{char_display:>8} : {count:,} times\n"
-        
-        # Python specific stats
-        if 'python_comments' in stats:
-            output += f"""
-🐍 PYTHON SPECIFIC STATISTICS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Comment Lines (#):     {stats['python_comments']:,}
-Import Statements:     {stats['python_imports']:,}
-Function Definitions:  {stats['python_functions']:,}
-Class Definitions:     {stats['python_classes']:,}
-Decorators (@):        {stats['python_decorators']:,}
-F-strings:             {stats['python_f_strings']:,}
-List Comprehensions:   {stats['python_list_comp']:,}
-Try-Except Blocks:     {stats['python_try_except']:,}
-Docstrings:            {stats['python_docstrings']:,}
-Type Hints:            {stats['python_type_hints']:,}
-TODO/FIXME Comments:   {stats['python_todos']:,}
-String Literals:       {stats['string_literals']:,}
-Avg String Length:     {stats['avg_string_length']:.2f} chars
-"""
-        
-        # HTML specific stats
-        elif 'html_tags' in stats:
-            output += f"""
-🌐 HTML SPECIFIC STATISTICS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Total HTML Tags:       {stats['html_tags']:,}
-HTML Comments:         {stats['html_comments']:,}
-Div Tags:              {stats['html_div_tags']:,}
-Script Tags:           {stats['html_script_tags']:,}
-Style Tags:            {stats['html_style_tags']:,}
-Image Tags:            {stats['html_img_tags']:,}
-Anchor Tags:           {stats['html_a_tags']:,}
-Total Attributes:      {stats['html_attributes']:,}
-"""
-        
-        # CSS specific stats
-        elif 'css_selectors' in stats:
-            output += f"""
-🎨 CSS SPECIFIC STATISTICS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-CSS Selectors:         {stats['css_selectors']:,}
-CSS Properties:        {stats['css_properties']:,}
-CSS Comments:          {stats['css_comments']:,}
-Media Queries:         {stats['css_media_queries']:,}
-Unique Classes:        {stats['css_classes']:,}
-Unique IDs:            {stats['css_ids']:,}
-"""
-        
-        # JavaScript specific stats
-        elif 'js_functions' in stats:
-            output += f"""
-⚡ JAVASCRIPT SPECIFIC STATISTICS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Function Declarations: {stats['js_functions']:,}
-Arrow Functions:       {stats['js_arrow_functions']:,}
-Var Declarations:      {stats['js_var_declarations']:,}
-Let Declarations:      {stats['js_let_declarations']:,}
-Const Declarations:    {stats['js_const_declarations']:,}
-Single-line Comments:  {stats['js_comments_single']:,}
-Multi-line Comments:   {stats['js_comments_multi']:,}
-Template Literals:     {stats['js_template_literals']:,}
-"""
-        
-        # JSON specific stats
-        elif 'json_valid' in stats:
-            if stats['json_valid']:
-                output += f"""
-📋 JSON SPECIFIC STATISTICS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Valid JSON:            Yes
-JSON Nesting Depth:    {stats['json_depth']}
-Total JSON Keys:       {stats['json_keys']:,}
-"""
-            else:
-                output += f"""
-📋 JSON SPECIFIC STATISTICS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Valid JSON:            No (Parse Error)
-"""
-        
-        # XML specific stats
-        elif 'xml_tags' in stats:
-            output += f"""
-📄 XML SPECIFIC STATISTICS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-XML Tags:              {stats['xml_tags']:,}
-Self-closing Tags:     {stats['xml_self_closing']:,}
-XML Comments:          {stats['xml_comments']:,}
-"""
-        
-        output += "\n" + "═" * 80 + "\n"
-        output += "Analysis Complete!\n"
-        
-        self.results_text.insert(tk.END, output)
+        self.results_text.insert(tk.END, report)
+        if performance is not None:
+            add_stage(performance, 'render', started, len(report.encode('utf-8')))
+            self.results_text.insert(tk.END, format_performance(performance))
+        if keep_position:
+            self.results_text.yview_moveto(position)
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = FileStatsAnalyzer(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    if app.cache is not None:
+        app.cache.close()
\ No newline at end of file
@@ -0,0 +1,264 @@
+import os
+import tarfile
+import time
+import zipfile
+
+from stats_engine import AnalysisCancelled, scan_file
+
+# Archives
+#
+# Zip and tar members are analyzed straight from the archive, without being
+# extracted. A member is named '<archive>!<member>', its language comes from
+# the member's own extension, and a compressed member ('logs.tar!app.log.gz')
+# is decompressed as it is read. Besides a result per member, every archive
+# gets a totals result (see archive_totals()).
+#
+# Members of zip files and uncompressed tars can be read in any order, so
+# member_stats() analyzes one at a time and the CLI spreads them over its
+# workers. A compressed tar can only be read efficiently from front to back,
+# so archive_results() goes through its members in order.
+
+MEMBER_SEPARATOR = '!'
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz', '.tbz2', '.tar.xz', '.txz')
+ZIP_SUFFIXES = ('.zip',)
+# Archives each process keeps open for reading members
+OPEN_ARCHIVES = 8
+# Member values that are the largest of any member rather than a sum
+LARGEST_FIELDS = ('json_depth', 'json_longest_string', 'html_depth', 'xml_depth')
+# Counts of distinct values, which do not add up across members
+DISTINCT_FIELDS = ('unique_words', 'css_classes', 'css_ids')
+# Averages, weighted by the count they are an average over
+AVERAGE_FIELDS = {
+    'avg_line_length': 'total_lines',
+    'avg_indentation': 'indented_lines',
+    'avg_word_length': 'total_words',
+    'avg_sentence_length': 'sentences',
+    'avg_string_length': 'string_literals',
+}
+
+
+def archive_kind(path):
+    # 'zip', 'tar', 'compressed-tar' or None, by name
+    name = path.lower()
+    if name.endswith(ZIP_SUFFIXES):
+        return 'zip'
+    if name.endswith(TAR_SUFFIXES):
+        return 'tar' if name.endswith('.tar') else 'compressed-tar'
+    return None
+
+
+def member_path(archive, name):
+    return f"{archive}{MEMBER_SEPARATOR}{name}"
+
+
+def split_member(path):
+    # (archive, member name) for a member path, else None
+    start = 0
+    while True:
+        index = path.find(MEMBER_SEPARATOR, start)
+        if index < 0:
+            return None
+        archive = path[:index]
+        if archive_kind(archive) is not None and os.path.isfile(archive):
+            return archive, path[index + 1:]
+        start = index + 1
+
+
+class MemberStats:
+    # The os.stat_result fields the engine reads, for an archive member
+    def __init__(self, size, mtime):
+        self.st_size = size
+        self.st_mtime = self.st_ctime = self.st_atime = mtime
+
+
+_open = {}
+
+
+def open_archive(path):
+    # (archive, {member name: info}) of the regular file members, kept open
+    # until the file changes. Worker processes forked after the archive was
+    # opened open it again rather than share its file position.
+    file_stats = os.stat(path)
+    signature = (file_stats.st_size, file_stats.st_mtime_ns, os.getpid())
+    cached = _open.pop(path, None)
+    if cached is not None:
+        if cached[0] == signature:
+            _open[path] = cached
+            return cached[1], cached[2]
+        if cached[0][2] == signature[2]:
+            cached[1].close()
+
+    if archive_kind(path) == 'zip':
+        archive = zipfile.ZipFile(path)
+        members = {info.filename: info for info in archive.infolist() if not info.is_dir()}
+    else:
+        archive = tarfile.open(path)
+        members = {member.name: member for member in archive.getmembers() if member.isfile()}
+    while len(_open) >= OPEN_ARCHIVES:
+        evicted = _open.pop(next(iter(_open)))
+        if evicted[0][2] == signature[2]:
+            evicted[1].close()
+    _open[path] = (signature, archive, members)
+    return archive, members
+
+
+def list_members(path):
+    return list(open_archive(path)[1])
+
+
+def _read_member(archive, info):
+    # (open member file, MemberStats)
+    if isinstance(archive, zipfile.ZipFile):
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        return archive.open(info), MemberStats(info.file_size, mtime)
+    return archive.extractfile(info), MemberStats(info.size, info.mtime)
+
+
+def _scan_member(archive, path, name, info, **options):
+    f, member_stats = _read_member(archive, info)
+    with f:
+        stats = scan_file(f, member_path(path, name), member_stats, **options)
+    # The member's own name, wherever it is in the archive
+    stats['filename'] = os.path.basename(name)
+    stats['archive'] = path
+    return stats
+
+
+def member_stats(path, name, **options):
+    # Stats of one member; options as for scan_file()
+    archive, members = open_archive(path)
+    if name not in members:
+        raise KeyError(f"no file named {name!r} in {path}")
+    return _scan_member(archive, path, name, members[name], **options)
+
+
+def member_error(path, name, error):
+    return {'filepath': member_path(path, name), 'filename': os.path.basename(name),
+            'archive': path, 'error': str(error)}
+
+
+def archive_results(path, progress=None, cancel=None, **options):
+    # Stats of every member in archive order, then the archive's totals.
+    # A member that cannot be analyzed gets an error result; progress is
+    # reported in archive bytes.
+    total = os.path.getsize(path)
+    results = []
+    if archive_kind(path) == 'zip':
+        archive, members = open_archive(path)
+        done = 0
+        for name, info in members.items():
+            results.append(_member_result(archive, path, name, info, cancel, options))
+            done += info.compress_size
+            if progress is not None:
+                progress(done, total)
+    else:
+        # Reading each member before the next header keeps a compressed tar
+        # decompressed once, front to back
+        with open(path, 'rb') as raw, tarfile.open(fileobj=raw) as archive:
+            for member in archive:
+                if member.isfile():
+                    results.append(_member_result(archive, path, member.name, member, cancel,
+                                                  options))
+                if progress is not None:
+                    progress(raw.tell(), total)
+    results.append(archive_totals(path, results))
+    return results
+
+
+def _member_result(archive, path, name, info, cancel, options):
+    try:
+        return _scan_member(archive, path, name, info, cancel=cancel, **options)
+    except AnalysisCancelled:
+        raise
+    except Exception as e:
+        return member_error(path, name, e)
+
+
+def archive_totals(path, results):
+    # Counts added up over the members that were analyzed, the largest and
+    # smallest of extremes, and averages weighted by what they average over.
+    # Distinct counts, ratios and scores are left out.
+    analyzed = [stats for stats in results if 'error' not in stats]
+    totals = {
+        'filename': os.path.basename(path),
+        'filepath': path,
+        'archive_type': archive_kind(path),
+        'members': len(results),
+        'failed_members': len(results) - len(analyzed),
+        'archive_size': os.path.getsize(path),
+    }
+    for stats in analyzed:
+        for key, value in stats.items():
+            if (not isinstance(value, int) or isinstance(value, bool) or key in DISTINCT_FIELDS
+                    or key == 'compressed_size'):
+                continue
+            if key not in totals:
+                totals[key] = value
+            elif key.startswith('max_') or key in LARGEST_FIELDS:
+                totals[key] = max(totals[key], value)
+            elif key.startswith('min_'):
+                totals[key] = min(totals[key], value)
+            else:
+                totals[key] += value
+    for key, weight in AVERAGE_FIELDS.items():
+        weighted = [(stats[key], stats[weight]) for stats in analyzed
+                    if key in stats and weight in stats]
+        count = sum(n for _, n in weighted)
+        if count:
+            totals[key] = sum(value * n for value, n in weighted) / count
+    return totals
+
+
+class ArchiveTotals:
+    # Collects member results arriving in any order and returns an
+    # archive's totals once all of its members are in
+    def __init__(self):
+        self.expected = {}
+        self.results = {}
+
+    def expect(self, path, count):
+        self.expected[path] = count
+        self.results[path] = []
+
+    def add(self, stats):
+        member = split_member(stats['filepath'])
+        if member is None or member[0] not in self.expected:
+            return None
+        path = member[0]
+        self.results[path].append(stats)
+        if len(self.results[path]) < self.expected[path]:
+            return None
+        del self.expected[path]
+        return archive_totals(path, self.results.pop(path))
+
+
+def format_totals(stats):
+    output = f"""
+📦 ARCHIVE TOTALS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Archive:               {stats['filename']} ({stats['archive_type']})
+Members:               {stats['members']:,} ({stats['failed_members']:,} failed)
+Archive Size:          {stats['archive_size']:,} bytes
+"""
+    for label, key in [("Uncompressed Size", 'file_size'), ("Total Characters", 'total_chars'),
+                       ("Total Lines", 'total_lines'), ("Total Words", 'total_words'),
+                       ("Longest Line", 'max_line_length')]:
+        if key in stats:
+            output += f"{label + ':':<23}{stats[key]:,}\n"
+    if 'avg_line_length' in stats:
+        output += f"{'Average Line Length:':<23}{stats['avg_line_length']:.2f} characters\n"
+    return output
+
+
+def format_archive(results):
+    # The totals and one line per member, for showing an archive as a whole
+    output = format_totals(results[-1])
+    output += "\n📄 MEMBERS\n━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+    for stats in results[:-1]:
+        name = split_member(stats['filepath'])[1]
+        if 'error' in stats:
+            output += f"{name}: ERROR: {stats['error']}\n"
+        else:
+            output += (f"{name}: {stats.get('total_lines', 0):,} lines, "
+                       f"{stats.get('total_words', 0):,} words, {stats['file_size']:,} bytes\n")
+    return output
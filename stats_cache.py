@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from stats_engine import ANALYZER_VERSION, CHUNK_SIZE, file_times, stream_stats, tail_stats
+from stats_profile import StageTimings, add_stage
+
+# Persistent result cache
+#
+# Each row holds the stats dict for one path, keyed by (st_size, st_mtime_ns)
+# and the analyzer version, so an unchanged file costs one stat() and one
+# indexed lookup.
+#
+# A second table keeps the resumable TailState of files analyzed in tail
+# mode, so a growing log only has its appended bytes scanned. Rows of both
+# tables count towards max_entries and max_bytes, and are evicted least
+# recently used first once the cache grows past either.
+
+DEFAULT_MAX_ENTRIES = 200_000
+DEFAULT_MAX_BYTES = 512 << 20
+# Pending last-used updates and inserts are committed in batches
+COMMIT_EVERY = 1000
+
+
+def default_cache_path():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'file-stats-analyzer', 'results.sqlite3')
+
+
+def content_hash(filepath):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        while True:
+            block = f.read(CHUNK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StatsCache:
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                 verify_hash=False, version=ANALYZER_VERSION):
+        self.path = path or default_cache_path()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.verify_hash = verify_hash
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.pending = 0
+        # The GUI reads and writes from its worker thread
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS results (
+                               path TEXT PRIMARY KEY,
+                               size INTEGER NOT NULL,
+                               mtime_ns INTEGER NOT NULL,
+                               version TEXT NOT NULL,
+                               content_hash TEXT,
+                               stats TEXT NOT NULL,
+                               nbytes INTEGER NOT NULL,
+                               last_used REAL NOT NULL)''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS tail_states (
+                               path TEXT PRIMARY KEY,
+                               version TEXT NOT NULL,
+                               state BLOB NOT NULL,
+                               last_used REAL NOT NULL,
+                               nbytes INTEGER NOT NULL DEFAULT 0)''')
+        columns = [row[1] for row in self.db.execute('PRAGMA table_info(tail_states)')]
+        if 'nbytes' not in columns:
+            # Caches written before tail states were counted
+            self.db.execute('ALTER TABLE tail_states ADD COLUMN nbytes INTEGER NOT NULL DEFAULT 0')
+            self.db.execute('UPDATE tail_states SET nbytes = length(state)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS tail_states_last_used '
+                        'ON tail_states (last_used)')
+        # Results from another analyzer version can never be hits again
+        self.db.execute('DELETE FROM results WHERE version != ?', (self.version,))
+        self.db.execute('DELETE FROM tail_states WHERE version != ?', (self.version,))
+        self.db.commit()
+        self._count()
+
+    def get(self, filepath, file_stats=None, timings=False):
+        # With `timings`, a hit reports the lookup as its only stage
+        started = StageTimings().start() if timings else None
+        if file_stats is None:
+            file_stats = os.stat(filepath)
+        key = os.path.abspath(filepath)
+        with self.lock:
+            row = self.db.execute(
+                'SELECT size, mtime_ns, version, content_hash, stats FROM results WHERE path = ?',
+                (key,)).fetchone()
+
+        if (row is None or row[0] != file_stats.st_size or row[1] != file_stats.st_mtime_ns
+                or row[2] != self.version):
+            self.misses += 1
+            return None
+        if self.verify_hash and row[3] != content_hash(filepath):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        with self.lock:
+            self.db.execute('UPDATE results SET last_used = ? WHERE path = ?', (time.time(), key))
+            self._maybe_commit()
+
+        # Path and time fields belong to this lookup, not the cached run
+        stats = json.loads(row[4])
+        stats['filepath'] = filepath
+        stats['filename'] = os.path.basename(filepath)
+        stats.update(file_times(file_stats))
+        if started is not None:
+            stats['performance'] = {}
+            add_stage(stats['performance'], 'cache', started)
+        return stats
+
+    def put(self, filepath, stats, file_stats=None):
+        if file_stats is None:
+            file_stats = os.stat(filepath)
+        key = os.path.abspath(filepath)
+        digest = content_hash(filepath) if self.verify_hash else None
+        # Timings describe the run that produced the result, not a later hit
+        payload = json.dumps({k: v for k, v in stats.items() if k != 'performance'},
+                             ensure_ascii=False)
+        nbytes = len(payload.encode('utf-8'))
+
+        with self.lock:
+            old = self.db.execute('SELECT nbytes FROM results WHERE path = ?', (key,)).fetchone()
+            if old is not None:
+                self.entries -= 1
+                self.total_bytes -= old[0]
+            self.db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                            (key, file_stats.st_size, file_stats.st_mtime_ns, self.version,
+                             digest, payload, nbytes, time.time()))
+            self.entries += 1
+            self.total_bytes += nbytes
+            self._check_limits()
+            self._maybe_commit()
+
+    def analyze(self, filepath, **options):
+        # stream_stats with the cache in front of it. Only complete results
+        # are stored; they also answer requests for some of the metrics.
+        # Non-default sketch options bypass the cache.
+        file_stats = os.stat(filepath)
+        cached = options.get('sketches') is None
+        stats = self.get(filepath, file_stats, options.get('timings')) if cached else None
+        if stats is None:
+            stats = stream_stats(filepath, file_stats=file_stats, **options)
+            if cached and options.get('metrics') is None:
+                self.put(filepath, stats, file_stats)
+        return stats
+
+    def load_tail(self, filepath):
+        key = os.path.abspath(filepath)
+        with self.lock:
+            row = self.db.execute('SELECT state FROM tail_states WHERE path = ? AND version = ?',
+                                  (key, self.version)).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def save_tail(self, filepath, state):
+        key = os.path.abspath(filepath)
+        # A state holds the file's word tables, so it can be far larger
+        # than a result
+        payload = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            old = self.db.execute('SELECT nbytes FROM tail_states WHERE path = ?',
+                                  (key,)).fetchone()
+            if old is not None:
+                self.tail_entries -= 1
+                self.tail_bytes -= old[0]
+            self.db.execute('INSERT OR REPLACE INTO tail_states VALUES (?, ?, ?, ?, ?)',
+                            (key, self.version, payload, time.time(), len(payload)))
+            self.tail_entries += 1
+            self.tail_bytes += len(payload)
+            self._check_limits()
+            self._maybe_commit()
+
+    def tail(self, filepath, **options):
+        # tail_stats resuming from, and then updating, the saved state
+        stats, state = tail_stats(filepath, self.load_tail(filepath), **options)
+        if state is not None:
+            self.save_tail(filepath, state)
+        return stats
+
+    def _count(self):
+        self.entries, self.total_bytes = self.db.execute(
+            'SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM results').fetchone()
+        self.tail_entries, self.tail_bytes = self.db.execute(
+            'SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM tail_states').fetchone()
+
+    def _check_limits(self):
+        if (self.entries + self.tail_entries > self.max_entries
+                or self.total_bytes + self.tail_bytes > self.max_bytes):
+            self._evict()
+
+    def _evict(self):
+        # Drop the least recently used rows of either table until both
+        # limits are met and a tenth of max_entries is free, then delete
+        # everything up to the last of them in one statement per table
+        excess = self.entries + self.tail_entries - self.max_entries
+        excess += max(self.max_entries // 10, 1)
+        over = self.total_bytes + self.tail_bytes - self.max_bytes
+        cutoff = None
+        rows = self.db.execute('SELECT last_used, nbytes FROM results UNION ALL '
+                               'SELECT last_used, nbytes FROM tail_states ORDER BY last_used')
+        for last_used, nbytes in rows:
+            if excess <= 0 and over <= 0:
+                break
+            cutoff = last_used
+            excess -= 1
+            over -= nbytes
+        rows.close()
+        if cutoff is not None:
+            self.db.execute('DELETE FROM results WHERE last_used <= ?', (cutoff,))
+            self.db.execute('DELETE FROM tail_states WHERE last_used <= ?', (cutoff,))
+        self._count()
+
+    def _maybe_commit(self):
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self.db.commit()
+            self.pending = 0
+
+    def clear(self):
+        with self.lock:
+            self.db.execute('DELETE FROM results')
+            self.db.execute('DELETE FROM tail_states')
+            self.db.commit()
+            self.entries = self.total_bytes = 0
+            self.tail_entries = self.tail_bytes = 0
+
+    def close(self):
+        with self.lock:
+            self.db.commit()
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
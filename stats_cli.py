@@ -0,0 +1,511 @@
+import argparse
+import fnmatch
+import glob
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import nullcontext
+from functools import partial
+
+from stats_archives import (ArchiveTotals, archive_kind, archive_results, format_totals,
+                            list_members, member_error, member_path, member_stats, split_member)
+from stats_cache import StatsCache, default_cache_path
+from stats_dedup import Duplicates
+from stats_engine import METRIC_GROUPS, format_report, select_metrics, stream_stats, tail_stats
+from stats_profile import PROFILERS, default_profile_output, profiled
+from stats_sketches import (APPROXIMATE_MODES, DEFAULT_COUNTERS, DEFAULT_ERROR,
+                            DEFAULT_EXACT_LIMIT, SketchOptions)
+from stats_store import ResultStore, export
+from stats_watch import DEFAULT_DEBOUNCE, WatchSession, debounced, make_watcher
+
+# Headless entry point: analyzes files, globs and directory trees in a pool
+# of worker processes. Nothing here imports tkinter.
+
+SUMMARY_FIELDS = ['total_lines', 'total_words', 'total_chars', 'file_size', 'encoding']
+
+
+def matches(path, patterns):
+    name = os.path.basename(path)
+    return any(fnmatch.fnmatch(path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+
+def iter_files(targets, include=(), exclude=()):
+    # Yields each file once, in the order the targets expand
+    seen = set()
+    for target in targets:
+        if os.path.isdir(target):
+            found = walk_tree(target, exclude)
+        elif glob.has_magic(target):
+            found = (p for p in sorted(glob.iglob(target, recursive=True)) if os.path.isfile(p))
+        else:
+            found = [target]
+
+        for path in found:
+            if include and not matches(path, include):
+                continue
+            if exclude and matches(path, exclude):
+                continue
+            if path not in seen:
+                seen.add(path)
+                yield path
+
+
+def walk_tree(root, exclude=()):
+    for dirpath, dirnames, filenames in os.walk(root):
+        # Prune excluded directories instead of walking into them
+        dirnames[:] = sorted(d for d in dirnames
+                             if not matches(os.path.join(dirpath, d), exclude))
+        for name in sorted(filenames):
+            yield os.path.join(dirpath, name)
+
+
+def selected(path, targets, include=(), exclude=()):
+    # Whether iter_files(targets, include, exclude) would yield the
+    # (normalized) path, without walking the targets
+    if include and not matches(path, include):
+        return False
+    if exclude and matches(path, exclude):
+        return False
+    for target in targets:
+        if os.path.isdir(target):
+            relative = os.path.relpath(path, target)
+            if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+                continue
+            # Files under an excluded directory are never walked into
+            directory = os.path.normpath(target)
+            for part in relative.split(os.sep)[:-1]:
+                directory = os.path.join(directory, part)
+                if matches(directory, exclude):
+                    break
+            else:
+                return True
+        elif glob.has_magic(target):
+            if fnmatch.fnmatch(path, os.path.normpath(target)):
+                return True
+        elif path == os.path.normpath(target):
+            return True
+    return False
+
+
+def watch_roots(targets):
+    # (directory, recursive) pairs covering every file the targets can match
+    roots = []
+    for target in targets:
+        if os.path.isdir(target):
+            roots.append((os.path.normpath(target), True))
+        elif glob.has_magic(target):
+            parts = os.path.normpath(target).split(os.sep)
+            fixed = next(i for i, part in enumerate(parts) if glob.has_magic(part))
+            recursive = fixed < len(parts) - 1 or '**' in parts[fixed]
+            roots.append((os.path.join(*parts[:fixed]) if fixed else '', recursive))
+        else:
+            roots.append((os.path.dirname(os.path.normpath(target)), False))
+    return roots
+
+
+def error_result(path, error):
+    return {'filepath': path, 'filename': os.path.basename(path), 'error': str(error)}
+
+
+def expand_archives(paths, totals):
+    # Replaces zip files and uncompressed tars by their members, so the
+    # members are spread over the workers; `totals` (ArchiveTotals) is told
+    # how many to expect. Compressed tars are read whole by one worker.
+    for path in paths:
+        if archive_kind(path) not in ('zip', 'tar'):
+            yield path
+            continue
+        try:
+            names = list_members(path)
+        except Exception:
+            # Analyzing the archive whole reports the error
+            yield path
+            continue
+        totals.expect(path, len(names))
+        for name in names:
+            yield member_path(path, name)
+
+
+def analyze_path(path, metrics=None, sketches=None, timings=False):
+    member = split_member(path)
+    try:
+        if member is not None:
+            return member_stats(*member, metrics=metrics, sketches=sketches, timings=timings)
+        return stream_stats(path, metrics=metrics, sketches=sketches, timings=timings)
+    except Exception as e:
+        if member is not None:
+            return member_error(*member, e)
+        return error_result(path, e)
+
+
+def analyze_archive(path, metrics=None, sketches=None, timings=False):
+    # Members and totals of a whole archive, or an error result
+    try:
+        return archive_results(path, metrics=metrics, sketches=sketches, timings=timings)
+    except Exception as e:
+        return [error_result(path, e)]
+
+
+def analyze_batch(paths, metrics=None, sketches=None, timings=False):
+    results = []
+    for path in paths:
+        if archive_kind(path) is not None:
+            results.extend(analyze_archive(path, metrics, sketches, timings))
+        else:
+            results.append(analyze_path(path, metrics, sketches, timings))
+    return results
+
+
+def tail_batch(tasks, metrics=None, sketches=None, timings=False):
+    # Each task is (path, saved TailState or None); returns (stats, new
+    # state). Archives do not grow by appending and are analyzed whole.
+    results = []
+    for path, state in tasks:
+        if archive_kind(path) is not None:
+            results.extend((stats, None) for stats in analyze_archive(path, metrics, sketches,
+                                                                      timings))
+            continue
+        try:
+            results.append(tail_stats(path, state, metrics=metrics, sketches=sketches,
+                                      timings=timings))
+        except Exception as e:
+            results.append((error_result(path, e), None))
+    return results
+
+
+def batches(paths, size):
+    batch = []
+    for path in paths:
+        batch.append(path)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_batches(function, items, workers=None, chunksize=16, ready=None):
+    # Yields function(batch) results in completion order. At most a few
+    # batches per worker are in flight, so huge trees are never queued up
+    # front. Results the producer of `items` appends to `ready` are passed
+    # through between batches.
+    ready = ready if ready is not None else []
+
+    def drain():
+        yield from ready
+        ready.clear()
+
+    if workers == 1:
+        for batch in batches(items, chunksize):
+            yield from drain()
+            yield from function(batch)
+        yield from drain()
+        return
+
+    workers = workers or os.cpu_count() or 1
+    pending = set()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for batch in batches(items, chunksize):
+            yield from drain()
+            pending.add(pool.submit(function, batch))
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        yield from drain()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+
+def analyze_files(paths, workers=None, chunksize=16, cache=None, metrics=None, sketches=None,
+                  timings=False):
+    # Yields stats dicts in completion order. The cache is only touched from
+    # this process: hits are yielded straight away and only misses are sent
+    # to the workers. Only complete results are stored, and a hit is one
+    # even when just some metrics were asked for. Results with non-default
+    # sketch options are neither looked up nor stored.
+    function = partial(analyze_batch, metrics=metrics, sketches=sketches, timings=timings)
+    if cache is None or sketches is not None:
+        yield from run_batches(function, paths, workers, chunksize)
+        return
+
+    hits = []
+    misses = {}
+
+    def lookup(paths):
+        # Archives and their members are never cached
+        for path in paths:
+            if archive_kind(path) is not None or split_member(path) is not None:
+                yield path
+                continue
+            try:
+                file_stats = os.stat(path)
+            except OSError:
+                yield path
+                continue
+            stats = cache.get(path, file_stats, timings)
+            if stats is not None:
+                hits.append(stats)
+            else:
+                misses[path] = file_stats
+                yield path
+
+    for stats in run_batches(function, lookup(paths), workers, chunksize, hits):
+        file_stats = misses.pop(stats['filepath'], None)
+        if file_stats is not None and 'error' not in stats and metrics is None:
+            cache.put(stats['filepath'], stats, file_stats)
+        yield stats
+
+
+def tail_files(paths, cache, workers=None, chunksize=16, metrics=None, sketches=None,
+               timings=False):
+    # Like analyze_files, but resumes each file from its saved tail state
+    tasks = ((path, cache.load_tail(path)) for path in paths)
+    function = partial(tail_batch, metrics=metrics, sketches=sketches, timings=timings)
+    for stats, state in run_batches(function, tasks, workers, chunksize):
+        if state is not None:
+            cache.save_tail(stats['filepath'], state)
+        yield stats
+
+
+def format_result(stats, fmt):
+    if fmt == 'json':
+        return json.dumps(stats, ensure_ascii=False)
+    if 'error' in stats:
+        return f"{stats['filepath']}\tERROR: {stats['error']}"
+    if fmt == 'report' and 'members' in stats:
+        return f"{stats['filepath']}\n{format_totals(stats)}"
+    if fmt == 'report':
+        return f"{stats['filepath']}\n{format_report(stats)}"
+    # Fields of metric groups that were not computed show as '-'
+    return '\t'.join([stats['filepath']] + [str(stats.get(field, '-')) for field in SUMMARY_FIELDS])
+
+
+def format_change(stats, changes, fmt):
+    # A watched file analyzed again: the fields that changed, or the whole
+    # new report
+    if fmt == 'json':
+        return json.dumps({'filepath': stats['filepath'], 'changes': changes},
+                          ensure_ascii=False)
+    if fmt == 'report' or 'error' in stats:
+        return format_result(stats, fmt)
+    fields = [f"{field} {changes[field][0]} -> {changes[field][1]}"
+              for field in SUMMARY_FIELDS if field in changes]
+    others = len(changes) - len(fields)
+    if others:
+        fields.append(f"(+{others} more)")
+    return '\t'.join([stats['filepath']] + fields)
+
+
+def format_removed(path, fmt):
+    if fmt == 'json':
+        return json.dumps({'filepath': path, 'removed': True}, ensure_ascii=False)
+    return f"{path}\tremoved"
+
+
+def watch_files(targets, session, include=(), exclude=(), fmt='summary',
+                debounce=DEFAULT_DEBOUNCE, poll_interval=None):
+    # Re-analyzes files under the targets as they change, until interrupted.
+    # New files are printed in full, changed ones as format_change().
+    def files():
+        found = {os.path.normpath(path) for path in iter_files(targets, include, exclude)}
+        return found | session.results.keys()
+
+    watcher = make_watcher(watch_roots(targets), files, lambda path: matches(path, exclude),
+                           poll_interval)
+    try:
+        for changed in debounced(watcher, debounce):
+            for path in sorted(changed):
+                path = os.path.normpath(path)
+                if not os.path.isfile(path):
+                    for removed in session.forget(path):
+                        print(format_removed(removed, fmt), flush=True)
+                    continue
+                if path not in session.results and not selected(path, targets, include, exclude):
+                    continue
+                if archive_kind(path) is not None:
+                    # Archives are analyzed again whole
+                    for stats in analyze_archive(path, session.metrics, session.sketches,
+                                                 session.timings):
+                        print(format_result(stats, fmt), flush=True)
+                    continue
+                try:
+                    stats, changes = session.analyze(path)
+                except Exception as e:
+                    stats, changes = error_result(path, e), None
+                if changes is None:
+                    print(format_result(stats, fmt), flush=True)
+                elif changes:
+                    print(format_change(stats, changes, fmt), flush=True)
+    finally:
+        watcher.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Analyze text files without the GUI.")
+    parser.add_argument('paths', nargs='+',
+                        help="files, glob patterns or directories to analyze")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="worker processes (default: CPU count, 1 runs in-process)")
+    parser.add_argument('--chunksize', type=int, default=16,
+                        help="files handed to a worker at a time (default: 16)")
+    parser.add_argument('--include', action='append', default=[], metavar='PATTERN',
+                        help="only analyze files matching this glob (repeatable)")
+    parser.add_argument('--exclude', action='append', default=[], metavar='PATTERN',
+                        help="skip files and directories matching this glob (repeatable)")
+    parser.add_argument('--format', choices=['summary', 'report', 'json'], default='summary',
+                        help="summary lines, full text reports, or one JSON object per line")
+    parser.add_argument('--metrics', default=None, metavar='GROUPS',
+                        help="comma-separated metric groups to compute "
+                             f"({', '.join(METRIC_GROUPS)}; default: all)")
+    parser.add_argument('--approximate', choices=APPROXIMATE_MODES, default='auto',
+                        help="estimate unique words, top words and top characters with "
+                             "bounded-memory sketches: past --exact-limit distinct words "
+                             "(auto, the default), for every file, or never")
+    parser.add_argument('--sketch-error', type=float, default=DEFAULT_ERROR, metavar='ERROR',
+                        help="relative standard error of the unique word estimate "
+                             "(default: %(default)s)")
+    parser.add_argument('--top-counters', type=int, default=DEFAULT_COUNTERS, metavar='N',
+                        help="counters kept for top words and characters when estimating "
+                             "(default: %(default)s)")
+    parser.add_argument('--exact-limit', type=int, default=DEFAULT_EXACT_LIMIT, metavar='N',
+                        help="distinct words counted exactly before auto mode estimates "
+                             "(default: %(default)s)")
+    parser.add_argument('--cache', nargs='?', const=default_cache_path(), default=None,
+                        metavar='PATH',
+                        help="reuse results of unchanged files from an SQLite cache "
+                             "(default path: %(const)s)")
+    parser.add_argument('--cache-verify', action='store_true',
+                        help="also compare a content hash before trusting a cached result")
+    parser.add_argument('--cache-max-mb', type=int, default=512,
+                        help="evict least recently used results and tail states above this "
+                             "size (default: 512)")
+    parser.add_argument('--dedup', action='store_true',
+                        help="analyze byte-for-byte identical files only once; the copies get "
+                             "the same results under their own names")
+    parser.add_argument('--store', default=None, metavar='PATH',
+                        help="also save the per-file results in columns for stats_store.py, "
+                             "or export them to a .csv or .ndjson file")
+    parser.add_argument('--tail', action='store_true',
+                        help="treat files as append-only logs: keep scan state in the cache "
+                             "and only analyze bytes appended since the last run")
+    parser.add_argument('--timings', action='store_true',
+                        help="time each stage of the analysis and include the timings in "
+                             "reports and JSON output")
+    parser.add_argument('--profile', choices=PROFILERS, default=None,
+                        help="run the analysis in-process under cProfile or tracemalloc and "
+                             "write the results to --profile-output")
+    parser.add_argument('--profile-output', default=None, metavar='PATH',
+                        help="where --profile writes (default: "
+                             f"{default_profile_output('cprofile')} or "
+                             f"{default_profile_output('tracemalloc')})")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and re-analyze files as they change, printing the "
+                             "fields that changed (whole reports with --format report)")
+    parser.add_argument('--debounce', type=float, default=DEFAULT_DEBOUNCE, metavar='SECONDS',
+                        help="with --watch, wait for this long without changes before "
+                             "re-analyzing (default: %(default)s)")
+    parser.add_argument('--poll-interval', type=float, default=None, metavar='SECONDS',
+                        help="with --watch, compare file status every SECONDS instead of "
+                             "using inotify, e.g. on network filesystems (polling is also "
+                             "used where inotify is unavailable)")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.chunksize < 1:
+        args.chunksize = 1
+    metrics = None
+    if args.metrics:
+        try:
+            metrics = select_metrics([name.strip() for name in args.metrics.split(',')])
+        except ValueError as e:
+            parser.error(str(e))
+    try:
+        sketches = SketchOptions(args.approximate, args.sketch_error, args.top_counters,
+                                 args.exact_limit)
+    except ValueError as e:
+        parser.error(str(e))
+    if sketches == SketchOptions():
+        sketches = None
+
+    if args.profile:
+        # Profilers only see this process
+        args.workers = 1
+        args.profile_output = args.profile_output or default_profile_output(args.profile)
+
+    if args.tail and args.dedup:
+        parser.error("--dedup cannot be combined with --tail")
+    if args.tail and not args.cache:
+        args.cache = default_cache_path()
+    cache = None
+    if args.cache:
+        cache = StatsCache(args.cache, max_bytes=args.cache_max_mb << 20,
+                           verify_hash=args.cache_verify)
+
+    failed = 0
+    paths = iter_files(args.paths, args.include, args.exclude)
+    session = None
+    if args.watch:
+        session = WatchSession(metrics, sketches, args.timings)
+        # Files reported by the watcher come back normalized
+        paths = (os.path.normpath(path) for path in paths)
+    duplicates = None
+    if args.dedup:
+        duplicates = Duplicates()
+        paths = duplicates.find(paths)
+    totals = ArchiveTotals()
+    if not args.tail:
+        paths = expand_archives(paths, totals)
+    if args.tail:
+        results = tail_files(paths, cache, args.workers, args.chunksize, metrics, sketches,
+                             args.timings)
+    else:
+        results = analyze_files(paths, args.workers, args.chunksize, cache, metrics, sketches,
+                                args.timings)
+    if duplicates is not None:
+        results = duplicates.expand(results)
+    store = ResultStore() if args.store else None
+    profile = profiled(args.profile, args.profile_output) if args.profile else nullcontext()
+    try:
+        with profile:
+            for stats in results:
+                if 'error' in stats:
+                    failed += 1
+                if session is not None and 'archive' not in stats:
+                    session.add(stats)
+                if store is not None:
+                    store.add(stats)
+                print(format_result(stats, args.format), flush=True)
+                archive = totals.add(stats)
+                if archive is not None:
+                    print(format_result(archive, args.format), flush=True)
+            if store is not None:
+                export(store, args.store)
+                print(f"store: {len(store):,} files in {args.store}", file=sys.stderr)
+            if args.watch:
+                try:
+                    watch_files(args.paths, session, args.include, args.exclude, args.format,
+                                args.debounce, args.poll_interval)
+                except KeyboardInterrupt:
+                    pass
+        if args.profile:
+            print(f"profile: {args.profile_output}", file=sys.stderr)
+    finally:
+        if duplicates is not None:
+            print(duplicates.summary(), file=sys.stderr)
+        if cache is not None:
+            cache.close()
+            if not args.tail:
+                print(f"cache: {cache.hits:,} hits, {cache.misses:,} misses", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
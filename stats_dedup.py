@@ -0,0 +1,134 @@
+import hashlib
+import os
+
+from stats_archives import archive_kind, split_member
+from stats_engine import CHUNK_SIZE, compression, file_times, find_language, strip_compression
+
+# Duplicate files
+#
+# Vendored dependencies, generated code and copied fixtures make many files
+# in a tree byte-for-byte copies of each other. Duplicates.find() groups
+# files by size, then by a hash of their first block, then by a hash of
+# their whole content, so only files that share a size are read at all and
+# only those that also share a first block are read in full. One file of
+# each group is analyzed; expand() then gives every other file a copy of
+# its stats with the file's own name and times.
+#
+# The language analyzer and decompression are chosen by extension, so
+# identical files that differ in those are analyzed once per kind.
+
+# Bytes hashed before deciding whether a whole file is worth hashing
+PREFIX_SIZE = 64 << 10
+# Fields that belong to a path rather than to its content
+PATH_FIELDS = ('filename', 'filepath', 'created', 'modified', 'accessed', 'performance')
+
+
+def analysis_key(path):
+    # What besides the content decides a file's stats
+    language = find_language(os.path.splitext(strip_compression(path))[1].lower())
+    return (language.name if language is not None else None, compression(path))
+
+
+def file_digest(path, size=None):
+    # Hash of the first `size` bytes of a file, or of all of it
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while size is None or size > 0:
+            block = f.read(CHUNK_SIZE if size is None else min(CHUNK_SIZE, size))
+            if not block:
+                break
+            digest.update(block)
+            if size is not None:
+                size -= len(block)
+    return digest.digest()
+
+
+def prefix_digest(path):
+    return file_digest(path, PREFIX_SIZE)
+
+
+def _split(group, key):
+    # Subgroups of more than one path by key(path); paths that cannot be
+    # read are left out, to be analyzed (and fail) on their own
+    found = {}
+    for path in group:
+        try:
+            found.setdefault(key(path), []).append(path)
+        except OSError:
+            continue
+    return [paths for paths in found.values() if len(paths) > 1]
+
+
+def copy_stats(stats, path):
+    # The stats of an identical file, under this file's name and times
+    if 'error' in stats:
+        copy = {'filepath': path, 'filename': os.path.basename(path), 'error': stats['error']}
+    else:
+        copy = {key: value for key, value in stats.items() if key not in PATH_FIELDS}
+        copy['filename'] = os.path.basename(path)
+        copy['filepath'] = path
+        copy.update(file_times(os.stat(path)))
+    copy['duplicate_of'] = stats['filepath']
+    return copy
+
+
+class Duplicates:
+    def __init__(self):
+        # Analyzed path: the paths that get a copy of its stats
+        self.copies = {}
+        self.groups = 0
+        self.files = 0
+        # Bytes of the copies, which were not analyzed
+        self.bytes = 0
+
+    def find(self, paths):
+        # Yields the paths to analyze, in their original order: every path
+        # that is not a copy of an earlier one. Archives and their members
+        # are always analyzed.
+        paths = list(paths)
+        by_size = {}
+        seen = set()
+        for path in paths:
+            if path in seen or archive_kind(path) is not None or split_member(path) is not None:
+                continue
+            seen.add(path)
+            try:
+                file_stats = os.stat(path)
+            except OSError:
+                continue
+            key = (file_stats.st_size, analysis_key(path))
+            by_size.setdefault(key, []).append(path)
+
+        copies = set()
+        for (size, _), group in by_size.items():
+            if len(group) < 2:
+                continue
+            for same_start in _split(group, prefix_digest):
+                if size <= PREFIX_SIZE:
+                    same = [same_start]
+                else:
+                    same = _split(same_start, file_digest)
+                for duplicates in same:
+                    self.copies[duplicates[0]] = duplicates[1:]
+                    copies.update(duplicates[1:])
+                    self.groups += 1
+                    self.files += len(duplicates) - 1
+                    self.bytes += size * (len(duplicates) - 1)
+
+        for path in paths:
+            if path not in copies:
+                yield path
+
+    def expand(self, results):
+        # Yields each result, followed by the copies for its duplicates
+        for stats in results:
+            yield stats
+            for path in self.copies.pop(stats['filepath'], ()):
+                try:
+                    yield copy_stats(stats, path)
+                except OSError as e:
+                    yield {'filepath': path, 'filename': os.path.basename(path), 'error': str(e)}
+
+    def summary(self):
+        return (f"duplicates: {self.groups:,} groups, {self.files:,} files, "
+                f"{self.bytes:,} bytes not analyzed")
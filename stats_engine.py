@@ -0,0 +1,1721 @@
+import bz2
+import codecs
+import copy
+import gzip
+import hashlib
+import importlib
+import lzma
+import mmap
+import os
+import re
+from collections import Counter
+from datetime import datetime
+from itertools import accumulate
+from operator import sub
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from stats_profile import StageTimings
+from stats_readability import ReadabilityAccumulator
+from stats_sketches import Distribution, HyperLogLog, MisraGries, SketchOptions
+
+# Bump whenever a metric's definition changes so cached results are dropped
+ANALYZER_VERSION = '12'
+
+# Character scanner lookup tables
+_NON_BRACKET_BYTES = bytes(b for b in range(256) if b not in b'(){}[]')
+_NESTING_STEPS = bytes.maketrans(b'({[)}]', b'\x01\x01\x01\xff\xff\xff')
+_NESTING_DELTA = [1 if b in b'({[' else -1 if b in b')}]' else 0 for b in range(256)]
+_NON_ASCII_RUN = re.compile('[^\x00-\x7f]+')
+
+
+def scan_characters(content, depth=0):
+    # One pass builds the character histogram; every character-class count
+    # is then derived from the distinct characters only.
+    if content.isascii():
+        data = content.encode('ascii')
+        if np is not None:
+            counts = np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=128)
+            found = {chr(i): int(n) for i, n in enumerate(counts) if n}
+        else:
+            found = {chr(i): n for i, n in Counter(data).items()}
+        # Keep first-occurrence order so most_common() breaks ties like Counter(content)
+        histogram = Counter({c: found[c] for c in sorted(found, key=content.find)})
+    else:
+        histogram = Counter(content)
+        # UTF-8 continuation bytes never collide with ASCII brackets
+        data = content.encode('utf-8')
+    
+    counts = count_character_classes(histogram)
+    counts['histogram'] = histogram
+    counts['max_nesting_depth'], counts['nesting_depth'] = nesting_depth(
+        data.translate(None, _NON_BRACKET_BYTES), depth)
+    return counts
+
+
+def count_character_classes(histogram):
+    counts = {
+        'alphabetic': 0,
+        'numeric': 0,
+        'uppercase': 0,
+        'lowercase': 0,
+        'special_chars': 0,
+        'non_ascii': 0,
+    }
+    for char, n in histogram.items():
+        if char.isalpha():
+            counts['alphabetic'] += n
+        if char.isdigit():
+            counts['numeric'] += n
+        if char.isupper():
+            counts['uppercase'] += n
+        if char.islower():
+            counts['lowercase'] += n
+        if not char.isalnum() and not char.isspace():
+            counts['special_chars'] += n
+        if ord(char) > 127:
+            counts['non_ascii'] += n
+    return counts
+
+
+def nesting_depth(brackets, depth=0):
+    # Depth never drops below zero, so starting from `depth` it is the
+    # prefix sum of +1/-1 steps minus its running minimum (clamped at zero).
+    # Returns (max depth reached, depth at the end).
+    if not brackets:
+        return depth, depth
+    if np is not None:
+        steps = np.frombuffer(brackets.translate(_NESTING_STEPS), dtype=np.int8)
+        prefix = np.cumsum(steps, dtype=np.int64) + depth
+        levels = prefix - np.minimum.accumulate(np.minimum(prefix, 0))
+        return max(int(levels.max()), depth), int(levels[-1])
+    prefix = list(accumulate(map(_NESTING_DELTA.__getitem__, brackets), initial=depth))
+    floor = accumulate(prefix, min, initial=0)
+    next(floor)
+    levels = list(map(sub, prefix, floor))
+    return max(levels), levels[-1]
+
+
+def classify_line_endings(crlf, lf, cr):
+    if crlf > lf and crlf > cr:
+        return "CRLF (Windows)"
+    elif lf > crlf and lf > cr:
+        return "LF (Unix/Mac)"
+    elif cr > 0:
+        return "CR (Old Mac)"
+    return "Mixed/Unknown"
+
+
+def file_times(file_stats):
+    # Time metadata
+    return {
+        'created': datetime.fromtimestamp(file_stats.st_ctime).strftime('%Y-%m-%d %H:%M:%S'),
+        'modified': datetime.fromtimestamp(file_stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+        'accessed': datetime.fromtimestamp(file_stats.st_atime).strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def detect_line_ending(content):
+    crlf = content.count('\r\n')
+    lf = content.count('\n') - crlf
+    cr = content.count('\r') - crlf
+    return classify_line_endings(crlf, lf, cr)
+
+
+# Streaming accumulators
+#
+# Each metric group consumes decoded text one block at a time and keeps only
+# the state it needs to continue across block boundaries, so a file of any
+# size is analyzed in bounded memory. Feeding the whole content as a single
+# block gives exactly the same stats as the in-memory path.
+
+CHUNK_SIZE = 1 << 20
+# Largest carried text for block-based language metrics
+MAX_CARRY = 8 * CHUNK_SIZE
+
+
+class CharAccumulator:
+    # Once the sketch options call for it, non-ASCII characters go into a
+    # Misra-Gries summary; ASCII counts and character classes stay exact.
+    def __init__(self, sketches=None):
+        self.sketches = sketches or SketchOptions()
+        self.histogram = Counter()
+        self.counts = Counter()
+        self.depth = 0
+        self.max_depth = 0
+        self.sketch = None
+        if self.sketches.sketch_now(0):
+            self._approximate()
+    
+    def feed(self, text):
+        chars = scan_characters(text, self.depth)
+        self._add_histogram(chars.pop('histogram'))
+        self.max_depth = max(self.max_depth, chars.pop('max_nesting_depth'))
+        self.depth = chars.pop('nesting_depth')
+        self.counts.update(chars)
+    
+    def _add_histogram(self, found):
+        if self.sketch is not None:
+            self.sketch.update({c: n for c, n in found.items() if c > '\x7f'})
+            found = {c: n for c, n in found.items() if c <= '\x7f'}
+        self.histogram.update(found)
+        if self.sketch is None and self.sketches.sketch_now(len(self.histogram)):
+            self._approximate()
+    
+    def _approximate(self):
+        self.sketch = MisraGries(self.sketches.counters)
+        self.sketch.update({c: n for c, n in self.histogram.items() if c > '\x7f'})
+        self.histogram = Counter({c: n for c, n in self.histogram.items() if c <= '\x7f'})
+    
+    def finish(self, stats):
+        histogram = self.histogram
+        total = sum(histogram.values())
+        if self.sketch is not None:
+            # Sketched characters still have exact class counts
+            total += self.counts['non_ascii']
+            histogram = histogram + self.sketch.counts
+            stats.setdefault('approximate', []).append('char_frequency')
+        stats.update({
+            'total_chars': total,
+            'spaces': histogram[' '],
+            'tabs': histogram['\t'],
+            'newlines': histogram['\n'],
+            'alphabetic': self.counts['alphabetic'],
+            'numeric': self.counts['numeric'],
+            'uppercase': self.counts['uppercase'],
+            'lowercase': self.counts['lowercase'],
+            'special_chars': self.counts['special_chars'],
+            'non_ascii': self.counts['non_ascii'],
+            
+            # Punctuation
+            'commas': histogram[','],
+            'periods': histogram['.'],
+            'semicolons': histogram[';'],
+            'colons': histogram[':'],
+            'exclamations': histogram['!'],
+            'questions': histogram['?'],
+            
+            # Brackets and quotes
+            'parentheses_open': histogram['('],
+            'parentheses_close': histogram[')'],
+            'braces_open': histogram['{'],
+            'braces_close': histogram['}'],
+            'brackets_open': histogram['['],
+            'brackets_close': histogram[']'],
+            'angle_brackets_open': histogram['<'],
+            'angle_brackets_close': histogram['>'],
+            'single_quotes': histogram["'"],
+            'double_quotes': histogram['"'],
+            'backticks': histogram['`'],
+        })
+        stats['max_nesting_depth'] = self.max_depth
+        stats['char_frequency'] = histogram.most_common(15)
+
+
+class ByteCharAccumulator(CharAccumulator):
+    # Character counts read from the raw bytes of an ASCII-compatible
+    # encoding (NumPy views of the block when available, so nothing is
+    # copied). Only non-ASCII characters are taken from the decoded text.
+    # Line endings are tallied here too, before newline translation.
+    def __init__(self, encoding, translate_newlines=True, sketches=None):
+        super().__init__(sketches)
+        # Used to locate a character's first bytes; the BOM is not part of it
+        self.encoding = 'utf-8' if encoding == 'utf-8-sig' else encoding
+        self.translate_newlines = translate_newlines
+        self.byte_counts = [0] * 128
+        self.first_seen = {}
+        self.blocks = 0
+        self.crlf = 0
+        self.last_cr = False
+    
+    def feed_bytes(self, data, text):
+        if not len(data):
+            return
+        self.blocks += 1
+        if np is not None:
+            view = np.frombuffer(data, dtype=np.uint8)
+            counts = np.bincount(view, minlength=256)[:128].tolist()
+            # Deleting every other byte from a copy beats a boolean mask
+            brackets = bytes(data).translate(None, _NON_BRACKET_BYTES)
+        else:
+            view = bytes(data)
+            counts = [0] * 128
+            for b, n in Counter(view).items():
+                if b < 128:
+                    counts[b] = n
+            brackets = view.translate(None, _NON_BRACKET_BYTES)
+        
+        # CRLF pairs, including one split across two blocks
+        if counts[13] and counts[10]:
+            if np is not None:
+                self.crlf += int(np.count_nonzero((view[:-1] == 13) & (view[1:] == 10)))
+            else:
+                self.crlf += view.count(b'\r\n')
+        if self.last_cr and view[0] == 10:
+            self.crlf += 1
+        self.last_cr = view[-1] == 13
+        
+        for b, n in enumerate(counts):
+            if n:
+                if not self.byte_counts[b]:
+                    position = int(np.argmax(view == b)) if np is not None else view.find(b)
+                    self.first_seen[chr(b)] = (self.blocks, position)
+                self.byte_counts[b] += n
+        
+        if not text.isascii():
+            found = Counter(''.join(_NON_ASCII_RUN.findall(text)))
+            new = [c for c in found if c not in self.histogram] if self.sketch is None else []
+            if self.sketch is not None:
+                self.counts.update(count_character_classes(found))
+            if new:
+                raw = bytes(data)
+                # A character whose first bytes ended the previous block
+                # comes out first, ahead of this block's ASCII
+                carried = text[0]
+                if raw.startswith(carried.encode(self.encoding, 'ignore')):
+                    carried = None
+                for c in new:
+                    if c == carried:
+                        self.first_seen[c] = (self.blocks, -1)
+                        continue
+                    position = raw.find(c.encode(self.encoding, 'ignore') or b'\x80')
+                    self.first_seen[c] = (self.blocks, position if position >= 0 else len(raw))
+            self._add_histogram(found)
+        
+        level, self.depth = nesting_depth(brackets, self.depth)
+        self.max_depth = max(self.max_depth, level)
+    
+    def _approximate(self):
+        # From here on classes of non-ASCII characters are counted per block
+        self.counts = Counter(count_character_classes(self.histogram))
+        super()._approximate()
+    
+    def line_endings(self):
+        # (crlf, lone lf, lone cr), as StatsAccumulator counts them
+        return self.crlf, self.byte_counts[10] - self.crlf, self.byte_counts[13] - self.crlf
+    
+    def finish(self, stats):
+        counts = {chr(b): n for b, n in enumerate(self.byte_counts) if n}
+        counts.update(self.histogram)
+        first_seen = dict(self.first_seen)
+        if self.translate_newlines and '\r' in counts:
+            # Every CR becomes a newline, and a CRLF pair becomes just one
+            counts['\n'] = counts.get('\n', 0) + counts.pop('\r') - self.crlf
+            first_seen['\n'] = min(first_seen.get('\n', first_seen['\r']), first_seen.pop('\r'))
+        # First-occurrence order keeps most_common() ties as in Counter(content)
+        self.histogram = Counter({c: counts[c] for c in sorted(counts, key=first_seen.get)})
+        self.counts.update(count_character_classes(self.histogram))
+        super().finish(stats)
+
+
+class _PartialLine:
+    # Folded state of a line that continues past the end of a block
+    def __init__(self):
+        self.length = 0
+        self.blank = True
+        self.lead = ''
+        self.lead_run = 0
+        self.lead_open = True
+        self.last = ''
+    
+    def extend(self, piece):
+        if not piece:
+            return
+        if not self.length:
+            self.lead = piece[0]
+        if self.lead_open:
+            run = len(piece) - len(piece.lstrip(self.lead))
+            self.lead_run += run
+            self.lead_open = run == len(piece)
+        if self.blank and not piece.isspace():
+            self.blank = False
+        self.last = piece[-1]
+        self.length += len(piece)
+
+
+# Whitespace as str.isspace() sees it, by code point; none is above U+3000
+_SPACE_CODES = [c for c in range(0x3001) if chr(c).isspace()]
+_SPACE_FLAGS = bytes(1 if b in _SPACE_CODES else 0 for b in range(256))
+# Blocks of complete lines shorter than this are cheaper to split in Python
+MIN_VECTOR_CHARS = 4096
+# Lower edges of the histogram buckets of each length distribution
+LINE_LENGTH_BOUNDS = (0, 1, 20, 40, 60, 80, 100, 120, 160, 200, 500, 1000, 10000)
+INDENTATION_BOUNDS = (1, 2, 4, 8, 12, 16, 24, 32, 64)
+WORD_LENGTH_BOUNDS = (1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 12, 15, 20, 30, 50, 100)
+
+
+def add_distribution(stats, name, distribution):
+    # Adds `name`_percentiles (p50, p90, p99) and `name`_histogram
+    stats[f'{name}_percentiles'] = distribution.percentiles()
+    stats[f'{name}_histogram'] = distribution.histogram()
+    if distribution.approximate:
+        stats.setdefault('approximate', []).append(f'{name}_percentiles')
+
+
+def is_space(codes):
+    # ASCII whitespace is ' ', '\t'..'\r' and '\x1c'..'\x1f' (unsigned
+    # subtraction wraps below the range); the rest is looked up
+    space = (codes == 32) | (codes - 9 < 5) | (codes - 28 < 4)
+    if codes.dtype != np.uint8:
+        wide = np.flatnonzero((codes >= 0x85) & (codes < len(_IS_SPACE)))
+        space[wide] = _IS_SPACE[codes[wide]]
+    return space
+
+
+if np is not None:
+    _IS_SPACE = np.zeros(0x3001, dtype=bool)
+    _IS_SPACE[_SPACE_CODES] = True
+
+
+class LineAccumulator:
+    # Complete lines of a block are measured as one array of code points
+    # when NumPy is available; the lines around block boundaries are folded
+    # into _PartialLine instead. Line lengths and the indentation of
+    # indented lines also go into distributions for their percentiles.
+    def __init__(self, sketches=None):
+        self.total = 0
+        self.non_empty = 0
+        self.length_sum = 0
+        self.max_length = 0
+        self.min_length = None
+        self.over_79 = 0
+        self.over_99 = 0
+        self.trailing = 0
+        self.indents = 0
+        self.indent_sum = 0
+        self.max_indent = 0
+        self.lengths = Distribution(LINE_LENGTH_BOUNDS, sketches)
+        self.indent_widths = Distribution(INDENTATION_BOUNDS, sketches)
+        self.partial = _PartialLine()
+    
+    def feed(self, text):
+        first = text.find('\n')
+        if first < 0:
+            self.partial.extend(text)
+            return
+        last = text.rfind('\n')
+        self.partial.extend(text[:first])
+        self._add_partial(self.partial)
+        if last > first:
+            # Lines with a newline on both sides
+            if np is not None and last - first > MIN_VECTOR_CHARS:
+                self._add_line_array(text[first + 1:last])
+            else:
+                self._add_lines(text[first + 1:last].split('\n'))
+        self.partial = _PartialLine()
+        self.partial.extend(text[last + 1:])
+    
+    def _add_line_array(self, text):
+        if text.isascii():
+            data = text.encode('ascii')
+            codes = np.frombuffer(data, dtype=np.uint8)
+        else:
+            data = None
+            codes = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        breaks = np.flatnonzero(codes == 10)
+        starts = np.concatenate(([0], breaks + 1))
+        ends = np.append(breaks, len(codes))
+        lengths = ends - starts
+        
+        self.total += len(lengths)
+        self.length_sum += int(lengths.sum())
+        self.max_length = max(self.max_length, int(lengths.max()))
+        shortest = int(lengths.min())
+        if self.min_length is None or shortest < self.min_length:
+            self.min_length = shortest
+        self.over_79 += int(np.count_nonzero(lengths > 79))
+        self.over_99 += int(np.count_nonzero(lengths > 99))
+        self.lengths.update(lengths)
+        
+        ends = ends[lengths > 0]
+        starts = starts[lengths > 0]
+        if not len(starts):
+            return
+        self.trailing += int(np.count_nonzero(is_space(codes[ends - 1])))
+        lead = codes[starts]
+        if is_space(lead).any():
+            # Only lines starting with whitespace can be blank. Each span
+            # runs to the next line with characters in it, across newlines
+            # and empty lines, which are all whitespace.
+            if data is not None:
+                space = np.frombuffer(data.translate(_SPACE_FLAGS), dtype=bool)
+            else:
+                space = is_space(codes)
+            self.non_empty += int(np.count_nonzero(np.logical_or.reduceat(~space, starts)))
+        else:
+            self.non_empty += len(starts)
+        
+        # A line's indentation is the run of its first character, if that
+        # is a space or a tab; the newline always ends the run
+        for char in (32, 9):
+            indented = starts[lead == char]
+            if not len(indented):
+                continue
+            others = np.flatnonzero(codes != char)
+            stops = np.append(others, len(codes))[np.searchsorted(others, indented)]
+            widths = stops - indented
+            self.indents += len(widths)
+            self.indent_sum += int(widths.sum())
+            self.max_indent = max(self.max_indent, int(widths.max()))
+            self.indent_widths.update(widths)
+    
+    def _add_lines(self, lines):
+        if not lines:
+            return
+        line_lengths = [len(line) for line in lines]
+        self.total += len(lines)
+        self.non_empty += len([l for l in lines if l.strip()])
+        self.length_sum += sum(line_lengths)
+        self.max_length = max(self.max_length, max(line_lengths))
+        shortest = min(line_lengths)
+        if self.min_length is None or shortest < self.min_length:
+            self.min_length = shortest
+        self.over_79 += len([n for n in line_lengths if n > 79])
+        self.over_99 += len([n for n in line_lengths if n > 99])
+        self.lengths.update(line_lengths)
+        
+        for line in lines:
+            if line and line != line.rstrip():
+                self.trailing += 1
+            if line and line[0] in [' ', '\t']:
+                leading_spaces = len(line) - len(line.lstrip(' '))
+                leading_tabs = len(line) - len(line.lstrip('\t'))
+                self._add_indent(max(leading_spaces, leading_tabs))
+    
+    def _add_partial(self, line):
+        self.total += 1
+        if not line.blank:
+            self.non_empty += 1
+        self.length_sum += line.length
+        self.max_length = max(self.max_length, line.length)
+        if self.min_length is None or line.length < self.min_length:
+            self.min_length = line.length
+        if line.length > 79:
+            self.over_79 += 1
+        if line.length > 99:
+            self.over_99 += 1
+        self.lengths.add(line.length)
+        if line.length and line.last.isspace():
+            self.trailing += 1
+        if line.lead in [' ', '\t']:
+            self._add_indent(line.lead_run)
+    
+    def _add_indent(self, width):
+        self.indents += 1
+        self.indent_sum += width
+        self.max_indent = max(self.max_indent, width)
+        self.indent_widths.add(width)
+    
+    def finish(self, stats):
+        self._add_partial(self.partial)
+        self.partial = _PartialLine()
+        stats['total_lines'] = self.total
+        stats['non_empty_lines'] = self.non_empty
+        stats['empty_lines'] = self.total - self.non_empty
+        stats['trailing_whitespace_lines'] = self.trailing
+        stats['indented_lines'] = self.indents
+        stats['avg_indentation'] = self.indent_sum / self.indents if self.indents else 0
+        stats['max_indentation'] = self.max_indent
+        stats['avg_line_length'] = self.length_sum / self.total
+        stats['max_line_length'] = self.max_length
+        stats['min_line_length'] = self.min_length
+        stats['lines_over_79'] = self.over_79
+        stats['lines_over_99'] = self.over_99
+        add_distribution(stats, 'line_length', self.lengths)
+        add_distribution(stats, 'indentation', self.indent_widths)
+
+
+class WordSplitter:
+    def __init__(self):
+        self.partial = ''
+    
+    def feed(self, text):
+        # Returns the words completed by this block; a word touching the end
+        # of the block is held back until the next one.
+        if not text:
+            return []
+        words = text.split()
+        if self.partial:
+            if words and not text[0].isspace():
+                words[0] = self.partial + words[0]
+            else:
+                words.insert(0, self.partial)
+        self.partial = words.pop() if words and not text[-1].isspace() else ''
+        return words
+    
+    def flush(self):
+        words = [self.partial] if self.partial else []
+        self.partial = ''
+        return words
+
+
+class WordAccumulator:
+    # Distinct and frequent words are counted exactly until the sketch
+    # options call for a HyperLogLog and a Misra-Gries summary instead
+    def __init__(self, sketches=None):
+        self.sketches = sketches or SketchOptions()
+        self.total = 0
+        self.length_sum = 0
+        self.max_length = 0
+        self.min_length = 0
+        self.unique = set()
+        self.freq = Counter()
+        self.lengths = Distribution(WORD_LENGTH_BOUNDS, sketches)
+        self.approximate = False
+        if self.sketches.sketch_now(0):
+            self._approximate()
+    
+    def _approximate(self):
+        # The exact tables seed the sketches, so nothing counted is lost
+        unique = HyperLogLog(self.sketches.error)
+        unique.update(self.unique)
+        freq = MisraGries(self.sketches.counters)
+        freq.update(self.freq)
+        self.unique, self.freq = unique, freq
+        self.approximate = True
+    
+    def add_words(self, words):
+        if not words:
+            return
+        word_lengths = Counter(map(len, words))
+        if not self.total:
+            self.min_length = min(word_lengths)
+        self.total += len(words)
+        self.length_sum += sum(length * n for length, n in word_lengths.items())
+        self.max_length = max(self.max_length, max(word_lengths))
+        self.min_length = min(self.min_length, min(word_lengths))
+        self.lengths.update_counts(word_lengths)
+        self.unique.update(w.lower() for w in words)
+        self.freq.update(w.lower() for w in words if len(w) > 3)
+        if not self.approximate and self.sketches.sketch_now(len(self.unique)):
+            self._approximate()
+    
+    def finish(self, stats):
+        if self.approximate:
+            unique = min(self.unique.count(), self.total)
+            stats.setdefault('approximate', []).extend(
+                ['unique_words', 'lexical_diversity', 'top_words'])
+        else:
+            unique = len(self.unique)
+        stats['total_words'] = self.total
+        stats['unique_words'] = unique
+        
+        # Lexical diversity
+        if self.total > 0:
+            stats['lexical_diversity'] = unique / self.total
+        else:
+            stats['lexical_diversity'] = 0
+        
+        # Word statistics
+        if self.total:
+            stats['avg_word_length'] = self.length_sum / self.total
+            stats['max_word_length'] = self.max_length
+            stats['min_word_length'] = self.min_length
+            # Most common words (excluding very short ones)
+            stats['top_words'] = self.freq.most_common(10)
+        else:
+            stats['avg_word_length'] = 0
+            stats['max_word_length'] = 0
+            stats['min_word_length'] = 0
+            stats['top_words'] = []
+        add_distribution(stats, 'word_length', self.lengths)
+
+
+# Language analyzers
+#
+# Each entry names the class that analyzes files with the given extensions,
+# and the module it lives in: stats_languages for the built-in ones, which
+# is only imported once a file needs it. A file whose extension has no
+# analyzer is matched by the `sniff` patterns against its first SNIFF_CHARS
+# characters instead.
+
+SNIFF_CHARS = 1024
+
+
+class LanguageAnalyzer:
+    def __init__(self, name, extensions, factory, sniff=None, module='stats_languages',
+                 options=None):
+        self.name = name
+        self.extensions = set(extensions)
+        self.factory = factory
+        self.sniff = re.compile(sniff) if sniff else None
+        self.module = module
+        self.options = options or {}
+    
+    def create(self):
+        return getattr(importlib.import_module(self.module), self.factory)(**self.options)
+
+
+LANGUAGE_ANALYZERS = {}
+
+
+def register_language(name, extensions, factory, sniff=None, module='stats_languages',
+                      options=None):
+    LANGUAGE_ANALYZERS[name] = LanguageAnalyzer(name, extensions, factory, sniff, module, options)
+
+
+def find_language(ext, sample=None):
+    for language in LANGUAGE_ANALYZERS.values():
+        if ext in language.extensions:
+            return language
+    if sample is not None:
+        for language in LANGUAGE_ANALYZERS.values():
+            if language.sniff is not None and language.sniff.match(sample):
+                return language
+    return None
+
+
+register_language('python', ['.py'], 'PythonAccumulator', sniff=r'#![^\n]*python')
+register_language('html', ['.html', '.htm'], 'HtmlAccumulator',
+                  sniff=r'\s*(?i:<!doctype html|<html\b)')
+register_language('css', ['.css'], 'RulesAccumulator', options={'language': 'css'})
+register_language('javascript', ['.js'], 'RulesAccumulator', sniff=r'#![^\n]*node',
+                  options={'language': 'javascript'})
+register_language('json', ['.json'], 'JsonAccumulator')
+register_language('json-lines', ['.jsonl', '.ndjson'], 'JsonAccumulator',
+                  options={'lines': True})
+register_language('xml', ['.xml'], 'XmlAccumulator', sniff=r'\s*<\?xml\b')
+
+
+class LanguageAccumulator:
+    # Forwards every block to the analyzer for the file's extension or, when
+    # there is none, to the one whose sniff pattern matches the file's start
+    def __init__(self, ext):
+        self.analyzer = None
+        self.sample = None
+        language = find_language(ext)
+        if language is not None:
+            self.analyzer = language.create()
+        else:
+            self.sample = ''
+    
+    def feed(self, text):
+        if self.sample is not None:
+            self.sample += text
+            if len(self.sample) >= SNIFF_CHARS:
+                self._sniff()
+        elif self.analyzer is not None:
+            self.analyzer.feed(text)
+    
+    def _sniff(self):
+        sample, self.sample = self.sample, None
+        language = find_language(None, sample)
+        if language is not None:
+            self.analyzer = language.create()
+            self.analyzer.feed(sample)
+    
+    def finish(self, stats):
+        if self.sample is not None:
+            self._sniff()
+        if self.analyzer is not None:
+            self.analyzer.finish(stats)
+
+
+# Metric groups
+#
+# A group is an accumulator plus the inputs it reads: decoded 'text', the
+# 'words' split from it, or the raw 'bytes' of an ASCII-compatible encoding
+# (text otherwise). StatsAccumulator builds only the requested groups and
+# produces only the inputs they read, so counting lines alone never splits
+# words or builds a character histogram. Accumulators take text in
+# feed(text), words in add_words(words) and bytes in feed_bytes(data, text),
+# and write their stats in finish(stats).
+
+class MetricGroup:
+    def __init__(self, name, factory, inputs=('text',)):
+        self.name = name
+        # Called with the StatsAccumulator that will feed the new accumulator
+        self.factory = factory
+        self.inputs = inputs
+
+
+METRIC_GROUPS = {}
+
+
+def register_metric_group(name, factory, inputs=('text',)):
+    METRIC_GROUPS[name] = MetricGroup(name, factory, inputs)
+
+
+def select_metrics(metrics=None):
+    # The named groups (all when None) in registration order, which is the
+    # order their stats appear in
+    if metrics is None:
+        return list(METRIC_GROUPS)
+    unknown = set(metrics) - set(METRIC_GROUPS)
+    if unknown:
+        raise ValueError(f"unknown metric group: {', '.join(sorted(unknown))} "
+                         f"(choose from {', '.join(METRIC_GROUPS)})")
+    return [name for name in METRIC_GROUPS if name in metrics]
+
+
+def _char_group(accumulator):
+    if accumulator.raw_bytes:
+        return ByteCharAccumulator(accumulator.encoding, accumulator.translate_newlines,
+                                   accumulator.sketches)
+    return CharAccumulator(accumulator.sketches)
+
+
+register_metric_group('chars', _char_group, inputs=('bytes',))
+register_metric_group('lines', lambda accumulator: LineAccumulator(accumulator.sketches))
+register_metric_group('words', lambda accumulator: WordAccumulator(accumulator.sketches),
+                      inputs=('words',))
+register_metric_group('readability', lambda accumulator: ReadabilityAccumulator(),
+                      inputs=('text', 'words'))
+register_metric_group('language', lambda accumulator: LanguageAccumulator(accumulator.ext))
+
+
+class StatsAccumulator:
+    # Runs the selected metric groups (all by default) over a stream of
+    # decoded text blocks.
+    # With translate_newlines the blocks are raw file text: line endings are
+    # tallied first (a CRLF split across blocks still counts once) and then
+    # normalized to '\n' like universal-newline reads.
+    # With raw_bytes every block comes with the bytes it was decoded from;
+    # groups reading bytes get those, and the first of them also reports
+    # the line endings. It only takes effect when such a group is selected.
+    # `sketches` (SketchOptions) decides when word and character tables are
+    # replaced by bounded-memory sketches.
+    # `timings` (StageTimings) times each group, word splitting and newline
+    # handling, and the stats then include them under 'performance'.
+    def __init__(self, filepath, encoding, file_stats, translate_newlines=False,
+                 confidence=1.0, has_bom=None, raw_bytes=False, metrics=None, sketches=None,
+                 timings=None):
+        self.filepath = filepath
+        self.encoding = encoding
+        self.confidence = confidence
+        self.file_stats = file_stats
+        self.translate_newlines = translate_newlines
+        # 'app.json.gz' is analyzed as JSON
+        self.ext = os.path.splitext(strip_compression(filepath))[1].lower()
+        # A decoder that strips the BOM reports it up front instead
+        self.started = has_bom is not None
+        self.has_bom = bool(has_bom)
+        self.all_ascii = True
+        self.pending_cr = False
+        self.crlf = 0
+        self.lf = 0
+        self.cr = 0
+        
+        self.metrics = select_metrics(metrics)
+        self.sketches = sketches or SketchOptions()
+        self.timings = timings
+        groups = [METRIC_GROUPS[name] for name in self.metrics]
+        self.raw_bytes = raw_bytes and any('bytes' in group.inputs for group in groups)
+        self.groups = {}
+        self.text_readers = []
+        self.word_readers = []
+        self.byte_readers = []
+        for group in groups:
+            accumulator = self.groups[group.name] = group.factory(self)
+            if 'bytes' in group.inputs and self.raw_bytes:
+                self.byte_readers.append(accumulator)
+            elif 'text' in group.inputs or 'bytes' in group.inputs:
+                self.text_readers.append(accumulator)
+            if 'words' in group.inputs:
+                self.word_readers.append(accumulator)
+        self.words = WordSplitter() if self.word_readers else None
+    
+    def _run(self, reader, method, *args):
+        if self.timings is None:
+            method(*args)
+            return
+        # Each group's time is counted under its name
+        stage = next(name for name, group in self.groups.items() if group is reader)
+        self.timings.run(stage, method, *args)
+    
+    def feed(self, text, data=None):
+        if not self.started and text:
+            self.started = True
+            self.has_bom = text.startswith('\ufeff')
+        for reader in self.byte_readers:
+            self._run(reader, reader.feed_bytes, data, text)
+        started = self.timings.start() if self.timings is not None else None
+        if self.pending_cr:
+            text = '\r' + text
+        self.pending_cr = text.endswith('\r')
+        if self.pending_cr:
+            text = text[:-1]
+        
+        if not self.raw_bytes:
+            crlf = text.count('\r\n')
+            self.crlf += crlf
+            self.lf += text.count('\n') - crlf
+            self.cr += text.count('\r') - crlf
+        if self.translate_newlines and '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        if started is not None:
+            self.timings.stop('read', started)
+        self._feed(text)
+    
+    def _feed(self, text):
+        if not text:
+            return
+        if self.all_ascii and not text.isascii():
+            self.all_ascii = False
+        for reader in self.text_readers:
+            self._run(reader, reader.feed, text)
+        if self.words is not None:
+            if self.timings is None:
+                words = self.words.feed(text)
+            else:
+                words = self.timings.run('split', self.words.feed, text)
+            self._add_words(words)
+    
+    def _add_words(self, words):
+        for reader in self.word_readers:
+            self._run(reader, reader.add_words, words)
+    
+    def finish(self):
+        if self.pending_cr:
+            self.pending_cr = False
+            self.cr += 1
+            self._feed('\n' if self.translate_newlines else '\r')
+        if self.raw_bytes:
+            self.crlf, self.lf, self.cr = self.byte_readers[0].line_endings()
+        if self.words is not None:
+            self._add_words(self.words.flush())
+        
+        stats = {
+            'filename': os.path.basename(self.filepath),
+            'filepath': self.filepath,
+            'file_size': self.file_stats.st_size,
+            'encoding': self.encoding,
+            'encoding_confidence': self.confidence,
+            'has_bom': self.has_bom,
+            'line_ending': classify_line_endings(self.crlf, self.lf, self.cr),
+        }
+        stats.update(file_times(self.file_stats))
+        for accumulator in self.groups.values():
+            self._run(accumulator, accumulator.finish, stats)
+        if self.timings is not None:
+            stats['performance'] = self.timings.result()
+        return stats
+
+
+# Encoding detection
+#
+# The first block read from the file doubles as the detection sample, so the
+# file is read (and decoded) once. If a later block turns out not to be valid
+# in the detected encoding, the scan restarts with the next fallback.
+
+_BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+# Bytes 0x80-0x9F are printable in cp1252 but C1 controls in latin-1;
+# five of them are undefined in cp1252.
+_NON_C1_BYTES = bytes(b for b in range(256) if not 0x80 <= b <= 0x9f)
+_CP1252_UNDEFINED = b'\x81\x8d\x8f\x90\x9d'
+ENCODING_FALLBACKS = {
+    'utf-8': ('cp1252', 0.7),
+    'cp1252': ('latin-1', 0.5),
+}
+
+
+def detect_encoding(sample, complete=False):
+    # Returns (encoding, confidence, has_bom). `complete` means the sample
+    # is the whole file, so a successful check is certain.
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding, 1.0, True
+    
+    if sample.isascii():
+        return ('ascii', 1.0, False) if complete else ('utf-8', 0.9, False)
+    
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=complete)
+        return 'utf-8', 1.0 if complete else 0.99, False
+    except UnicodeDecodeError:
+        pass
+    
+    # latin-1 decodes anything, so it is only chosen for bytes cp1252 leaves
+    # undefined; cp1252 punctuation further on would otherwise be read as
+    # C1 controls. An undefined byte later in the file falls back to it.
+    c1 = sample.translate(None, _NON_C1_BYTES)
+    if any(b in _CP1252_UNDEFINED for b in c1):
+        return 'latin-1', 0.6, False
+    return 'cp1252', 0.8 if c1 else 0.7, False
+
+
+def calculate_stats(content, filepath, encoding, file_stats, metrics=None, sketches=None):
+    accumulator = StatsAccumulator(filepath, encoding, file_stats, metrics=metrics,
+                                   sketches=sketches)
+    accumulator.feed(content)
+    return accumulator.finish()
+
+
+class AnalysisCancelled(Exception):
+    pass
+
+
+# Encodings whose ASCII range is one byte per character, so ASCII-level
+# counts can be read straight off the raw bytes
+ASCII_COMPATIBLE = {'ascii', 'utf-8', 'utf-8-sig', 'latin-1', 'cp1252'}
+
+
+class MappedFile:
+    # Read-only file view over mmap: read() hands out memoryview slices, so
+    # blocks reach the decoder and the byte counters without being copied.
+    def __init__(self, f):
+        self.name = f.name
+        self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mm)
+        self.pos = 0
+    
+    def read(self, size):
+        block = self.view[self.pos:self.pos + size]
+        self.pos += len(block)
+        return block
+    
+    def seek(self, pos):
+        self.pos = pos
+    
+    def tell(self):
+        return self.pos
+    
+    def close(self):
+        try:
+            self.view.release()
+            self.mm.close()
+        except BufferError:
+            # A traceback still references a block; the mapping is
+            # released together with it
+            pass
+
+
+# Compressed input
+#
+# Files named with one of these suffixes are decompressed as they are read,
+# so they are analyzed without being extracted first. The stats describe
+# the decompressed text: 'file_size' is its size, and 'compressed_size'
+# and 'compression' describe the file itself.
+
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.bz2': 'bzip2', '.xz': 'xz', '.lzma': 'lzma'}
+
+
+def compression(name):
+    return COMPRESSION_SUFFIXES.get(os.path.splitext(name)[1].lower())
+
+
+def strip_compression(name):
+    return os.path.splitext(name)[0] if compression(name) else name
+
+
+class DecompressedFile:
+    # Reads the decompressed bytes of `raw`. tell() is the position in the
+    # compressed data, so progress is reported against the file's size.
+    def __init__(self, raw, method, name):
+        self.raw = raw
+        self.name = name
+        if method == 'gzip':
+            self.stream = gzip.GzipFile(fileobj=raw, mode='rb')
+        elif method == 'bzip2':
+            self.stream = bz2.BZ2File(raw)
+        else:
+            self.stream = lzma.LZMAFile(raw)
+        self.size = 0
+    
+    def read(self, size):
+        block = self.stream.read(size)
+        self.size += len(block)
+        return block
+    
+    def seek(self, pos):
+        self.stream.seek(pos)
+        self.size = pos
+    
+    def tell(self):
+        return self.raw.tell()
+    
+    def close(self):
+        # Leaves `raw` open, like the file objects wrapping it
+        self.stream.close()
+
+
+def _feed_blocks(f, block, accumulator, decoder, chunk_size, progress, cancel, total):
+    raw = accumulator.raw_bytes
+    timings = accumulator.timings
+    while block:
+        if timings is None:
+            text = decoder.decode(block)
+        else:
+            started = timings.start()
+            text = decoder.decode(block)
+            timings.stop('read', started, len(block))
+        accumulator.feed(text, block if raw else None)
+        if cancel is not None and cancel.is_set():
+            raise AnalysisCancelled(f.name)
+        if progress is not None:
+            progress(f.tell(), total)
+        if timings is None:
+            block = f.read(chunk_size)
+        else:
+            block = timings.run('read', f.read, chunk_size)
+
+
+def _scan(f, filepath, file_stats, encoding, chunk_size, progress, cancel, final=True,
+          metrics=None, sketches=None, timings=None):
+    # Reads `f` from the start. Returns the unfinished accumulator, its
+    # decoder and whether the encoding was detected rather than given.
+    block = f.read(chunk_size)
+    detected = encoding is None
+    if detected:
+        # A file scanned for tailing may still be growing, so never "complete"
+        encoding, confidence, has_bom = detect_encoding(bytes(block),
+                                                        final and len(block) < chunk_size)
+        fallbacks = ENCODING_FALLBACKS
+    else:
+        confidence, has_bom, fallbacks = 1.0, None, {}
+    
+    while True:
+        accumulator = StatsAccumulator(filepath, encoding, file_stats, translate_newlines=True,
+                                       confidence=confidence, has_bom=has_bom,
+                                       raw_bytes=encoding in ASCII_COMPATIBLE, metrics=metrics,
+                                       sketches=sketches, timings=timings)
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            _feed_blocks(f, block, accumulator, decoder, chunk_size, progress, cancel,
+                         file_stats.st_size)
+            if final:
+                accumulator.feed(decoder.decode(b'', final=True), b'')
+            return accumulator, decoder, detected
+        except UnicodeDecodeError:
+            if encoding not in fallbacks:
+                raise
+            encoding, confidence = fallbacks[encoding]
+            f.seek(0)
+            block = f.read(chunk_size)
+
+
+def _finish_scan(accumulator, detected):
+    stats = accumulator.finish()
+    # A full decode settles what the sample could only estimate
+    if detected and accumulator.encoding in ['utf-8', 'ascii']:
+        if accumulator.all_ascii:
+            stats['encoding'], stats['encoding_confidence'] = 'ascii', 1.0
+        elif accumulator.encoding == 'utf-8':
+            stats['encoding_confidence'] = 1.0
+    return stats
+
+
+def stream_stats(filepath, encoding=None, file_stats=None, chunk_size=CHUNK_SIZE,
+                 progress=None, cancel=None, use_mmap=True, metrics=None, sketches=None,
+                 timings=False):
+    # Detects the encoding from the first block unless one is given; raises
+    # UnicodeDecodeError only when an explicit encoding does not fit.
+    # progress(bytes_done, total_bytes) is called after every block, and
+    # setting the `cancel` event stops the scan before the next one.
+    # Non-empty regular files are memory-mapped unless use_mmap is False.
+    # `metrics` names the METRIC_GROUPS to compute; None computes all.
+    # `sketches` (SketchOptions) sets when exact word and character tables
+    # give way to sketches; by default only past a million distinct words.
+    # With `timings` the stats include the time spent in each stage under
+    # 'performance' (see StageTimings).
+    # Compressed files are decompressed as they are read (see compression()).
+    if file_stats is None:
+        file_stats = os.stat(filepath)
+    with open(filepath, 'rb') as f:
+        source = f
+        if use_mmap and file_stats.st_size > 0 and compression(filepath) is None:
+            try:
+                source = MappedFile(f)
+            except (OSError, ValueError):
+                pass
+        try:
+            return scan_file(source, filepath, file_stats, encoding, chunk_size, progress,
+                             cancel, metrics, sketches, timings)
+        finally:
+            if source is not f:
+                source.close()
+
+
+def scan_file(f, filepath, file_stats, encoding=None, chunk_size=CHUNK_SIZE, progress=None,
+              cancel=None, metrics=None, sketches=None, timings=False):
+    # stream_stats over an open binary file, such as an archive member.
+    # `filepath` names it in the stats; with a compression suffix, `f` holds
+    # compressed data. `file_stats` needs st_size and the st_*time fields.
+    method = compression(filepath)
+    source = DecompressedFile(f, method, filepath) if method is not None else f
+    try:
+        accumulator, decoder, detected = _scan(source, filepath, file_stats, encoding,
+                                               chunk_size, progress, cancel, metrics=metrics,
+                                               sketches=sketches,
+                                               timings=StageTimings() if timings else None)
+    finally:
+        if source is not f:
+            source.close()
+    stats = _finish_scan(accumulator, detected)
+    if method is not None:
+        stats['file_size'] = source.size
+        stats['compressed_size'] = file_stats.st_size
+        stats['compression'] = method
+    return stats
+
+
+# Line index
+#
+# Byte offsets and lengths of every line of a file, so a line can be looked
+# up by number and the longest lines listed without scanning again. It is
+# built from the raw bytes in one vectorized pass, so it needs NumPy and an
+# ASCII-compatible encoding. Lines break at '\n', '\r\n' and '\r', and
+# lengths are in characters, as in the line statistics.
+
+class LineIndex:
+    def __init__(self, filepath, encoding, chunk_size=CHUNK_SIZE, cancel=None):
+        if np is None:
+            raise RuntimeError("the line index needs NumPy")
+        if encoding not in ASCII_COMPATIBLE:
+            raise ValueError(f"cannot index the lines of {encoding} text")
+        if compression(filepath) is not None:
+            raise ValueError("cannot index the lines of a compressed file")
+        self.filepath = filepath
+        self.encoding = encoding
+        self.by_length = None
+        with open(filepath, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                self._build(np.zeros(0, dtype=np.uint8), chunk_size, cancel)
+                return
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                self._build(np.frombuffer(mm, dtype=np.uint8), chunk_size, cancel)
+            finally:
+                mm.close()
+    
+    def _build(self, view, chunk_size, cancel):
+        size = len(view)
+        utf8 = self.encoding in ('utf-8', 'utf-8-sig')
+        start = 0
+        if self.encoding == 'utf-8-sig' and view[:3].tobytes() == codecs.BOM_UTF8:
+            start = 3
+        
+        # Byte offset of every line break and, for UTF-8, the continuation
+        # bytes before it, which turn byte offsets into character offsets
+        breaks = []
+        before = []
+        continued = 0
+        for offset in range(0, size, chunk_size):
+            block = view[offset:offset + chunk_size]
+            cr = block == 13
+            # The LF of a CRLF pair belongs to the CR break
+            after_cr = np.empty_like(cr)
+            after_cr[0] = offset > 0 and view[offset - 1] == 13
+            after_cr[1:] = cr[:-1]
+            ends = np.flatnonzero(cr | ((block == 10) & ~after_cr))
+            breaks.append(ends + offset)
+            if utf8:
+                continuation = np.flatnonzero((block & 0xC0) == 0x80)
+                before.append(np.searchsorted(continuation, ends) + continued)
+                continued += len(continuation)
+            if cancel is not None and cancel.is_set():
+                raise AnalysisCancelled(self.filepath)
+        
+        breaks = np.concatenate(breaks or [np.zeros(0, dtype=np.int64)]).astype(np.int64)
+        # A CRLF break is two bytes long
+        pair = np.zeros(len(breaks), dtype=np.int64)
+        inside = breaks + 1 < size
+        pair[inside] = (view[breaks[inside]] == 13) & (view[breaks[inside] + 1] == 10)
+        self.starts = np.concatenate(([start], breaks + 1 + pair))
+        self.ends = np.append(breaks, size)
+        
+        chars = np.append(breaks, size)
+        first = start
+        if utf8:
+            chars = chars - np.append(np.concatenate(before or [np.zeros(0, dtype=np.int64)]),
+                                      continued)
+            first -= int(np.count_nonzero((view[:start] & 0xC0) == 0x80))
+        # Newline bytes are ASCII, so each line starts just past the last
+        # one's break in characters too
+        char_starts = np.concatenate(([first], chars[:-1] + 1 + pair))
+        self.lengths = chars - char_starts
+    
+    def __len__(self):
+        return len(self.starts)
+    
+    def span(self, number):
+        # Byte range of line `number`, counting from 1, without its newline
+        if not 1 <= number <= len(self.starts):
+            raise IndexError(f"line {number} is out of range (1-{len(self.starts)})")
+        return int(self.starts[number - 1]), int(self.ends[number - 1])
+    
+    def line(self, number, limit=None):
+        # The text of line `number`, or of its first `limit` bytes
+        start, end = self.span(number)
+        if limit is not None:
+            end = min(end, start + limit)
+        with open(self.filepath, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start).decode(self.encoding, 'replace')
+    
+    def longest(self, count=10):
+        # (line number, length) of the longest lines, longest first and
+        # ties in file order; the lines are sorted by length only once
+        if self.by_length is None:
+            self.by_length = np.argsort(-self.lengths, kind='stable')
+        return [(int(i) + 1, int(self.lengths[i])) for i in self.by_length[:count]]
+    
+    def count_over(self, width):
+        return int(np.count_nonzero(self.lengths > width))
+    
+    def percentiles(self, quantiles=(50, 90, 99)):
+        values = np.percentile(self.lengths, quantiles)
+        return {q: float(v) for q, v in zip(quantiles, values)}
+    
+    def histogram(self, bins=10):
+        # (lower edge, line count) for `bins` equal-width length buckets
+        counts, edges = np.histogram(self.lengths, bins)
+        return list(zip(edges[:-1].tolist(), counts.tolist()))
+
+
+# Incremental (tail) analysis
+#
+# For append-only files the unfinished accumulators are kept together with
+# the byte offset they reached, so the next run only decodes the bytes
+# appended since. A different inode, a smaller size or changed bytes just
+# before the saved offset mean the file was rotated, truncated or rewritten,
+# and the scan starts over.
+
+TAIL_CHECK_BYTES = 4096
+
+
+def _tail_digest(f, offset):
+    start = max(offset - TAIL_CHECK_BYTES, 0)
+    f.seek(start)
+    return hashlib.blake2b(f.read(offset - start), digest_size=16).digest()
+
+
+class TailState:
+    def __init__(self, accumulator, decoder, offset, file_stats, digest, detected):
+        self.version = ANALYZER_VERSION
+        self.accumulator = accumulator
+        self.decoder_state = decoder.getstate()
+        self.offset = offset
+        self.inode = file_stats.st_ino
+        self.device = file_stats.st_dev
+        self.digest = digest
+        self.detected = detected
+    
+    def can_resume(self, f, file_stats, metrics=None, sketches=None):
+        if self.version != ANALYZER_VERSION:
+            return False
+        if self.accumulator.metrics != select_metrics(metrics):
+            return False
+        if self.accumulator.sketches != (sketches or SketchOptions()):
+            return False
+        if (file_stats.st_ino, file_stats.st_dev) != (self.inode, self.device):
+            return False
+        if file_stats.st_size < self.offset:
+            return False
+        return _tail_digest(f, self.offset) == self.digest
+
+
+def tail_stats(filepath, state=None, chunk_size=CHUNK_SIZE, progress=None, cancel=None,
+               metrics=None, sketches=None, timings=False):
+    # Returns (stats, state); pass the state back in on the next run. A
+    # state saved for other metrics or sketch options is not resumed.
+    # Timings cover this run only. Compressed files cannot be resumed, so
+    # they are analyzed in full and the state is None.
+    if compression(filepath) is not None:
+        return stream_stats(filepath, chunk_size=chunk_size, progress=progress, cancel=cancel,
+                            metrics=metrics, sketches=sketches, timings=timings), None
+    file_stats = os.stat(filepath)
+    timings = StageTimings() if timings else None
+    with open(filepath, 'rb') as f:
+        if state is not None and not state.can_resume(f, file_stats, metrics, sketches):
+            state = None
+        
+        if state is not None:
+            accumulator = state.accumulator
+            accumulator.timings = timings
+            detected = state.detected
+            decoder = codecs.getincrementaldecoder(accumulator.encoding)()
+            decoder.setstate(state.decoder_state)
+            f.seek(state.offset)
+            try:
+                _feed_blocks(f, f.read(chunk_size), accumulator, decoder, chunk_size,
+                             progress, cancel, file_stats.st_size)
+            except UnicodeDecodeError:
+                # The appended bytes do not fit the saved encoding
+                state = None
+        
+        if state is None:
+            f.seek(0)
+            accumulator, decoder, detected = _scan(f, filepath, file_stats, None, chunk_size,
+                                                   progress, cancel, final=False, metrics=metrics,
+                                                   sketches=sketches, timings=timings)
+        offset = f.tell()
+        state = TailState(accumulator, decoder, offset, file_stats, _tail_digest(f, offset),
+                          detected)
+    
+    # Finish a copy so the saved accumulators can keep going next time
+    snapshot = copy.deepcopy(accumulator)
+    snapshot.file_stats = file_stats
+    accumulator.timings = None
+    decoder = codecs.getincrementaldecoder(accumulator.encoding)()
+    decoder.setstate(state.decoder_state)
+    try:
+        snapshot.feed(decoder.decode(b'', final=True), b'')
+    except UnicodeDecodeError:
+        # A character still being written; it is decoded on the next run
+        pass
+    return _finish_scan(snapshot, detected), state
+
+
+def format_source(stats):
+    # Where the text came from, for compressed files and archive members
+    lines = ''
+    if 'archive' in stats:
+        lines += f"Archive:               {stats['archive']}\n"
+    if 'compression' in stats:
+        lines += (f"Compression:           {stats['compression']} "
+                  f"({stats['compressed_size']:,} bytes compressed)\n")
+    return lines
+
+
+def format_report(stats):
+    output = f"""
+╔═══════════════════════════════════════════════════════════════════════════╗
+║                    COMPREHENSIVE FILE STATISTICS REPORT                   ║
+╚═══════════════════════════════════════════════════════════════════════════╝
+
+📁 FILE INFORMATION
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+File Name:             {stats['filename']}
+File Size:             {stats['file_size']:,} bytes ({stats['file_size']/1024:.2f} KB)
+Encoding:              {stats['encoding']} ({stats['encoding_confidence']:.0%} confidence)
+BOM Present:           {'Yes' if stats['has_bom'] else 'No'}
+Line Endings:          {stats['line_ending']}
+{format_source(stats)}
+📅 TIME METADATA
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Created:               {stats['created']}
+Modified:              {stats['modified']}
+Last Accessed:         {stats['accessed']}
+"""
+
+    # Values estimated by sketches are marked with '~'
+    approximate = set(stats.get('approximate', ()))
+    mark = {field: '~' for field in approximate}
+
+    # Each section needs its metric group
+    if 'total_chars' in stats:
+        output += f"""
+📊 CHARACTER STATISTICS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Total Characters:      {stats['total_chars']:,}
+Alphabetic:            {stats['alphabetic']:,}
+Numeric:               {stats['numeric']:,}
+Uppercase:             {stats['uppercase']:,}
+Lowercase:             {stats['lowercase']:,}
+Special Characters:    {stats['special_chars']:,}
+Non-ASCII Characters:  {stats['non_ascii']:,}
+Spaces:                {stats['spaces']:,}
+Tabs:                  {stats['tabs']:,}
+Newlines:              {stats['newlines']:,}
+"""
+
+    if 'total_lines' in stats:
+        output += f"""
+📝 LINE STATISTICS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Total Lines:           {stats['total_lines']:,}
+Non-Empty Lines:       {stats['non_empty_lines']:,}
+Empty Lines:           {stats['empty_lines']:,}
+Average Line Length:   {stats['avg_line_length']:.2f} chars
+Maximum Line Length:   {stats['max_line_length']:,} chars
+Minimum Line Length:   {stats['min_line_length']:,} chars
+Lines Over 79 Chars:   {stats['lines_over_79']:,}
+Lines Over 99 Chars:   {stats['lines_over_99']:,}
+Trailing Whitespace:   {stats['trailing_whitespace_lines']:,} lines
+"""
+
+    if 'total_words' in stats:
+        output += f"""
+🔤 WORD STATISTICS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Total Words:           {stats['total_words']:,}
+Unique Words:          {mark.get('unique_words', '')}{stats['unique_words']:,}
+Lexical Diversity:     {mark.get('lexical_diversity', '')}{stats['lexical_diversity']:.4f}
+Average Word Length:   {stats['avg_word_length']:.2f} chars
+Maximum Word Length:   {stats['max_word_length']:,} chars
+Minimum Word Length:   {stats['min_word_length']:,} chars
+"""
+
+    if 'indented_lines' in stats:
+        output += f"""
+⬆️ INDENTATION STATISTICS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Indented Lines:        {stats['indented_lines']:,}
+Average Indentation:   {stats['avg_indentation']:.2f} spaces
+Maximum Indentation:   {stats['max_indentation']:,} spaces
+"""
+
+    distributions = [(label, name) for label, name in DISTRIBUTION_LABELS
+                     if stats.get(f'{name}_percentiles')]
+    if distributions:
+        output += """
+📏 LENGTH DISTRIBUTIONS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+        for label, name in distributions:
+            output += format_distribution(label, stats[f'{name}_percentiles'],
+                                          stats[f'{name}_histogram'],
+                                          f'{name}_percentiles' in approximate)
+
+    if 'commas' in stats:
+        output += f"""
+🔣 PUNCTUATION STATISTICS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Commas (,):            {stats['commas']:,}
+Periods (.):           {stats['periods']:,}
+Semicolons (;):        {stats['semicolons']:,}
+Colons (:):            {stats['colons']:,}
+Exclamations (!):      {stats['exclamations']:,}
+Questions (?):         {stats['questions']:,}
+
+🔐 BRACKETS & QUOTES
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Parentheses ( ):       {stats['parentheses_open']:,} open, {stats['parentheses_close']:,} close
+Braces {{ }}:            {stats['braces_open']:,} open, {stats['braces_close']:,} close
+Brackets [ ]:          {stats['brackets_open']:,} open, {stats['brackets_close']:,} close
+Angle Brackets < >:    {stats['angle_brackets_open']:,} open, {stats['angle_brackets_close']:,} close
+Single Quotes ('):     {stats['single_quotes']:,}
+Double Quotes ("):     {stats['double_quotes']:,}
+Backticks (`):         {stats['backticks']:,}
+
+🏗️ CODE STRUCTURE
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Max Nesting Depth:     {stats['max_nesting_depth']}
+"""
+
+    # Readability metrics
+    if 'flesch_score' in stats:
+        output += f"""
+📖 READABILITY METRICS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Flesch Reading Ease:   {stats['flesch_score']:.2f}
+Flesch-Kincaid Grade:  {stats['flesch_kincaid_grade']:.2f}
+Gunning Fog Index:     {stats['gunning_fog']:.2f}
+SMOG Index:            {stats['smog_index']:.2f}
+Sentences:             {stats['sentences']:,}
+Polysyllabic Words:    {stats['polysyllabic_words']:,}
+Avg Sentence Length:   {stats['avg_sentence_length']:.2f} words
+Avg Syllables/Word:    {stats['avg_syllables_per_word']:.2f}
+"""
+
+    # Top words
+    if stats.get('top_words'):
+        output += f"""
+🔝 TOP 10 MOST FREQUENT WORDS (>3 chars{', estimated' if 'top_words' in approximate else ''})
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+        for word, count in stats['top_words']:
+            output += f"{word:>20} : {count:,} times\n"
+
+    # Character frequency
+    if 'char_frequency' in stats:
+        output += f"""
+🔤 TOP 15 MOST FREQUENT CHARACTERS{' (estimated)' if 'char_frequency' in approximate else ''}
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+        for char, count in stats['char_frequency']:
+            char_display = repr(char) if char in [' ', '\n', '\t', '\r'] else char
+            output += f"{char_display:>8} : {count:,} times\n"
+
+    # Python specific stats
+    if 'python_comments' in stats:
+        output += f"""
+🐍 PYTHON SPECIFIC STATISTICS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Comment Lines (#):     {stats['python_comments']:,}
+Import Statements:     {stats['python_imports']:,}
+Function Definitions:  {stats['python_functions']:,}
+Class Definitions:     {stats['python_classes']:,}
+Decorators (@):        {stats['python_decorators']:,}
+F-strings:             {stats['python_f_strings']:,}
+List Comprehensions:   {stats['python_list_comp']:,}
+All Comprehensions:    {stats['python_comprehensions']:,}
+Try-Except Blocks:     {stats['python_try_except']:,}
+Docstrings:            {stats['python_docstrings']:,}
+Type Hints:            {stats['python_type_hints']:,}
+TODO/FIXME Comments:   {stats['python_todos']:,}
+String Literals:       {stats['string_literals']:,}
+Avg String Length:     {stats['avg_string_length']:.2f} chars
+"""
+
+    # HTML specific stats
+    elif 'html_tags' in stats:
+        output += f"""
+🌐 HTML SPECIFIC STATISTICS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Total HTML Tags:       {stats['html_tags']:,}
+HTML Comments:         {stats['html_comments']:,}
+Div Tags:              {stats['html_div_tags']:,}
+Script Tags:           {stats['html_script_tags']:,}
+Style Tags:            {stats['html_style_tags']:,}
+Image Tags:            {stats['html_img_tags']:,}
+Anchor Tags:           {stats['html_a_tags']:,}
+Total Attributes:      {stats['html_attributes']:,}
+Self-closing Tags:     {stats['html_self_closing']:,}
+Maximum Nesting Depth: {stats['html_depth']}
+Unclosed Tags:         {stats['html_unclosed_tags']:,}
+Stray End Tags:        {stats['html_stray_end_tags']:,}
+Well-formed:           {'Yes' if stats['html_well_formed'] else 'No'}
+"""
+        output += format_tag_counts(stats['html_tag_counts'], 'html_tag_counts' in approximate)
+
+    # CSS specific stats
+    elif 'css_selectors' in stats:
+        output += f"""
+🎨 CSS SPECIFIC STATISTICS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+CSS Selectors:         {stats['css_selectors']:,}
+CSS Properties:        {stats['css_properties']:,}
+CSS Comments:          {stats['css_comments']:,}
+Media Queries:         {stats['css_media_queries']:,}
+Unique Classes:        {stats['css_classes']:,}
+Unique IDs:            {stats['css_ids']:,}
+"""
+
+    # JavaScript specific stats
+    elif 'js_functions' in stats:
+        output += f"""
+⚡ JAVASCRIPT SPECIFIC STATISTICS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Function Declarations: {stats['js_functions']:,}
+Arrow Functions:       {stats['js_arrow_functions']:,}
+Var Declarations:      {stats['js_var_declarations']:,}
+Let Declarations:      {stats['js_let_declarations']:,}
+Const Declarations:    {stats['js_const_declarations']:,}
+Single-line Comments:  {stats['js_comments_single']:,}
+Multi-line Comments:   {stats['js_comments_multi']:,}
+Template Literals:     {stats['js_template_literals']:,}
+"""
+
+    # JSON specific stats
+    elif 'json_valid' in stats:
+        output += f"""
+📋 JSON SPECIFIC STATISTICS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+        if 'json_records' in stats:
+            output += f"""Valid JSON Lines:      {'Yes' if stats['json_valid'] else 'No'}
+Records:               {stats['json_records']:,}
+Invalid Records:       {stats['json_invalid_records']:,}
+"""
+        elif not stats['json_valid']:
+            output += "Valid JSON:            No (Parse Error)\n"
+        else:
+            output += "Valid JSON:            Yes\n"
+        if 'json_depth' in stats:
+            output += f"""JSON Nesting Depth:    {stats['json_depth']}
+Total JSON Keys:       {stats['json_keys']:,}
+Arrays:                {stats['json_arrays']:,}
+Array Elements:        {stats['json_array_elements']:,}
+Longest String:        {stats['json_longest_string']:,} characters
+"""
+            for kind, count in sorted(stats['json_value_types'].items(), key=lambda x: -x[1]):
+                output += f"{kind + ' values':>20} : {count:,}\n"
+
+    # XML specific stats
+    elif 'xml_tags' in stats:
+        output += f"""
+📄 XML SPECIFIC STATISTICS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+XML Tags:              {stats['xml_tags']:,}
+Self-closing Tags:     {stats['xml_self_closing']:,}
+XML Comments:          {stats['xml_comments']:,}
+Total Attributes:      {stats['xml_attributes']:,}
+Maximum Nesting Depth: {stats['xml_depth']}
+"""
+        if stats['xml_well_formed']:
+            output += "Well-formed:           Yes\n"
+        else:
+            output += f"Well-formed:           No ({stats['xml_error']})\n"
+        output += format_tag_counts(stats['xml_tag_counts'], 'xml_tag_counts' in approximate)
+
+    output += "\n" + "═" * 80 + "\n"
+    output += "Analysis Complete!\n"
+    
+    if stats.get('performance'):
+        output += format_performance(stats['performance'])
+    
+    return output
+
+
+def format_tag_counts(tag_counts, approximate=False):
+    if not tag_counts:
+        return ""
+    output = f"Most Common Tags{' (estimated)' if approximate else ''}:\n"
+    for tag, count in tag_counts:
+        output += f"{tag:>20} : {count:,}\n"
+    return output
+
+
+DISTRIBUTION_LABELS = [
+    ('Line Length', 'line_length'),
+    ('Indentation', 'indentation'),
+    ('Word Length', 'word_length'),
+    ('String Literal Length', 'string_length'),
+]
+HISTOGRAM_WIDTH = 30
+
+
+def format_distribution(label, percentiles, histogram, approximate=False):
+    mark = '~' if approximate else ''
+    output = f"{label + ':':<23}" + ', '.join(f"{p} {mark}{value:,}"
+                                               for p, value in percentiles.items()) + "\n"
+    # Buckets past the last non-empty one are left out
+    used = [i for i, (_, count) in enumerate(histogram) if count]
+    largest = max(count for _, count in histogram)
+    for bucket, count in histogram[:used[-1] + 1]:
+        bar = '█' * round(HISTOGRAM_WIDTH * count / largest)
+        output += f"{bucket:>12} : {count:>10,}  {bar}\n"
+    return output
+
+
+# Stages of the performance section, before and after the metric groups
+STAGE_LABELS = {
+    'cache': 'Cache Lookup',
+    'read': 'Read/Decode',
+    'split': 'Word Splitting',
+    'chars': 'Characters',
+    'lines': 'Lines',
+    'words': 'Words',
+    'readability': 'Readability',
+    'language': 'Language',
+    'line_index': 'Line Index',
+    'render': 'Rendering',
+}
+
+
+def format_performance(performance):
+    order = ['cache', 'read', 'split'] + list(METRIC_GROUPS) + ['line_index', 'render']
+    stages = sorted(performance, key=lambda stage: order.index(stage) if stage in order
+                    else len(order))
+    output = f"""
+⏱️ PERFORMANCE
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+{'Stage':<18}{'Wall ms':>10}{'CPU ms':>10}{'MB/s':>10}{'Peak Alloc':>13}
+"""
+    for stage in stages:
+        timing = performance[stage]
+        wall = timing['wall_seconds']
+        rate = '-'
+        if timing['bytes'] and wall > 0:
+            rate = f"{timing['bytes'] / 1048576 / wall:,.1f}"
+        peak = '-'
+        if timing['peak_alloc_bytes'] is not None:
+            peak = f"{timing['peak_alloc_bytes'] / 1048576:,.2f} MB"
+        output += (f"{STAGE_LABELS.get(stage, stage.title()):<18}{wall * 1000:>10,.1f}"
+                   f"{timing['cpu_seconds'] * 1000:>10,.1f}{rate:>10}{peak:>13}\n")
+    wall = sum(timing['wall_seconds'] for timing in performance.values())
+    cpu = sum(timing['cpu_seconds'] for timing in performance.values())
+    output += f"{'Total':<18}{wall * 1000:>10,.1f}{cpu * 1000:>10,.1f}\n"
+    return output
@@ -0,0 +1,1043 @@
+import io
+import keyword
+import re
+import tokenize
+from collections import Counter
+from functools import partial
+from html.parser import HTMLParser
+from operator import attrgetter
+from xml.parsers import expat
+
+from stats_engine import MAX_CARRY, add_distribution
+from stats_sketches import Distribution, MisraGries
+
+# Language analyzers
+#
+# stats_engine looks up the analyzer for a file in LANGUAGE_ANALYZERS and
+# only imports this module once a file needs one. Each analyzer is fed the
+# decoded, newline-normalized blocks of one file and writes its metrics in
+# finish(stats).
+
+
+# Language rules
+#
+# Each language's patterns are compiled once into a single alternation, so
+# a block is scanned by one finditer pass however many metrics there are.
+# Every alternative ends in an empty group named after the metric it
+# counts, which makes that group the match's lastgroup; alternatives that
+# share a prefix are nested under it, so a position that cannot start any
+# of them is rejected after a single check. Groups starting with '_' only
+# consume text, such as string literals, that the other rules must not
+# look into. A group may also have a handler that derives further counts
+# from the match; without handlers the counting loop runs in C.
+#
+# Groups starting with '_open' match a construct that is still open where
+# the text ends (a comment, template literal or tag without its end), from
+# its start to the end. A block scan stops there and the construct is
+# scanned again with the next block, so every block ends between tokens
+# and the counts do not depend on where blocks are cut. At the end of the
+# file the construct has no end: the scan goes on after its first
+# character, as if the group were not there, or calls its handler.
+
+class LanguageRules:
+    def __init__(self, pattern, metrics, unique=(), totals=None, handlers=None):
+        self.pattern = re.compile(pattern, re.DOTALL)
+        # Reported in this order; `unique` metrics count distinct values, and
+        # a metric in `totals` also adds up the counts of the listed groups
+        self.metrics = metrics
+        self.unique = unique
+        self.totals = totals or {}
+        self.handlers = handlers or {}
+        self.open_groups = [name for name in self.pattern.groupindex if name[:5] == '_open']
+    
+    def scan(self, text, counts, found, final=True):
+        # Unless `final`, returns where an open construct starts, if text
+        # ends inside one; it is not counted
+        handlers = self.handlers
+        position = 0
+        while True:
+            if handlers:
+                last = None
+                for match in self.pattern.finditer(text, position):
+                    name = match.lastgroup
+                    if name.startswith('_open'):
+                        last = match
+                        break
+                    counts[name] += 1
+                    if name in handlers:
+                        handlers[name](match, counts, found)
+            else:
+                counts.update(map(_LAST_GROUP, self.pattern.finditer(text, position)))
+                last = None
+                if sum(counts.pop(name, 0) for name in self.open_groups):
+                    # An open construct runs to the end, so it is the last
+                    # match; finding where it starts takes another pass
+                    for last in self.pattern.finditer(text, position):
+                        pass
+            if last is None:
+                return None
+            if not final:
+                return last.start()
+            if last.lastgroup in handlers:
+                handlers[last.lastgroup](last, counts, found)
+                return None
+            position = last.start() + 1
+    
+    def report(self, counts, stats):
+        for key in self.metrics:
+            stats[key] = counts[key] + sum(counts[name] for name in self.totals.get(key, ()))
+
+
+_LAST_GROUP = attrgetter('lastgroup')
+
+
+def _rule(name, pattern):
+    return f'{pattern}(?P<{name}>)'
+
+
+def _either(*alternatives):
+    return '(?:' + '|'.join(alternatives) + ')'
+
+
+_QUOTED = r'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\''
+
+
+_CSS_PROPERTY = re.compile(r'[\w-]+\s*:')
+_CSS_CLASS = re.compile(r'\.[A-Za-z_-][\w-]*')
+_CSS_ID = re.compile(r'#[A-Za-z_-][\w-]*')
+
+
+def _css_segment(match, counts, found):
+    # A selector or at-rule prelude ends with '{', a declaration with ';' or '}'
+    segment = match.group()
+    text = segment.rstrip('{;}').strip()
+    if not text:
+        return
+    if segment.endswith('{'):
+        if text.startswith('@'):
+            if text[1:6].lower() == 'media':
+                counts['css_media_queries'] += 1
+        else:
+            counts['css_selectors'] += 1
+            found['css_classes'].update(_CSS_CLASS.findall(text))
+            found['css_ids'].update(_CSS_ID.findall(text))
+    elif _CSS_PROPERTY.match(text):
+        counts['css_properties'] += 1
+
+
+LANGUAGE_RULES = {
+    'css': LanguageRules(
+        _either(
+            _rule('css_comments', r'/\*.*?\*/'),
+            _rule('_open', r'/\*.*'),
+            # Text up to the next brace or semicolon, stopping early at a comment
+            r'(?:[^{};/"\']|/(?!\*)|' + _QUOTED + r'|["\'])*' + _either(
+                _rule('_segment', r'(?:[{};]|(?=/\*))'),
+                _rule('_open_segment', r'\Z'),
+            ),
+        ),
+        ['css_selectors', 'css_properties', 'css_comments', 'css_media_queries'],
+        unique=['css_classes', 'css_ids'],
+        # The text after the last brace or semicolon of a file is a segment
+        handlers={'_segment': _css_segment, '_open_segment': _css_segment}),
+    'javascript': LanguageRules(
+        _either(
+            '/' + _either(
+                _rule('js_comments_multi', r'\*.*?\*/'),
+                _rule('js_comments_single', r'/[^\n]*'),
+                _rule('_open', r'\*.*'),
+            ),
+            _rule('js_template_literals', r'`(?:[^`\\]|\\.)*`'),
+            _rule('_open_template', r'`.*'),
+            _rule('_string', f'(?:{_QUOTED})'),
+            r'\b' + _either(
+                _rule('js_functions', r'function\s+\w+\s*\('),
+                _rule('js_var_declarations', r'var\s+\w+'),
+                _rule('js_let_declarations', r'let\s+\w+'),
+                _rule('js_const_declarations', r'const\s+\w+'),
+            ),
+            _rule('js_arrow_functions', '=>'),
+        ),
+        ['js_functions', 'js_arrow_functions', 'js_var_declarations', 'js_let_declarations',
+         'js_const_declarations', 'js_comments_single', 'js_comments_multi',
+         'js_template_literals']),
+    # Elements only: closing tags, declarations and processing instructions
+    # are skipped. XmlAccumulator counts with these past the first
+    # well-formedness error.
+    'xml': LanguageRules(
+        '<' + _either(
+            _rule('xml_comments', r'!--.*?-->'),
+            _rule('_cdata', r'!\[CDATA\[.*?\]\]>'),
+            _rule('_open', r'(?:!--|!\[CDATA\[).*'),
+            r'(?![/?!])' + _either(
+                _rule('xml_self_closing', r'[^<>]*/>'),
+                _rule('xml_tags', r'[^<>]+>'),
+                _rule('_open_tag', r'[^<>]*\Z'),
+            ),
+        ),
+        ['xml_tags', 'xml_self_closing', 'xml_comments'],
+        totals={'xml_tags': ['xml_self_closing']}),
+}
+
+
+class RulesAccumulator:
+    # LANGUAGE_RULES run on line-aligned blocks, carried back to the start
+    # of a construct still open at the cut, so only constructs that span
+    # more than MAX_CARRY characters can be counted differently.
+    def __init__(self, language):
+        self.language = language
+        self.carry = ''
+        self.counts = Counter()
+        self.found = {name: set() for name in LANGUAGE_RULES[language].unique}
+    
+    def feed(self, text):
+        text = self.carry + text
+        cut = text.rfind('\n') + 1
+        if not cut and len(text) > MAX_CARRY:
+            cut = len(text)
+        self.carry = text[cut:]
+        start = self._scan(text[:cut], final=False)
+        if start is not None:
+            if len(text) - start <= MAX_CARRY:
+                self.carry = text[start:]
+            else:
+                # Too long to wait for its end
+                self._scan(text[start:cut])
+    
+    def _scan(self, block, final=True):
+        if block:
+            return LANGUAGE_RULES[self.language].scan(block, self.counts, self.found, final)
+        return None
+    
+    def finish(self, stats):
+        self._scan(self.carry)
+        self.carry = ''
+        LANGUAGE_RULES[self.language].report(self.counts, stats)
+        for key, found in self.found.items():
+            stats[key] = len(found)
+
+
+# Python metrics from a single tokenize pass
+#
+# A small state machine over the token stream counts every Python metric,
+# so strings, comments and identifiers are never mistaken for each other.
+# Blocks are tokenized up to the last statement that starts in column 0;
+# the rest is carried into the next block, where tokenizing restarts
+# cleanly. Only code with no such statement for MAX_CARRY characters is
+# cut elsewhere.
+
+# A line that may start a new top-level statement
+_PY_COLUMN_0 = re.compile(r'\n[^\s#]')
+_PY_TODO = re.compile(r'#\s*(TODO|FIXME|NOTE|HACK|XXX)', re.IGNORECASE)
+_PY_HEADERS = {'if', 'elif', 'else', 'for', 'while', 'with', 'try', 'except', 'finally',
+               'def', 'class', 'match', 'case'}
+_PY_LAYOUT = {tokenize.NL, tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT,
+              tokenize.COMMENT, tokenize.ENDMARKER}
+_STRING_PREFIX = 'rRbBuUfF'
+# Python 3.12+ splits f-strings into several tokens
+_FSTRING_START = getattr(tokenize, 'FSTRING_START', None)
+_FSTRING_END = getattr(tokenize, 'FSTRING_END', None)
+# Lower edges of the string literal length histogram buckets
+STRING_LENGTH_BOUNDS = (0, 1, 5, 10, 20, 50, 100, 200, 500, 1000, 10000)
+
+
+class _Bracket:
+    def __init__(self, char, params=False):
+        self.char = char
+        self.params = params
+        self.lambdas = 0
+        self.has_colon = False
+        self.comprehension = False
+
+
+class PythonAccumulator:
+    def __init__(self):
+        self.counts = Counter()
+        self.string_lengths = Distribution(STRING_LENGTH_BOUNDS)
+        self.carry = ''
+        self.expect_doc = True
+        self.doc_candidate = False
+        self.fstring_depth = 0
+        self.fstring_start = None
+        self._new_statement()
+    
+    def _new_statement(self):
+        self.stack = [_Bracket('')]
+        self.at_start = True
+        self.first = None
+        self.position = 0
+        self.header = None
+        self.colon_seen = False
+    
+    def feed(self, text):
+        start = max(len(self.carry) - 1, 0)
+        text = self.carry + text
+        cut = text.rfind('\n') + 1
+        if not cut and len(text) > MAX_CARRY:
+            cut = len(text)
+        # Nothing new can be counted until another top-level line is complete
+        if len(text) <= MAX_CARRY and not _PY_COLUMN_0.search(text, start, cut):
+            self.carry = text
+            return
+        self.carry = text[cut:]
+        if cut:
+            rest = self._tokenize(text[:cut], final=False)
+            if len(rest) > MAX_CARRY:
+                rest = self._tokenize(rest, final=True)
+            self.carry = rest + self.carry
+    
+    def _tokenize(self, source, final):
+        # Counts the tokens of `source` and returns the lines still to be
+        # tokenized. When final everything is counted, and a line that does
+        # not tokenize ends the statement it is in.
+        lines = io.StringIO(source).readlines()
+        offset = 0
+        while offset < len(lines):
+            tokens = []
+            safe = 0
+            starts_line = True
+            try:
+                for tok in tokenize.generate_tokens(partial(next, iter(lines[offset:]), '')):
+                    if starts_line and not tok.start[1] and tok.type not in _PY_LAYOUT and tokens:
+                        self._count(tokens, lines, offset)
+                        tokens = []
+                        safe = tok.start[0] - 1
+                    if tok.type not in (tokenize.NL, tokenize.COMMENT):
+                        starts_line = tok.type in (tokenize.NEWLINE, tokenize.DEDENT)
+                    tokens.append(tok)
+            except (tokenize.TokenError, SyntaxError) as e:
+                if not final:
+                    return ''.join(lines[safe:])
+                self._count(tokens, lines, offset)
+                self._new_statement()
+                row = e.args[1][0] if isinstance(e, tokenize.TokenError) else e.lineno
+                offset += max(row or len(lines), 1)
+                continue
+            if not final:
+                return ''.join(lines[safe:])
+            self._count(tokens, lines, offset)
+            break
+        return ''
+    
+    def _count(self, tokens, lines, offset):
+        counts = self.counts
+        for tok in tokens:
+            kind, string = tok.type, tok.string
+            if self.fstring_depth:
+                # Replacement fields are part of the literal
+                if kind == _FSTRING_START:
+                    self.fstring_depth += 1
+                elif kind == _FSTRING_END:
+                    self.fstring_depth -= 1
+                    if not self.fstring_depth:
+                        (row, col), prefix = self.fstring_start
+                        if row == tok.end[0]:
+                            length = tok.end[1] - col
+                        else:
+                            length = (len(lines[offset + row - 1]) - col + tok.end[1]
+                                      + sum(len(line) for line in lines[offset + row:offset + tok.end[0] - 1]))
+                        self._add_string(length - prefix - len(string), True)
+                continue
+            
+            if kind == tokenize.COMMENT:
+                if not tok.line[:tok.start[1]].strip():
+                    counts['python_comments'] += 1
+                if _PY_TODO.match(string):
+                    counts['python_todos'] += 1
+                continue
+            if kind == tokenize.NEWLINE or (kind == tokenize.OP and string == ';' and len(self.stack) == 1):
+                if self.doc_candidate:
+                    counts['python_docstrings'] += 1
+                    self.doc_candidate = False
+                self._new_statement()
+                continue
+            if kind in _PY_LAYOUT:
+                continue
+            
+            # A lone string first in a module, class or function body
+            is_string = kind == tokenize.STRING
+            if is_string:
+                prefix = len(string) - len(string.lstrip(_STRING_PREFIX))
+                is_f = 'f' in string[:prefix].lower()
+            if self.doc_candidate and not (is_string and not is_f):
+                self.doc_candidate = False
+            if self.expect_doc:
+                self.expect_doc = False
+                self.doc_candidate = is_string and not is_f
+            
+            self.position += 1
+            if self.at_start:
+                self.at_start = False
+                self.first = string
+                if string == '@':
+                    counts['python_decorators'] += 1
+                elif string in ('import', 'from'):
+                    counts['python_imports'] += 1
+                elif string == 'async':
+                    self.at_start = True
+                elif kind == tokenize.NAME and string in _PY_HEADERS:
+                    self.header = string
+            
+            if kind == tokenize.NAME:
+                if string == 'def':
+                    counts['python_functions'] += 1
+                elif string == 'class':
+                    counts['python_classes'] += 1
+                elif string == 'try':
+                    counts['python_try_except'] += 1
+                elif string == 'lambda':
+                    self.stack[-1].lambdas += 1
+                elif string == 'for' and len(self.stack) > 1 and not self.stack[-1].comprehension:
+                    bracket = self.stack[-1]
+                    bracket.comprehension = True
+                    counts['python_comprehensions'] += 1
+                    if bracket.char == '[':
+                        counts['python_list_comp'] += 1
+            elif is_string:
+                body = string[prefix:]
+                quote = 3 if body[:3] in ('"""', "'''") else 1
+                self._add_string(len(body) - 2 * quote, is_f)
+            elif kind == _FSTRING_START:
+                self.fstring_depth = 1
+                self.fstring_start = (tok.start, len(string))
+            elif kind == tokenize.OP:
+                if string in '([{':
+                    # The parameter list of a def
+                    params = string == '(' and self.header == 'def' and len(self.stack) == 1
+                    self.stack.append(_Bracket(string, params))
+                elif string in ')]}':
+                    if len(self.stack) > 1:
+                        self.stack.pop()
+                elif string == ':':
+                    self._colon()
+                elif string == '->' and len(self.stack) == 1:
+                    counts['python_type_hints'] += 1
+    
+    def _colon(self):
+        bracket = self.stack[-1]
+        if bracket.lambdas:
+            bracket.lambdas -= 1
+        elif len(self.stack) > 1:
+            if bracket.params:
+                self.counts['python_type_hints'] += 1
+            elif bracket.char == '{':
+                bracket.has_colon = True
+        elif self.colon_seen:
+            return
+        elif self.header and not (self.header in ('match', 'case') and self.position == 2):
+            # The end of a compound statement header; a body may follow
+            header = self.header
+            self._new_statement()
+            self.expect_doc = header in ('def', 'class')
+        elif self.first.isidentifier() and not keyword.iskeyword(self.first):
+            # An annotated assignment
+            self.colon_seen = True
+            self.counts['python_type_hints'] += 1
+    
+    def _add_string(self, length, is_f):
+        self.counts['string_literals'] += 1
+        self.counts['string_length_sum'] += length
+        self.string_lengths.add(length)
+        if is_f:
+            self.counts['python_f_strings'] += 1
+    
+    def finish(self, stats):
+        self._tokenize(self.carry, final=True)
+        self.carry = ''
+        counts = self.counts
+        for key in ['python_comments', 'python_imports', 'python_functions', 'python_classes',
+                    'python_decorators', 'python_f_strings', 'python_list_comp',
+                    'python_comprehensions', 'python_try_except', 'python_docstrings',
+                    'python_type_hints', 'python_todos', 'string_literals']:
+            stats[key] = counts[key]
+        if counts['string_literals']:
+            stats['avg_string_length'] = counts['string_length_sum'] / counts['string_literals']
+        else:
+            stats['avg_string_length'] = 0
+        add_distribution(stats, 'string_length', self.string_lengths)
+
+
+# JSON and JSON Lines
+#
+# A token scanner with an explicit stack of open containers validates the
+# document and gathers every JSON metric in one pass over decoded blocks, so
+# neither file size nor nesting depth is bounded by memory or the recursion
+# limit. Only a token cut by a block boundary is carried over; a long string
+# is consumed piecewise. In JSON Lines every line is its own document and the
+# metrics cover the valid ones.
+
+# One match per token, with the comma before it and, for a plain string,
+# the colon after it when it is a key
+_JSON_TOKEN = re.compile(r'[ \t\r\n]*(,[ \t\r\n]*)?(?:'
+                         r'(?P<key>"[^"\\\x00-\x1f]*"[ \t\r\n]*:)'
+                         r'|(?P<string>"[^"\\\x00-\x1f]*")'
+                         r'|(?P<number>-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?'
+                         r'|NaN|-?Infinity)'
+                         r'|(?P<open>[{\[])|(?P<close>[}\]])'
+                         r'|(?P<boolean>true|false)|(?P<null>null)'
+                         r'|(?P<quote>")|(?P<colon>:))')
+_JSON_SPACE = re.compile(r'[ \t\r\n]*\Z')
+# What the end of a block cutting a number, literal or escape looks like
+_JSON_PARTIAL = re.compile(r'[ \t\r\n]*(?:,[ \t\r\n]*)?[-+.0-9eEtrufalsnNIiy]*\Z')
+_JSON_PARTIAL_ESCAPE = re.compile(r'\\(?:u[0-9a-fA-F]{0,3})?\Z')
+_JSON_STRING_BODY = re.compile(r'(?:[^"\\\x00-\x1f]+|\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4}))*')
+_JSON_ESCAPE = re.compile(r'\\(?:u....|.)')
+_JSON_VALUE_TYPES = ('object', 'array', 'string', 'number', 'boolean', 'null')
+_JSON_VALUE_KINDS = {'string', 'quote', 'number', 'open', 'boolean', 'null'}
+
+# What the scanner accepts next
+_VALUE, _KEY, _COLON, _COMMA, _DONE = range(5)
+
+
+class JsonAccumulator:
+    def __init__(self, lines=False):
+        self.lines = lines
+        self.carry = ''
+        self.records = 0
+        self.invalid = 0
+        self.totals = Counter()
+        self._new_record()
+    
+    def _new_record(self):
+        self.stack = []
+        self.expect = _VALUE
+        # The innermost container has no members yet, so it may close
+        self.empty = False
+        self.started = False
+        self.failed = False
+        # Decoded length so far of a string cut by a block, or -1 for a key
+        self.string = None
+        self.counts = Counter()
+    
+    def _end_record(self):
+        if self.started or self.failed:
+            self.records += 1
+            if self.failed or self.expect != _DONE or self.string is not None:
+                self.invalid += 1
+            else:
+                totals = self.totals
+                for key, count in self.counts.items():
+                    if key in ('json_depth', 'json_longest_string'):
+                        totals[key] = max(totals[key], count)
+                    else:
+                        totals[key] += count
+        self._new_record()
+    
+    def feed(self, text):
+        self.carry = self._scan(self.carry + text, final=False)
+    
+    def _scan(self, text, final):
+        # Consumes every complete token and returns the cut one, if any
+        pos = 0
+        end = len(text)
+        while pos < end:
+            stop = text.find('\n', pos) if self.lines else -1
+            if stop < 0:
+                stop = end
+            pos = self._segment(text, pos, stop, final or stop < end)
+            if pos < 0:
+                return text[-1 - pos:]
+            if stop < end:
+                self._end_record()
+                pos = stop + 1
+        return ''
+    
+    def _segment(self, text, pos, stop, final):
+        # Scans text[pos:stop] and returns stop, or -1 - the start of a
+        # token cut by the end of a block that is not final
+        while pos < stop:
+            if self.failed:
+                # The rest of a broken document or line is skipped
+                return stop
+            if self.string is not None:
+                pos = self._string(text, pos, stop, final)
+                if pos < 0:
+                    return pos
+                continue
+            pos = self._tokens(_JSON_TOKEN.finditer(text, pos, stop), pos,
+                               stop if final else stop - 3)
+            if pos < stop and not self.failed and self.string is None:
+                # Nothing matches here
+                if _JSON_SPACE.match(text, pos, stop):
+                    return stop
+                if not final and stop - pos <= MAX_CARRY and _JSON_PARTIAL.match(text, pos):
+                    return -1 - pos
+                self.failed = True
+        return stop
+    
+    def _tokens(self, tokens, pos, last):
+        # Applies consecutive tokens to the grammar state and returns where
+        # it stopped: after a mistake or the start of a string that is not
+        # plain, or before unmatched text or a number ending past `last`.
+        # The hot state lives in locals until then.
+        counts = self.counts
+        stack = self.stack
+        expect = self.expect
+        empty = self.empty
+        depth = counts['json_depth']
+        longest = counts['json_longest_string']
+        keys = elements = strings = 0
+        for token in tokens:
+            if token.start() != pos:
+                break
+            kind = token.lastgroup
+            if kind == 'number' and token.end() > last and _JSON_PARTIAL.match(token.string, pos):
+                break
+            pos = token.end()
+            self.started = True
+            if token.start(1) >= 0:
+                if expect != _COMMA:
+                    expect = None
+                    break
+                expect = _KEY if stack[-1] == '{' else _VALUE
+            
+            if expect == _KEY:
+                if kind == 'key':
+                    keys += 1
+                    expect = _VALUE
+                    empty = False
+                    continue
+                if kind == 'string' or kind == 'quote':
+                    keys += 1
+                    expect = _COLON
+                    empty = False
+                    if kind == 'quote':
+                        self.string = -1
+                        break
+                    continue
+            elif expect == _VALUE and kind in _JSON_VALUE_KINDS:
+                empty = False
+                if stack and stack[-1] == '[':
+                    elements += 1
+                if kind == 'open':
+                    if token.string[pos - 1] == '{':
+                        stack.append('{')
+                        counts['object'] += 1
+                        expect = _KEY
+                    else:
+                        stack.append('[')
+                        counts['array'] += 1
+                    empty = True
+                    continue
+                if len(stack) > depth:
+                    depth = len(stack)
+                expect = _COMMA if stack else _DONE
+                if kind == 'string':
+                    strings += 1
+                    length = pos - token.start(kind) - 2
+                    if length > longest:
+                        longest = length
+                elif kind == 'quote':
+                    strings += 1
+                    self.string = 0
+                    break
+                else:
+                    counts[kind] += 1
+                continue
+            
+            if kind == 'close' and (expect == _COMMA or empty):
+                if stack[-1] != ('{' if token.string[pos - 1] == '}' else '['):
+                    expect = None
+                    break
+                stack.pop()
+                if empty and len(stack) > depth:
+                    depth = len(stack)
+                empty = False
+                expect = _COMMA if stack else _DONE
+            elif kind == 'colon' and expect == _COLON:
+                expect = _VALUE
+            else:
+                expect = None
+                break
+        
+        counts['json_depth'] = depth
+        counts['json_longest_string'] = longest
+        counts['json_keys'] += keys
+        counts['json_array_elements'] += elements
+        counts['string'] += strings
+        if expect is None:
+            self.failed = True
+        else:
+            self.expect = expect
+        self.empty = empty
+        return pos
+    
+    def _string(self, text, pos, stop, final):
+        # Consumes string content from pos and returns the position after
+        # it, or -1 - the start of an escape cut by the end of the block
+        body = _JSON_STRING_BODY.match(text, pos, stop)
+        pos = body.end()
+        if self.string >= 0:
+            body = body.group()
+            if '\\' in body:
+                self.string += len(body) - sum(len(e) - 1 for e in _JSON_ESCAPE.findall(body))
+            else:
+                self.string += len(body)
+        if text.startswith('"', pos):
+            if self.string > self.counts['json_longest_string']:
+                self.counts['json_longest_string'] = self.string
+            self.string = None
+            return pos + 1
+        if not final and (pos == stop or _JSON_PARTIAL_ESCAPE.match(text, pos)):
+            return -1 - pos
+        self.failed = True
+        return pos
+    
+    def finish(self, stats):
+        self._scan(self.carry, final=True)
+        self.carry = ''
+        if not self.lines:
+            # A document holds exactly one value, so an empty one is invalid
+            self.started = True
+        self._end_record()
+        if self.lines:
+            stats['json_records'] = self.records
+            stats['json_invalid_records'] = self.invalid
+        elif self.invalid:
+            stats['json_valid'] = False
+            return
+        stats['json_valid'] = not self.invalid
+        for key in ('json_depth', 'json_keys', 'json_array_elements', 'json_longest_string'):
+            stats[key] = self.totals[key]
+        stats['json_arrays'] = self.totals['array']
+        stats['json_value_types'] = {kind: self.totals[kind] for kind in _JSON_VALUE_TYPES
+                                     if self.totals[kind]}
+
+
+# HTML and XML
+#
+# Both are parsed as event streams, so no document tree is built and memory
+# does not grow with the file. HtmlAccumulator is an html.parser.HTMLParser
+# that tracks the open elements the way browsers close them: void elements
+# never open, and elements whose end tag is optional are closed by their
+# successor or by their parent's end tag without counting as unclosed.
+# XmlAccumulator drives expat with handlers only. Expat stops at the first
+# well-formedness error; from there on the xml rules above count the rest.
+
+# Most common tags listed, from counters kept in fixed memory
+TOP_TAGS = 10
+TAG_COUNTERS = 256
+# Open elements tracked; past this the outermost are forgotten
+MAX_OPEN_ELEMENTS = 4096
+_HTML_NAMED_TAGS = {'div': 'html_div_tags', 'script': 'html_script_tags',
+                    'style': 'html_style_tags', 'img': 'html_img_tags', 'a': 'html_a_tags'}
+_HTML_VOID = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+              'param', 'source', 'track', 'wbr'}
+_HTML_OPTIONAL_END = {'html', 'head', 'body', 'p', 'li', 'dt', 'dd', 'option', 'optgroup',
+                      'tr', 'td', 'th', 'thead', 'tbody', 'tfoot', 'colgroup', 'caption',
+                      'rt', 'rp'}
+# Elements a start tag closes when one of them is the innermost open element
+_HTML_CLOSED_BY = {'li': {'li'}, 'dt': {'dt', 'dd'}, 'dd': {'dt', 'dd'}, 'tr': {'tr', 'td', 'th'},
+                   'td': {'td', 'th'}, 'th': {'td', 'th'}, 'option': {'option'},
+                   'thead': {'tbody', 'tfoot'}, 'tbody': {'thead', 'tbody'},
+                   'tfoot': {'thead', 'tbody'}}
+# Start tags that close an open paragraph
+_HTML_CLOSES_P = {'address', 'article', 'aside', 'blockquote', 'div', 'dl', 'fieldset', 'figure',
+                  'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'main',
+                  'nav', 'ol', 'p', 'pre', 'section', 'table', 'ul'}
+
+
+def _top_tags(counters, stats, key):
+    stats[key] = counters.most_common(TOP_TAGS)
+    if counters.error:
+        stats.setdefault('approximate', []).append(key)
+
+
+class HtmlAccumulator(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.counts = Counter()
+        self.open = []
+        # Outermost open elements dropped from self.open
+        self.forgotten = 0
+        self.block_tags = Counter()
+        self.tags = MisraGries(TAG_COUNTERS)
+        # Set once html.parser gave up on some markup
+        self.malformed = False
+        # How far into rawdata the parser got
+        self.position = 0
+    
+    def feed(self, text):
+        self._parse(super().feed, text)
+        self.tags.update(self.block_tags)
+        self.block_tags.clear()
+        if len(self.rawdata) > MAX_CARRY:
+            # A tag, comment or script that never ends: keep only what may
+            # start the end tag of a script or style
+            tail = len(self.cdata_elem) + 2 if self.cdata_elem else 0
+            self.rawdata = self.rawdata[-tail:] if tail else ''
+    
+    def _parse(self, parse, *args):
+        # html.parser stops on some malformed declarations (such as '<![ b')
+        # with an AssertionError; the '<' it stopped at is then taken as text
+        # and parsing goes on after it
+        while True:
+            self.position = 0
+            try:
+                parse(*args)
+                return
+            except AssertionError:
+                self.malformed = True
+                # The declaration scanner may have moved past its start
+                index = self.rawdata.rfind('<', 0, self.position + 1)
+                if index < 0:
+                    index = self.position
+                self.rawdata = self.rawdata[index + 1:]
+                if args:
+                    args = ('',)
+    
+    def updatepos(self, i, j):
+        # Line and column positions are never read, so are not tracked
+        self.position = j
+        return j
+    
+    def _start(self, tag, attrs):
+        counts = self.counts
+        counts['html_tags'] += 1
+        counts['html_attributes'] += len(attrs)
+        if tag in _HTML_NAMED_TAGS:
+            counts[_HTML_NAMED_TAGS[tag]] += 1
+        self.block_tags[tag] += 1
+        if self.open:
+            innermost = self.open[-1]
+            if (innermost in _HTML_CLOSED_BY.get(tag, ())
+                    or innermost == 'p' and tag in _HTML_CLOSES_P):
+                self.open.pop()
+    
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs)
+        if tag in _HTML_VOID:
+            self._reach(len(self.open) + 1)
+            return
+        self.open.append(tag)
+        self._reach(len(self.open))
+        if len(self.open) > MAX_OPEN_ELEMENTS:
+            del self.open[0]
+            self.forgotten += 1
+    
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs)
+        self.counts['html_self_closing'] += 1
+        self._reach(len(self.open) + 1)
+    
+    def _reach(self, depth):
+        depth += self.forgotten
+        if depth > self.counts['html_depth']:
+            self.counts['html_depth'] = depth
+    
+    def handle_endtag(self, tag):
+        self.counts['html_tags'] += 1
+        open_elements = self.open
+        for index in range(len(open_elements) - 1, -1, -1):
+            if open_elements[index] == tag:
+                self._unclosed(open_elements[index + 1:])
+                del open_elements[index:]
+                return
+        if tag not in _HTML_VOID and tag not in _HTML_OPTIONAL_END:
+            self.counts['html_stray_end_tags'] += 1
+    
+    def _unclosed(self, elements):
+        self.counts['html_unclosed_tags'] += sum(tag not in _HTML_OPTIONAL_END
+                                                 for tag in elements)
+    
+    def handle_comment(self, data):
+        self.counts['html_comments'] += 1
+    
+    def finish(self, stats):
+        self._parse(self.close)
+        self.tags.update(self.block_tags)
+        self._unclosed(self.open)
+        counts = self.counts
+        for key in ['html_tags', 'html_comments', *_HTML_NAMED_TAGS.values(), 'html_attributes',
+                    'html_self_closing', 'html_depth', 'html_unclosed_tags',
+                    'html_stray_end_tags']:
+            stats[key] = counts[key]
+        stats['html_well_formed'] = not (self.malformed or counts['html_unclosed_tags']
+                                         or counts['html_stray_end_tags'])
+        _top_tags(self.tags, stats, 'html_tag_counts')
+
+
+# A start tag ending in '/>', for telling <a/> from <a></a>
+_XML_EMPTY_TAG = re.compile(rb'<[^\s/>]+(?:\s+[^\s=]+\s*=\s*(?:"[^"]*"|\'[^\']*\'))*\s*/>\Z')
+# Bytes kept behind the parser, for looking back at tags cut by a block boundary
+XML_TAG_WINDOW = 4096
+
+
+class XmlAccumulator:
+    # Expat parsers cannot be copied or pickled, as tail states are, so a
+    # copy gets a new parser primed with the prolog and the open elements,
+    # then fed the bytes the old one had not consumed yet
+    def __init__(self):
+        self.elements = 0
+        self.self_closing = 0
+        self.comments = 0
+        self.attributes = 0
+        self.depth = 0
+        # Names of the open elements
+        self.open = []
+        self.cdata = False
+        # Everything before the root element, with the declarations that
+        # decide which entity references are errors
+        self.prolog = None
+        self.block_tags = Counter()
+        self.tags = MisraGries(TAG_COUNTERS)
+        # Bytes parsed so far and consumed by expat; recent bytes from the
+        # byte index window_start on, for looking back at tags
+        self.parsed = 0
+        self.consumed = 0
+        # Lines before the byte index `consumed`, and its column
+        self.lines = 0
+        self.column = 0
+        self.window = b''
+        self.window_start = 0
+        # Byte index of a start tag not yet followed by any other event
+        self.last_start = -1
+        self.error = None
+        # The xml rules, once expat has stopped
+        self.rest = None
+        self._new_parser(b'')
+    
+    def _new_parser(self, prefix):
+        # Blocks arrive decoded, so expat is told they are UTF-8 whatever
+        # the declaration says. After the prefix, the parser's byte indexes
+        # are `shift` behind the file's and its line numbers `line_shift`.
+        parser = self.parser = expat.ParserCreate('utf-8')
+        parser.ordered_attributes = True
+        parser.Parse(prefix, False)
+        self.shift = self.consumed - len(prefix)
+        self.prefix_lines = prefix.count(b'\n')
+        self.line_shift = self.lines - self.prefix_lines
+        self.column_shift = len(prefix) - prefix.rfind(b'\n') - 1 - self.column
+        parser.StartElementHandler = self._start
+        parser.EndElementHandler = self._end
+        parser.CommentHandler = self._comment
+        parser.StartCdataSectionHandler = self._start_cdata
+        parser.EndCdataSectionHandler = self._end_cdata
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['parser']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.parser = None
+        if self.rest is not None:
+            return
+        if self.prolog is None:
+            # The window starts at the file's start until the root element
+            prefix = self.window[:self.consumed]
+        elif self.open:
+            prefix = self.prolog + ''.join(f'<{name}>' for name in self.open).encode('utf-8')
+            if self.cdata:
+                prefix += b'<![CDATA['
+        else:
+            # Past the root element
+            prefix = self.prolog + b'<_/>'
+        self._new_parser(prefix)
+        self._parse(self.window[self.consumed - self.window_start:])
+    
+    def feed(self, text):
+        if self.rest is not None:
+            self.rest.feed(text)
+            return
+        data = text.encode('utf-8', 'surrogatepass')
+        self.window += data
+        self.parsed += len(data)
+        self._parse(data)
+        self.tags.update(self.block_tags)
+        self.block_tags.clear()
+    
+    def _parse(self, data):
+        try:
+            self.parser.Parse(data, False)
+        except expat.ExpatError as e:
+            self._stop(e)
+            return
+        # Expat keeps a token cut by the block's end for the next block
+        consumed = self.parser.CurrentByteIndex + self.shift
+        start, end = self.consumed - self.window_start, consumed - self.window_start
+        newlines = self.window.count(b'\n', start, end)
+        if newlines:
+            self.lines += newlines
+            self.column = end - self.window.rfind(b'\n', start, end) - 1
+        else:
+            self.column += end - start
+        self.consumed = consumed
+        keep = min(self.consumed, self.parsed - XML_TAG_WINDOW)
+        if keep > self.window_start and self.prolog is not None:
+            self.window = self.window[keep - self.window_start:]
+            self.window_start = keep
+    
+    def _error(self, error):
+        line, column = error.lineno, error.offset
+        if line == self.prefix_lines + 1:
+            column -= self.column_shift
+        self.error = (f"{expat.ErrorString(error.code)}: "
+                      f"line {line + self.line_shift}, column {column}")
+    
+    def _stop(self, error):
+        # The window holds everything from the last token expat consumed
+        self._error(error)
+        offset = max(self.parser.ErrorByteIndex + self.shift - self.window_start, 0)
+        self.rest = RulesAccumulator('xml')
+        self.rest.feed(self.window[offset:].decode('utf-8', 'ignore'))
+        self.window = b''
+    
+    def _start(self, name, attributes):
+        # Called for every element, so counts are plain attributes
+        self.elements += 1
+        # Names and values, alternately
+        self.attributes += len(attributes)
+        self.block_tags[name] += 1
+        open_elements = self.open
+        open_elements.append(name)
+        if len(open_elements) > self.depth:
+            self.depth = len(open_elements)
+        self.last_start = self.parser.CurrentByteIndex + self.shift
+        if self.prolog is None:
+            self.prolog = self.window[:self.last_start]
+    
+    def _end(self, name):
+        self.open.pop()
+        # Expat reports <a/> and <a></a> alike; an empty-element tag ends
+        # where its end event is reported, with nothing in between
+        start = self.last_start - self.window_start
+        if self.last_start >= 0 and start >= 0:
+            end = self.parser.CurrentByteIndex + self.shift - self.window_start
+            if _XML_EMPTY_TAG.match(self.window, start, end):
+                self.self_closing += 1
+        self.last_start = -1
+    
+    def _comment(self, data):
+        self.comments += 1
+        self.last_start = -1
+    
+    def _start_cdata(self):
+        self.cdata = True
+        self.last_start = -1
+    
+    def _end_cdata(self):
+        self.cdata = False
+    
+    def finish(self, stats):
+        if self.rest is None:
+            try:
+                self.parser.Parse(b'', True)
+            except expat.ExpatError as e:
+                self._error(e)
+        self.tags.update(self.block_tags)
+        stats['xml_tags'] = self.elements
+        stats['xml_self_closing'] = self.self_closing
+        stats['xml_comments'] = self.comments
+        if self.rest is not None:
+            rest = {}
+            self.rest.finish(rest)
+            for key in ('xml_tags', 'xml_self_closing', 'xml_comments'):
+                stats[key] += rest[key]
+        stats['xml_attributes'] = self.attributes // 2
+        stats['xml_depth'] = self.depth
+        stats['xml_well_formed'] = self.error is None
+        if self.error is not None:
+            stats['xml_error'] = self.error
+        _top_tags(self.tags, stats, 'xml_tag_counts')
@@ -0,0 +1,120 @@
+import cProfile
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Instrumentation
+#
+# StageTimings adds up wall time, CPU time and bytes for each stage of an
+# analysis: reading and decoding, word splitting, every metric group, and
+# whatever the caller times around it (the line index and rendering in the
+# GUI). The peak allocation of each stage is only known while tracemalloc is
+# tracing, which slows the run down several times, so it is recorded when
+# someone else (profiled() or python -X tracemalloc) has turned tracing on.
+#
+# profiled() wraps a run in cProfile or tracemalloc and dumps the results
+# to a file when it ends.
+
+PROFILERS = ('cprofile', 'tracemalloc')
+# "profiler" or "profiler:output path", for profiling the GUI
+PROFILE_ENV = 'FILE_STATS_PROFILE'
+# Allocation sites written by the tracemalloc profiler
+TRACEMALLOC_TOP = 50
+TRACEMALLOC_FRAMES = 10
+
+
+class StageTimings:
+    def __init__(self):
+        # stage: [wall seconds, CPU seconds, bytes or None, peak bytes or None]
+        self.stages = {}
+        self.trace_memory = tracemalloc.is_tracing() and hasattr(tracemalloc, 'reset_peak')
+
+    def start(self):
+        current = None
+        if self.trace_memory:
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        return time.perf_counter(), time.process_time(), current
+
+    def stop(self, stage, started, nbytes=None):
+        wall = time.perf_counter() - started[0]
+        cpu = time.process_time() - started[1]
+        entry = self.stages.get(stage)
+        if entry is None:
+            entry = self.stages[stage] = [0.0, 0.0, None, None]
+        entry[0] += wall
+        entry[1] += cpu
+        if nbytes is not None:
+            entry[2] = (entry[2] or 0) + nbytes
+        if started[2] is not None:
+            peak = tracemalloc.get_traced_memory()[1] - started[2]
+            entry[3] = max(entry[3] or 0, peak)
+
+    def run(self, stage, function, *args):
+        started = self.start()
+        result = function(*args)
+        self.stop(stage, started)
+        return result
+
+    def result(self, nbytes=None):
+        # Stages that did not count their own bytes went over all `nbytes`
+        # of the input, by default as many as the 'read' stage counted
+        if nbytes is None and 'read' in self.stages:
+            nbytes = self.stages['read'][2]
+        return {stage: {'wall_seconds': wall, 'cpu_seconds': cpu,
+                        'bytes': nbytes if own is None else own, 'peak_alloc_bytes': peak}
+                for stage, (wall, cpu, own, peak) in self.stages.items()}
+
+
+def add_stage(performance, stage, started, nbytes=None):
+    # Adds a stage timed with StageTimings().start() to a finished result
+    timings = StageTimings()
+    timings.stop(stage, started, nbytes)
+    performance.update(timings.result(None))
+
+
+def default_profile_output(profiler):
+    return 'file-stats.prof' if profiler == 'cprofile' else 'file-stats-tracemalloc.txt'
+
+
+def profile_from_env():
+    # (profiler, output) from PROFILE_ENV, or None when it is not set
+    value = os.environ.get(PROFILE_ENV)
+    if not value:
+        return None
+    profiler, _, output = value.partition(':')
+    if profiler not in PROFILERS:
+        raise ValueError(f"{PROFILE_ENV} must start with one of {', '.join(PROFILERS)}")
+    return profiler, output or default_profile_output(profiler)
+
+
+@contextmanager
+def profiled(profiler, output=None):
+    # cProfile writes pstats data (python -m pstats FILE); tracemalloc
+    # writes the allocation sites still holding the most memory at the end
+    if profiler not in PROFILERS:
+        raise ValueError(f"profiler must be one of {', '.join(PROFILERS)}")
+    output = output or default_profile_output(profiler)
+    if profiler == 'cprofile':
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(output)
+        return
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        if not tracing:
+            tracemalloc.stop()
+        with open(output, 'w', encoding='utf-8') as f:
+            for statistic in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+                f.write(f"{statistic}\n")
@@ -0,0 +1,107 @@
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+
+# Readability engine
+#
+# One pass over the words gives the totals every formula needs: words,
+# syllables and polysyllabic words (three syllables or more). Syllables are
+# counted once per distinct lowercased word, through a bounded memo, and
+# sentences are counted from the text without building a list of them.
+
+# Distinct words whose syllable counts are remembered
+SYLLABLE_CACHE_SIZE = 1 << 16
+
+_VOWEL_GROUPS = re.compile('[aeiouy]+')
+_TERMINATOR = re.compile(r'[.!?]')
+# Text up to the next terminator with something other than whitespace in it
+_SENTENCE = re.compile(r'[^.!?\s][^.!?]*')
+
+
+@lru_cache(maxsize=SYLLABLE_CACHE_SIZE)
+def _syllables(word):
+    # Vowel groups of a lowercased word, less a silent final 'e', at least one
+    count = len(_VOWEL_GROUPS.findall(word))
+    if word.endswith('e'):
+        count -= 1
+    return count if count > 0 else 1
+
+
+def count_syllables(word):
+    return _syllables(word.lower())
+
+
+class ReadabilityAccumulator:
+    def __init__(self):
+        self.sentences = 0
+        self.open_sentence = False
+        self.words = 0
+        self.syllables = 0
+        self.polysyllables = 0
+    
+    def feed(self, text):
+        first = _TERMINATOR.search(text)
+        if first is None:
+            self.open_sentence = self.open_sentence or bool(text) and not text.isspace()
+            return
+        last = max(text.rfind('.'), text.rfind('!'), text.rfind('?'))
+        head = text[:first.start()]
+        tail = text[last + 1:]
+        head_open = bool(head) and not head.isspace()
+        tail_open = bool(tail) and not tail.isspace()
+        
+        # Every stretch between terminators that is not blank is a sentence;
+        # the one before the first terminator also ends a sentence left open
+        # by the previous block, and the one after the last may continue.
+        stretches = _SENTENCE.subn('', text)[1]
+        self.sentences += stretches - tail_open
+        if self.open_sentence and not head_open:
+            self.sentences += 1
+        self.open_sentence = tail_open
+    
+    def add_words(self, words):
+        self.words += len(words)
+        for word, n in Counter(map(str.lower, words)).items():
+            count = _syllables(word)
+            self.syllables += n * count
+            if count >= 3:
+                self.polysyllables += n
+    
+    def result(self):
+        sentences = self.sentences + (1 if self.open_sentence else 0)
+        if not self.words or not sentences:
+            return None
+        
+        avg_sentence_length = self.words / sentences
+        avg_syllables_per_word = self.syllables / self.words
+        polysyllable_ratio = self.polysyllables / self.words
+        
+        flesch_score = 206.835 - 1.015 * avg_sentence_length - 84.6 * avg_syllables_per_word
+        flesch_kincaid = 0.39 * avg_sentence_length + 11.8 * avg_syllables_per_word - 15.59
+        # Gunning Fog counts every polysyllabic word as complex
+        gunning_fog = 0.4 * (avg_sentence_length + 100 * polysyllable_ratio)
+        smog = 1.0430 * math.sqrt(self.polysyllables * 30 / sentences) + 3.1291
+        
+        return {
+            'flesch_score': flesch_score,
+            'flesch_kincaid_grade': flesch_kincaid,
+            'gunning_fog': gunning_fog,
+            'smog_index': smog,
+            'sentences': sentences,
+            'polysyllabic_words': self.polysyllables,
+            'avg_sentence_length': avg_sentence_length,
+            'avg_syllables_per_word': avg_syllables_per_word
+        }
+    
+    def finish(self, stats):
+        readability = self.result()
+        if readability:
+            stats.update(readability)
+
+
+def calculate_readability(content):
+    readability = ReadabilityAccumulator()
+    readability.feed(content)
+    readability.add_words(content.split())
+    return readability.result()
@@ -0,0 +1,364 @@
+import math
+import random
+from bisect import bisect_right
+from collections import Counter
+from heapq import nlargest
+from itertools import accumulate
+from zlib import adler32, crc32
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Bounded-memory sketches
+#
+# HyperLogLog estimates how many distinct words a file has, Misra-Gries
+# keeps its most frequent words and characters, and KLL the quantiles of its
+# line and word lengths, each in a fixed amount of memory. All are plain
+# picklable objects and merge with another sketch of the same size, so
+# blocks, tail runs and separate files can be combined.
+
+APPROXIMATE_MODES = ('auto', 'always', 'never')
+DEFAULT_ERROR = 0.01
+DEFAULT_COUNTERS = 1024
+# Distinct words counted exactly before 'auto' switches to sketches
+DEFAULT_EXACT_LIMIT = 1_000_000
+# Distinct values a Distribution counts exactly before 'auto' switches to KLL
+DISTRIBUTION_EXACT_LIMIT = 4096
+# KLL compactor size: ranks are off by well under 1% of the count
+DEFAULT_KLL_K = 400
+PERCENTILES = (50, 90, 99)
+
+_MASK64 = (1 << 64) - 1
+
+
+class SketchOptions:
+    def __init__(self, mode='auto', error=DEFAULT_ERROR, counters=DEFAULT_COUNTERS,
+                 exact_limit=DEFAULT_EXACT_LIMIT):
+        if mode not in APPROXIMATE_MODES:
+            raise ValueError(f"approximate mode must be one of {', '.join(APPROXIMATE_MODES)}")
+        if not 0 < error < 1:
+            raise ValueError("sketch error must be between 0 and 1")
+        if counters < 10:
+            raise ValueError("at least 10 heavy-hitter counters are needed")
+        self.mode = mode
+        self.error = error
+        self.counters = counters
+        self.exact_limit = exact_limit
+
+    def sketch_now(self, distinct):
+        # Whether a table with this many distinct entries should be sketched
+        return self.mode == 'always' or (self.mode == 'auto' and distinct > self.exact_limit)
+
+    def __eq__(self, other):
+        return isinstance(other, SketchOptions) and vars(self) == vars(other)
+
+    def __repr__(self):
+        return (f"SketchOptions({self.mode!r}, error={self.error}, counters={self.counters}, "
+                f"exact_limit={self.exact_limit})")
+
+
+def _fmix64(h):
+    # MurmurHash3 finalizer: spreads every input bit over the whole word
+    h ^= h >> 33
+    h = (h * 0xff51afd7ed558ccd) & _MASK64
+    h ^= h >> 33
+    h = (h * 0xc4ceb9fe1a85ec53) & _MASK64
+    h ^= h >> 33
+    return h
+
+
+def _encode(words):
+    try:
+        return list(map(str.encode, words))
+    except UnicodeEncodeError:
+        return [w.encode('utf-8', 'surrogatepass') for w in words]
+
+
+def hash64(word):
+    # Two independent 32-bit checksums are cheap C calls and, mixed, make a
+    # stable 64-bit hash (unlike hash(), which changes between processes)
+    data = _encode([word])[0]
+    return _fmix64(crc32(data) << 32 | adler32(data))
+
+
+class HyperLogLog:
+    # Relative standard error is about 1.04 / sqrt(2 ** precision); the
+    # precision is the smallest one meeting `error`, within 4..18 (256 KB)
+    def __init__(self, error=DEFAULT_ERROR):
+        precision = math.ceil(math.log2((1.04 / error) ** 2))
+        self.precision = min(max(precision, 4), 18)
+        self.registers = bytearray(1 << self.precision)
+
+    def update(self, words):
+        words = set(words)
+        if not words:
+            return
+        data = _encode(words)
+        q = 64 - self.precision
+        if np is not None:
+            # hash64 of every word at once
+            h = np.array(list(map(crc32, data)), dtype=np.uint64) << np.uint64(32)
+            h |= np.array(list(map(adler32, data)), dtype=np.uint64)
+            shift = np.uint64(33)
+            h ^= h >> shift
+            h *= np.uint64(0xff51afd7ed558ccd)
+            h ^= h >> shift
+            h *= np.uint64(0xc4ceb9fe1a85ec53)
+            h ^= h >> shift
+            index = (h >> np.uint64(q)).astype(np.intp)
+            rest = h & np.uint64((1 << q) - 1)
+            # bit_length of each 64-bit word, exact, from its 32-bit halves
+            high = np.frexp((rest >> np.uint64(32)).astype(np.float64))[1]
+            low = np.frexp((rest & np.uint64(0xffffffff)).astype(np.float64))[1]
+            ranks = (q + 1 - np.where(high > 0, high + 32, low)).astype(np.uint8)
+            np.maximum.at(np.frombuffer(self.registers, dtype=np.uint8), index, ranks)
+            return
+        registers = self.registers
+        mask = (1 << q) - 1
+        for b in data:
+            h = _fmix64(crc32(b) << 32 | adler32(b))
+            rank = q + 1 - (h & mask).bit_length()
+            if rank > registers[h >> q]:
+                registers[h >> q] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("cannot merge HyperLogLog sketches of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        # Ertl's improved raw estimator, which needs no bias tables and is
+        # accurate from empty up to 2 ** 64 distinct values
+        m = len(self.registers)
+        q = 64 - self.precision
+        histogram = [0] * (q + 2)
+        for rank, n in Counter(self.registers).items():
+            histogram[rank] = n
+        if histogram[0] == m:
+            return 0
+
+        z = m * _tau(1 - histogram[q + 1] / m)
+        for k in range(q, 0, -1):
+            z = 0.5 * (z + histogram[k])
+        z += m * _sigma(histogram[0] / m)
+        return round(m * m / (2 * math.log(2) * z))
+
+
+def _sigma(x):
+    y = 1
+    z = x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x):
+    if x == 0 or x == 1:
+        return 0
+    y = 1
+    z = 1 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+class MisraGries:
+    # Heavy hitters in at most `capacity` counters. Each count is low by at
+    # most `error`, the total subtracted by pruning, which never exceeds
+    # n / (capacity + 1) after n items; items more frequent than that are
+    # never lost.
+    def __init__(self, capacity=DEFAULT_COUNTERS):
+        self.capacity = capacity
+        self.counts = Counter()
+        self.error = 0
+
+    def update(self, items):
+        # An iterable of items or a mapping of item counts, as Counter takes
+        self.counts.update(items)
+        if len(self.counts) > self.capacity:
+            self._prune()
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.error += other.error
+        if len(self.counts) > self.capacity:
+            self._prune()
+
+    def _prune(self):
+        # Subtract the (capacity + 1)-th largest count from every counter at
+        # once and drop those left at zero
+        cut = nlargest(self.capacity + 1, self.counts.values())[-1]
+        self.counts = Counter({item: n - cut for item, n in self.counts.items() if n > cut})
+        self.error += cut
+
+    def most_common(self, n=None):
+        return self.counts.most_common(n)
+
+
+class KLL:
+    # Karnin, Lang and Liberty's quantile sketch. Level h holds items that
+    # each stand for 2 ** h values; a level over its capacity is sorted and
+    # every other item, from a random start, moves up a level. The total
+    # weight stays exact and about 3 * k items are kept.
+    def __init__(self, k=DEFAULT_KLL_K, seed=0):
+        self.k = k
+        self.levels = [[]]
+        self.rng = random.Random(seed)
+
+    def update_counts(self, counts):
+        # A mapping of value counts; each count goes in as its binary digits
+        for value, n in counts.items():
+            h = 0
+            while n:
+                if n & 1:
+                    if h >= len(self.levels):
+                        self.levels.extend([] for _ in range(h + 1 - len(self.levels)))
+                    self.levels[h].append(value)
+                n >>= 1
+                h += 1
+        self._compress()
+
+    def merge(self, other):
+        if other.k != self.k:
+            raise ValueError("cannot merge KLL sketches of different sizes")
+        for h, level in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append([])
+            self.levels[h].extend(level)
+        self._compress()
+
+    def _capacity(self, h):
+        return max(2, math.ceil(self.k * (2 / 3) ** (len(self.levels) - 1 - h)))
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append([])
+                level.sort()
+                # An odd item out stays behind, so no weight is lost
+                keep = [level.pop()] if len(level) % 2 else []
+                self.levels[h + 1].extend(level[self.rng.getrandbits(1)::2])
+                self.levels[h] = keep
+            h += 1
+
+    def items(self):
+        # (value, weight) pairs in value order
+        return sorted((value, 1 << h) for h, level in enumerate(self.levels) for value in level)
+
+
+class Distribution:
+    # Percentiles and a fixed-bucket histogram of non-negative integers such
+    # as line or word lengths. Values are counted exactly until more than
+    # DISTRIBUTION_EXACT_LIMIT distinct ones have been seen ('auto'), and go
+    # into a KLL sketch from then on; the histogram is always exact. `bounds`
+    # are the lower edges of the buckets.
+    def __init__(self, bounds, sketches=None):
+        sketches = sketches or SketchOptions()
+        self.bounds = tuple(bounds)
+        self.buckets = [0] * len(self.bounds)
+        self.total = 0
+        self.counts = Counter()
+        self.sketch = None
+        self.limit = {'never': None, 'always': 0}.get(sketches.mode, DISTRIBUTION_EXACT_LIMIT)
+        if self.limit == 0:
+            self.sketch = KLL()
+
+    @property
+    def approximate(self):
+        return self.sketch is not None
+
+    def add(self, value):
+        self.total += 1
+        self.buckets[max(bisect_right(self.bounds, value) - 1, 0)] += 1
+        if self.sketch is None:
+            self.counts[value] += 1
+            if self.limit is not None and len(self.counts) > self.limit:
+                self._approximate()
+        else:
+            self.sketch.update_counts({value: 1})
+
+    def update(self, values):
+        # A list or NumPy array of values
+        if np is not None and isinstance(values, np.ndarray):
+            values, counts = np.unique(values, return_counts=True)
+            self.update_counts(dict(zip(values.tolist(), counts.tolist())))
+        else:
+            self.update_counts(Counter(values))
+
+    def update_counts(self, counts):
+        if not counts:
+            return
+        buckets = self.buckets
+        for value, n in counts.items():
+            self.total += n
+            buckets[max(bisect_right(self.bounds, value) - 1, 0)] += n
+        if self.sketch is None:
+            self.counts.update(counts)
+            if self.limit is not None and len(self.counts) > self.limit:
+                self._approximate()
+        else:
+            self.sketch.update_counts(counts)
+
+    def _approximate(self):
+        self.sketch = KLL()
+        self.sketch.update_counts(self.counts)
+        self.counts = Counter()
+
+    def merge(self, other):
+        if other.bounds != self.bounds:
+            raise ValueError("cannot merge distributions with different buckets")
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.total += other.total
+        if other.sketch is not None and self.sketch is None:
+            self._approximate()
+        if self.sketch is None:
+            self.counts.update(other.counts)
+            if self.limit is not None and len(self.counts) > self.limit:
+                self._approximate()
+        elif other.sketch is None:
+            self.sketch.update_counts(other.counts)
+        else:
+            self.sketch.merge(other.sketch)
+
+    def percentiles(self, percents=PERCENTILES):
+        # Nearest-rank percentiles: the smallest value with at least p% of
+        # all values at or below it
+        if not self.total:
+            return {}
+        if self.sketch is None:
+            pairs = sorted(self.counts.items())
+        else:
+            pairs = self.sketch.items()
+        values = [value for value, _ in pairs]
+        ranks = list(accumulate(n for _, n in pairs))
+        result = {}
+        for p in percents:
+            rank = max(math.ceil(p / 100 * self.total), 1)
+            result[f'p{p}'] = values[min(bisect_right(ranks, rank - 1), len(values) - 1)]
+        return result
+
+    def histogram(self):
+        # [label, count] for every bucket, like ['10-19', 4]
+        result = []
+        for i, low in enumerate(self.bounds):
+            if i + 1 == len(self.bounds):
+                label = f'{low}+'
+            elif self.bounds[i + 1] - 1 == low:
+                label = f'{low}'
+            else:
+                label = f'{low}-{self.bounds[i + 1] - 1}'
+            result.append([label, self.buckets[i]])
+        return result
@@ -0,0 +1,527 @@
+import argparse
+import csv
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from stats_archives import AVERAGE_FIELDS, DISTINCT_FIELDS, LARGEST_FIELDS, split_member
+from stats_engine import ANALYZER_VERSION, strip_compression
+
+# Columnar result store
+#
+# ResultStore keeps the scalar fields of many results as one column per
+# field rather than a dict per file: numbers in typed arrays, strings in one
+# UTF-8 buffer with an offset per row, and fields with few distinct values
+# (extension, encoding, ...) as codes into a list of those values. Lists
+# such as top words and histograms are not kept; dicts of numbers such as
+# percentiles get a column per entry ('line_length_percentiles.p50').
+#
+# save() writes the columns to a file that load() maps back into memory
+# as it is, without parsing, so a saved run can be aggregated (totals(),
+# group_by(), top()) and exported (write_csv(), write_ndjson()) without
+# reading any analyzed file again.
+
+MAGIC = b'FSTATCOL'
+FORMAT_VERSION = 1
+# Saved sections start at multiples of this
+ALIGN = 8
+# String fields stored as codes into their distinct values
+CATEGORY_FIELDS = ('extension', 'encoding', 'line_ending', 'compression', 'archive')
+# Fields summed by default in groups
+DEFAULT_GROUP_FIELDS = ('file_size', 'total_lines', 'total_words', 'total_chars')
+# Rows decoded at a time when exporting
+EXPORT_ROWS = 10_000
+
+# Value that marks a row without one, per array typecode: booleans are
+# int8, integers int32 until one does not fit, then int64
+MISSING = {'b': -1, 'i': -(1 << 31), 'q': -(1 << 63), 'd': math.nan}
+# The Python type each typecode holds
+TYPES = {'b': bool, 'i': int, 'q': int, 'd': float}
+
+
+def _typecode(value):
+    if isinstance(value, bool):
+        return 'b'
+    if isinstance(value, int):
+        if -(1 << 31) < value < 1 << 31:
+            return 'i'
+        return 'q' if -(1 << 63) < value < 1 << 63 else 'd'
+    return 'd'
+
+
+# Typecodes in the order values are promoted through
+_WIDER = 'biqd'
+
+
+class NumberColumn:
+    def __init__(self, typecode, data=None):
+        self.typecode = typecode
+        self.type = TYPES[typecode]
+        self.data = data if data is not None else array(typecode)
+
+    def append(self, value):
+        if type(value) is self.type and value != MISSING[self.typecode]:
+            try:
+                self.data.append(value)
+                return
+            except OverflowError:
+                pass
+        if value is None or isinstance(value, str):
+            self.data.append(MISSING[self.typecode])
+            return
+        typecode = _typecode(value)
+        if _WIDER.index(typecode) > _WIDER.index(self.typecode):
+            self._promote(typecode)
+        self.data.append(value)
+
+    def fill(self, count):
+        self.data.extend(array(self.typecode, [MISSING[self.typecode]]) * count)
+
+    def _promote(self, typecode):
+        missing, wider = MISSING[self.typecode], MISSING[typecode]
+        self.data = array(typecode, [wider if v == missing else v for v in self.data.tolist()])
+        self.typecode = typecode
+        self.type = TYPES[typecode]
+
+    def is_missing(self, value):
+        return value != value if self.typecode == 'd' else value == MISSING[self.typecode]
+
+    def slice(self, start, stop):
+        values = self.data[start:stop].tolist()
+        if self.typecode == 'b':
+            return [None if v < 0 else bool(v) for v in values]
+        return [None if self.is_missing(v) else v for v in values]
+
+    def sections(self):
+        return [self.data]
+
+    def describe(self):
+        return {'kind': 'number', 'typecode': self.typecode}
+
+
+class StringColumn:
+    # Row i is blob[offsets[i]:offsets[i + 1]]; missing values are empty
+    def __init__(self, blob=None, offsets=None):
+        self.blob = blob if blob is not None else bytearray()
+        self.offsets = offsets if offsets is not None else array('q', [0])
+
+    def append(self, value):
+        if isinstance(value, str):
+            self.blob += value.encode('utf-8', 'surrogatepass')
+        self.offsets.append(len(self.blob))
+
+    def fill(self, count):
+        self.offsets.extend(array('q', [len(self.blob)]) * count)
+
+    def slice(self, start, stop):
+        offsets = self.offsets[start:stop + 1].tolist()
+        base = offsets[0]
+        chunk = bytes(self.blob[base:offsets[-1]])
+        return [chunk[a - base:b - base].decode('utf-8', 'surrogatepass') if b > a else None
+                for a, b in zip(offsets, offsets[1:])]
+
+    def sections(self):
+        return [self.blob, self.offsets]
+
+    def describe(self):
+        return {'kind': 'string'}
+
+
+class CategoryColumn:
+    # Codes into `values`, -1 where missing
+    def __init__(self, codes=None, values=None):
+        self.codes = codes if codes is not None else array('i')
+        self.values = values if values is not None else []
+        self.index = {value: code for code, value in enumerate(self.values)}
+
+    def append(self, value):
+        if not isinstance(value, str):
+            self.codes.append(-1)
+            return
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def fill(self, count):
+        self.codes.extend(array('i', [-1]) * count)
+
+    def slice(self, start, stop):
+        values = self.values
+        return [values[code] if code >= 0 else None for code in self.codes[start:stop].tolist()]
+
+    def sections(self):
+        return [self.codes]
+
+    def describe(self):
+        return {'kind': 'category', 'values': self.values}
+
+
+def _new_column(name, value):
+    if isinstance(value, str):
+        return CategoryColumn() if name in CATEGORY_FIELDS else StringColumn()
+    return NumberColumn(_typecode(value))
+
+
+def flatten(stats):
+    # The scalar fields of a result, with dicts of scalars spread over
+    # 'field.key' entries, plus the extension; lists, deeper nesting and
+    # the file name (the end of filepath) are left out
+    fields = {}
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            for inner, item in value.items():
+                if isinstance(item, (int, float, str)):
+                    fields[f'{key}.{inner}'] = item
+        elif isinstance(value, (int, float, str)) and key != 'filename':
+            fields[key] = value
+    if 'filepath' in stats:
+        name = stats.get('filename') or os.path.basename(stats['filepath'])
+        fields['extension'] = os.path.splitext(strip_compression(name))[1].lower()
+    return fields
+
+
+def _combine(name, values, missing):
+    # The total of a field over its stored values, as in archive_totals(),
+    # or None if every value is missing
+    if np is not None:
+        values = values[values != missing]
+        if not len(values):
+            return None
+        if name.startswith('max_') or name in LARGEST_FIELDS:
+            return int(values.max())
+        if name.startswith('min_'):
+            return int(values.min())
+        return int(values.sum(dtype=np.int64))
+    absent = values.count(missing)
+    if absent == len(values):
+        return None
+    if name.startswith('max_') or name in LARGEST_FIELDS:
+        return max(values)
+    if name.startswith('min_'):
+        return min(v for v in values if v != missing) if absent else min(values)
+    # The missing markers are added up too, then taken off again
+    return sum(values) - absent * missing
+
+
+def _weighted(values, weights, missing):
+    # Average of stored averages weighted by their stored counts, or None
+    if np is not None:
+        present = values == values if missing != missing else values != missing
+        keep = present & (weights > 0)
+        total = weights[keep].sum(dtype=np.int64)
+        return float((values[keep] * weights[keep]).sum()) / total if total else None
+    if missing != missing:
+        pairs = [(value, n) for value, n in zip(values, weights) if n > 0 and value == value]
+    else:
+        pairs = [(value, n) for value, n in zip(values, weights) if n > 0 and value != missing]
+    total = sum(n for _, n in pairs)
+    return sum(value * n for value, n in pairs) / total if total else None
+
+
+class ResultStore:
+    def __init__(self):
+        self.rows = 0
+        self.columns = {}
+        # The file a loaded store is mapped from
+        self.mapping = None
+
+    def __len__(self):
+        return self.rows
+
+    def add(self, stats):
+        # Archive totals rows are left out: their members are stored as
+        # rows of their own and would be counted twice
+        if 'members' in stats:
+            return
+        fields = flatten(stats)
+        for name, column in self.columns.items():
+            column.append(fields.pop(name, None))
+        for name, value in fields.items():
+            column = self.columns[name] = _new_column(name, value)
+            column.fill(self.rows)
+            column.append(value)
+        self.rows += 1
+
+    def column(self, name):
+        # All of a field's values, None where missing
+        if name not in self.columns:
+            raise KeyError(f"no field named {name!r}")
+        return self.columns[name].slice(0, self.rows)
+
+    def iter_rows(self):
+        # Results as dicts of their stored fields, 'field.key' columns
+        # gathered back into dicts
+        names = list(self.columns)
+        for start in range(0, self.rows, EXPORT_ROWS):
+            stop = min(start + EXPORT_ROWS, self.rows)
+            columns = [self.columns[name].slice(start, stop) for name in names]
+            for values in zip(*columns):
+                row = {}
+                for name, value in zip(names, values):
+                    if value is None or name == 'extension':
+                        continue
+                    key, _, inner = name.partition('.')
+                    if inner:
+                        row.setdefault(key, {})[inner] = value
+                    else:
+                        row[key] = value
+                if 'filepath' in row:
+                    # Archive members by their own name, as analyzed
+                    member = split_member(row['filepath'])
+                    row['filename'] = os.path.basename(member[1] if member else row['filepath'])
+                yield row
+
+    # Aggregation
+
+    def totals(self, rows=None, fields=None, _stored=None):
+        # Over all files or the given row numbers, like archive_totals():
+        # counts are added up, max_ and min_ fields give the extremes and
+        # averages are weighted by what they average over. Distinct counts,
+        # ratios and scores are left out. `fields` limits the fields.
+        count = self.rows if rows is None else len(rows)
+        if np is not None and rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+        result = {'files': count}
+        if 'error' in self.columns:
+            failed = self._stored('error', rows, _stored)
+            result['failed'] = int(failed.sum()) if np is not None else sum(failed)
+        for name, column in self.columns.items():
+            if (not isinstance(column, NumberColumn) or column.typecode not in 'iq'
+                    or '.' in name or name in DISTINCT_FIELDS or name == 'compressed_size'
+                    or fields is not None and name not in fields):
+                continue
+            total = _combine(name, self._stored(name, rows, _stored), MISSING[column.typecode])
+            if total is not None:
+                result[name] = total
+        for name, weight in AVERAGE_FIELDS.items():
+            if name not in self.columns or weight not in self.columns:
+                continue
+            if fields is not None and name not in fields:
+                continue
+            average = _weighted(self._stored(name, rows, _stored),
+                                self._stored(weight, rows, _stored),
+                                MISSING[self.columns[name].typecode])
+            if average is not None:
+                result[name] = average
+        return result
+
+    def _stored(self, name, rows, stored):
+        # A number column's values for the rows as stored, missing markers
+        # included, or whether a string column has a value; a numpy array
+        # where numpy is installed. `stored` keeps whole columns for the
+        # next call.
+        values = stored.get(name) if stored is not None else None
+        if values is None:
+            column = self.columns[name]
+            if isinstance(column, StringColumn):
+                if np is not None:
+                    offsets = np.frombuffer(column.offsets, dtype=np.int64)
+                    values = offsets[1:] > offsets[:-1]
+                else:
+                    offsets = column.offsets.tolist()
+                    values = [stop > start for start, stop in zip(offsets, offsets[1:])]
+            elif np is not None:
+                values = np.frombuffer(column.data, dtype=column.typecode)
+            else:
+                values = column.data.tolist()
+            if stored is not None:
+                stored[name] = values
+        if rows is None:
+            return values
+        return values[rows] if np is not None else [values[i] for i in rows]
+
+    def group_by(self, field, fields=DEFAULT_GROUP_FIELDS):
+        # {value of `field`: totals() of its files}, largest groups first
+        groups = {}
+        for row, value in enumerate(self.column(field)):
+            groups.setdefault(value, []).append(row)
+        stored = {}
+        return {value: self.totals(rows, fields, stored)
+                for value, rows in sorted(groups.items(), key=lambda item: -len(item[1]))}
+
+    def top(self, field, n=10, smallest=False):
+        # [(filepath, value)] of the n files with the largest (or smallest)
+        # values of `field`; files without one are left out
+        values = self.column(field)
+        rows = [row for row, value in enumerate(values) if value is not None]
+        pick = heapq.nsmallest if smallest else heapq.nlargest
+        rows = pick(n, rows, key=values.__getitem__)
+        paths = self.columns['filepath']
+        return [(paths.slice(row, row + 1)[0], values[row]) for row in rows]
+
+    # Export
+
+    def write_ndjson(self, f):
+        for row in self.iter_rows():
+            f.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    def write_csv(self, f):
+        names = list(self.columns)
+        writer = csv.writer(f)
+        writer.writerow(names)
+        for start in range(0, self.rows, EXPORT_ROWS):
+            stop = min(start + EXPORT_ROWS, self.rows)
+            columns = [self.columns[name].slice(start, stop) for name in names]
+            writer.writerows([['' if value is None else value for value in values]
+                              for values in zip(*columns)])
+
+    def save(self, path):
+        # MAGIC, the offset of the JSON header, the column sections and the
+        # header, which locates every section
+        columns = []
+        with open(path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<Q', 0))
+            for name, column in self.columns.items():
+                sections = []
+                for data in column.sections():
+                    f.write(b'\0' * (-f.tell() % ALIGN))
+                    data = memoryview(data)
+                    sections.append([f.tell(), data.nbytes])
+                    f.write(data)
+                columns.append(dict(column.describe(), name=name, sections=sections))
+            header_offset = f.tell()
+            header = {'format': FORMAT_VERSION, 'analyzer_version': ANALYZER_VERSION,
+                      'byteorder': sys.byteorder, 'rows': self.rows, 'columns': columns}
+            f.write(json.dumps(header).encode('utf-8'))
+            f.seek(len(MAGIC))
+            f.write(struct.pack('<Q', header_offset))
+
+
+def load(path):
+    # A read-only store over the mapped file; it stays mapped while the
+    # store is in use
+    with open(path, 'rb') as f:
+        start = f.read(len(MAGIC) + 8)
+        if len(start) < len(MAGIC) + 8 or not start.startswith(MAGIC):
+            raise ValueError(f"{path} is not a saved result store")
+        header_offset = struct.unpack('<Q', start[len(MAGIC):])[0]
+        f.seek(header_offset)
+        header = json.loads(f.read())
+        if header['format'] != FORMAT_VERSION:
+            raise ValueError(f"{path} has store format {header['format']}, not {FORMAT_VERSION}")
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError(f"{path} was saved on a {header['byteorder']}-endian machine")
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    view = memoryview(mapping)
+
+    def section(offset, size, typecode=None):
+        data = view[offset:offset + size]
+        return data.cast(typecode) if typecode else data
+
+    store = ResultStore()
+    store.rows = header['rows']
+    store.mapping = mapping
+    store.analyzer_version = header['analyzer_version']
+    for info in header['columns']:
+        sections = info['sections']
+        if info['kind'] == 'number':
+            column = NumberColumn(info['typecode'], section(*sections[0], info['typecode']))
+        elif info['kind'] == 'category':
+            column = CategoryColumn(section(*sections[0], 'i'), info['values'])
+        else:
+            column = StringColumn(section(*sections[0]), section(*sections[1], 'q'))
+        store.columns[info['name']] = column
+    return store
+
+
+def export(store, path):
+    # By extension: CSV, NDJSON, or a saved store for load()
+    name = path.lower()
+    if name.endswith('.csv'):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            store.write_csv(f)
+    elif name.endswith(('.ndjson', '.jsonl', '.json')):
+        with open(path, 'w', encoding='utf-8') as f:
+            store.write_ndjson(f)
+    else:
+        store.save(path)
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, int) and not isinstance(value, bool):
+        return f"{value:,}"
+    return str(value)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Aggregate and export results saved with stats_cli.py --store.")
+    parser.add_argument('store', help="store file written by --store")
+    parser.add_argument('--totals', action='store_true',
+                        help="print totals over all files (the default)")
+    parser.add_argument('--group-by', metavar='FIELD',
+                        help="print totals per value of a field, such as extension or encoding")
+    parser.add_argument('--top', metavar='FIELD',
+                        help="print the files with the largest values of a field")
+    parser.add_argument('-n', type=int, default=10, help="files listed by --top (default: 10)")
+    parser.add_argument('--smallest', action='store_true',
+                        help="list the smallest values with --top")
+    parser.add_argument('--fields', default=None, metavar='FIELDS',
+                        help="comma-separated fields to aggregate (default: all for --totals, "
+                             f"{','.join(DEFAULT_GROUP_FIELDS)} for --group-by)")
+    parser.add_argument('--export', metavar='PATH',
+                        help="write the results to a .csv, .ndjson or store file")
+    parser.add_argument('--format', choices=['text', 'json'], default='text')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    fields = args.fields.split(',') if args.fields else None
+    try:
+        store = load(args.store)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    try:
+        if args.export:
+            export(store, args.export)
+        if args.group_by:
+            result = store.group_by(args.group_by, fields or DEFAULT_GROUP_FIELDS)
+            if args.format == 'json':
+                print(json.dumps([{args.group_by: value, **totals}
+                                  for value, totals in result.items()], ensure_ascii=False))
+            else:
+                names = ['files'] + list(fields or DEFAULT_GROUP_FIELDS)
+                print('\t'.join([args.group_by] + names))
+                for value, totals in result.items():
+                    print('\t'.join([str(value)] + [_format_value(totals.get(name, '-'))
+                                                    for name in names]))
+        if args.top:
+            result = store.top(args.top, args.n, args.smallest)
+            if args.format == 'json':
+                print(json.dumps([{'filepath': path, args.top: value} for path, value in result],
+                                 ensure_ascii=False))
+            else:
+                for path, value in result:
+                    print(f"{_format_value(value)}\t{path}")
+        if args.totals or not (args.export or args.group_by or args.top):
+            result = store.totals(fields=fields)
+            if args.format == 'json':
+                print(json.dumps(result))
+            else:
+                for name, value in result.items():
+                    print(f"{name + ':':<24}{_format_value(value)}")
+    except KeyError as e:
+        parser.error(e.args[0])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
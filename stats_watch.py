@@ -0,0 +1,334 @@
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import json
+import os
+import select
+import struct
+import sys
+import time
+from collections import OrderedDict
+
+from stats_engine import CHUNK_SIZE, file_times, tail_stats
+
+# Watch mode
+#
+# A watcher reports which files changed under a set of directories. On Linux
+# it reads inotify events (through ctypes; the standard library has no
+# binding), elsewhere, or when inotify is out of watches, it compares
+# os.stat() snapshots every poll interval. debounced() groups the events of
+# a burst of writes, such as an editor saving or a checkout, into one batch.
+#
+# WatchSession re-analyzes the files that changed. For the most recently
+# changed files it keeps the scan state and a hash of the bytes scanned, so
+# a file saved without changes is not scanned again and a file that only
+# grew is scanned from where the last run stopped.
+
+DEFAULT_DEBOUNCE = 0.2
+# A file written to without a pause is still re-analyzed this often
+MAX_DEBOUNCE = 2.0
+DEFAULT_POLL_INTERVAL = 1.0
+# How often debounced() checks whether it was asked to stop
+STOP_CHECK = 0.5
+# Scan states kept for resuming; each holds the word tables of its file
+DEFAULT_WATCH_STATES = 32
+# Fields that change on every run whether or not the content did
+VOLATILE_FIELDS = ('created', 'modified', 'accessed', 'performance')
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_ONLYDIR)
+# struct inotify_event without its name
+_EVENT = struct.Struct('iIII')
+EVENT_BUFFER = 1 << 16
+
+_libc = None
+
+
+def _inotify():
+    global _libc
+    if _libc is None:
+        _libc = False
+        if sys.platform.startswith('linux'):
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+                libc.inotify_init1.argtypes = [ctypes.c_int]
+                libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+                _libc = libc
+            except (OSError, AttributeError):
+                pass
+    return _libc or None
+
+
+class InotifyWatcher:
+    # `roots` are (directory, recursive) pairs. prune(directory) skips a
+    # subdirectory of a recursive root; files() lists every file that may
+    # have changed, for when the kernel dropped events.
+    def __init__(self, roots, files, prune=None):
+        self.libc = _inotify()
+        if self.libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.files = files
+        self.prune = prune
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        # watch descriptor: (directory, recursive)
+        self.directories = {}
+        try:
+            for directory, recursive in roots:
+                self._watch_tree(directory, recursive)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch(self, directory, recursive):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory or os.curdir), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), directory)
+        self.directories[wd] = (directory, recursive)
+
+    def _watch_tree(self, root, recursive):
+        # Returns the files already in the tree, which for a directory
+        # created while watching may have been written before its watch
+        if not recursive:
+            self._watch(root, False)
+            return []
+        found = []
+        for dirpath, dirnames, filenames in os.walk(root or os.curdir):
+            if self.prune is not None:
+                dirnames[:] = [d for d in dirnames if not self.prune(os.path.join(dirpath, d))]
+            try:
+                self._watch(dirpath, True)
+            except FileNotFoundError:
+                # Removed again before its watch was added
+                continue
+            found.extend(os.path.join(dirpath, name) for name in filenames)
+        return found
+
+    def poll(self, timeout=None):
+        # Paths changed, created or removed within `timeout` seconds
+        changed = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changed
+        # The kernel never splits an event across reads
+        data = os.read(self.fd, EVENT_BUFFER)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            start = offset + _EVENT.size
+            name = os.fsdecode(data[start:start + length].rstrip(b'\0'))
+            offset = start + length
+            if mask & IN_Q_OVERFLOW:
+                changed.update(self.files())
+                continue
+            if mask & IN_IGNORED:
+                self.directories.pop(wd, None)
+                continue
+            if wd not in self.directories or not name:
+                continue
+            directory, recursive = self.directories[wd]
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if not recursive or (self.prune is not None and self.prune(path)):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        changed.update(self._watch_tree(path, True))
+                    except OSError:
+                        pass
+                else:
+                    # Everything under a removed directory went with it
+                    changed.add(path)
+                continue
+            changed.add(path)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    # Compares the size, mtime and inode of every file in files() each
+    # `interval` seconds
+    def __init__(self, files, interval=DEFAULT_POLL_INTERVAL):
+        self.files = files
+        self.interval = interval
+        self.snapshot = self._snapshot()
+        self.next_scan = time.monotonic() + interval
+
+    def _snapshot(self):
+        snapshot = {}
+        for path in self.files():
+            try:
+                file_stats = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (file_stats.st_size, file_stats.st_mtime_ns, file_stats.st_ino)
+        return snapshot
+
+    def poll(self, timeout=None):
+        wait = self.next_scan - time.monotonic()
+        if timeout is not None and wait > timeout:
+            time.sleep(timeout)
+            return set()
+        if wait > 0:
+            time.sleep(wait)
+        snapshot = self._snapshot()
+        self.next_scan = time.monotonic() + self.interval
+        changed = {path for path in snapshot.keys() | self.snapshot.keys()
+                   if snapshot.get(path) != self.snapshot.get(path)}
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def make_watcher(roots, files, prune=None, poll_interval=None):
+    # inotify where it works, unless polling is asked for
+    if poll_interval is None:
+        try:
+            return InotifyWatcher(roots, files, prune)
+        except OSError:
+            pass
+    return PollingWatcher(files, poll_interval or DEFAULT_POLL_INTERVAL)
+
+
+def debounced(watcher, delay=DEFAULT_DEBOUNCE, stop=None):
+    # Yields sets of changed paths, each once no more changes came in for
+    # `delay` seconds (or MAX_DEBOUNCE after the first), until `stop` is set
+    while stop is None or not stop.is_set():
+        changed = watcher.poll(STOP_CHECK)
+        if not changed:
+            continue
+        deadline = time.monotonic() + MAX_DEBOUNCE
+        while time.monotonic() < deadline:
+            more = watcher.poll(delay)
+            if not more:
+                break
+            changed |= more
+        yield changed
+
+
+def prefix_digest(f, size):
+    # Hash of the first `size` bytes of f
+    digest = hashlib.blake2b(digest_size=16)
+    f.seek(0)
+    while size > 0:
+        block = f.read(min(CHUNK_SIZE, size))
+        if not block:
+            break
+        digest.update(block)
+        size -= len(block)
+    return digest.digest()
+
+
+def _plain(value):
+    # Tuples and integer keys as they come back from JSON, for comparing
+    # fresh results with cached ones
+    return json.loads(json.dumps(value))
+
+
+def diff_stats(old, new):
+    # {field: [old value, new value]} for each field whose value changed
+    changes = {}
+    for key in list(new) + [key for key in old if key not in new]:
+        if key in VOLATILE_FIELDS:
+            continue
+        before, after = old.get(key), new.get(key)
+        if before != after and _plain(before) != _plain(after):
+            changes[key] = [before, after]
+    return changes
+
+
+class WatchSession:
+    def __init__(self, metrics=None, sketches=None, timings=False,
+                 max_states=DEFAULT_WATCH_STATES):
+        self.metrics = metrics
+        self.sketches = sketches
+        self.timings = timings
+        self.max_states = max_states
+        # Last result of every file, and the os.stat() it was taken after
+        self.results = {}
+        self.signatures = {}
+        # path: (TailState, digest of the bytes it scanned), oldest first
+        self.states = OrderedDict()
+
+    def add(self, stats):
+        # Records a result from elsewhere (the cache, a first full pass);
+        # the next change to the file is diffed against it
+        if 'error' not in stats:
+            self.results[stats['filepath']] = stats
+            self.signatures.pop(stats['filepath'], None)
+
+    def analyze(self, path, progress=None, cancel=None):
+        # Returns (stats, changes) where changes is diff_stats() against the
+        # last result, or None for a file not seen before
+        file_stats = os.stat(path)
+        signature = (file_stats.st_size, file_stats.st_mtime_ns, file_stats.st_ino,
+                     file_stats.st_dev)
+        old = self.results.get(path)
+        if old is not None and self.signatures.get(path) == signature:
+            return old, {}
+
+        state = None
+        entry = self.states.pop(path, None)
+        if entry is not None and file_stats.st_size >= entry[0].offset:
+            with open(path, 'rb') as f:
+                if prefix_digest(f, entry[0].offset) == entry[1]:
+                    state = entry[0]
+            if state is not None and file_stats.st_size == state.offset and old is not None:
+                # Saved without changes
+                stats = {k: v for k, v in old.items() if k != 'performance'}
+                stats.update(file_times(file_stats))
+                self._keep(path, stats, signature, entry)
+                return stats, {}
+            if state is not None:
+                # The bytes scanned last time are unchanged, so the scan goes
+                # on from there even if an editor saved by replacing the file
+                state.inode, state.device = file_stats.st_ino, file_stats.st_dev
+
+        stats, state = tail_stats(path, state, progress=progress, cancel=cancel,
+                                  metrics=self.metrics, sketches=self.sketches,
+                                  timings=self.timings)
+        entry = None
+        if state is not None:
+            with open(path, 'rb') as f:
+                entry = state, prefix_digest(f, state.offset)
+        self._keep(path, stats, signature, entry)
+        return stats, None if old is None else diff_stats(old, stats)
+
+    def _keep(self, path, stats, signature, entry):
+        # `entry` is None for files that cannot be resumed (compressed ones)
+        self.results[path] = stats
+        self.signatures[path] = signature
+        if entry is not None:
+            self.states[path] = entry
+        while len(self.states) > self.max_states:
+            self.states.popitem(last=False)
+
+    def forget(self, path):
+        # Drops a removed file, or every file under a removed directory, and
+        # returns the paths dropped
+        removed = [p for p in self.results if p == path or p.startswith(path + os.sep)]
+        for p in removed:
+            del self.results[p]
+            self.signatures.pop(p, None)
+            self.states.pop(p, None)
+        return removed